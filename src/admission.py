@@ -0,0 +1,118 @@
+import threading
+from flask import request, g
+from werkzeug.exceptions import ServiceUnavailable
+
+
+# Limit on the number of requests of one class served at the same time, with a bounded queue for the rest
+# A request that finds the queue full, or is still queued after the wait allowed, is rejected
+class Bulkhead(object):
+    def __init__(self, name, limit, queue):
+        self.name = name
+        self.limit = limit
+        self.queue = queue
+        self.active = 0
+        self.waiting = 0
+        self.admitted = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self._condition = threading.Condition()
+
+    def acquire(self, timeout):
+        with self._condition:
+            if self.active >= self.limit:
+                if self.waiting >= self.queue:
+                    self.rejected += 1
+                    return False
+
+                self.waiting += 1
+                try:
+                    admitted = self._condition.wait_for(lambda: self.active < self.limit, timeout)
+                finally:
+                    self.waiting -= 1
+                if not admitted:
+                    self.timed_out += 1
+                    return False
+
+            self.active += 1
+            self.admitted += 1
+            return True
+
+    def release(self):
+        with self._condition:
+            self.active -= 1
+            self._condition.notify()
+
+    def status(self):
+        with self._condition:
+            return {
+                "limit": self.limit,
+                "queue": self.queue,
+                "active": self.active,
+                "waiting": self.waiting,
+                "admitted": self.admitted,
+                "rejected": self.rejected,
+                "timed_out": self.timed_out
+            }
+
+
+# Per-process admission control, so a burst on one class of endpoints cannot take every worker thread
+# ADMISSION_CLASSES puts blueprints (e.g. "auth") or endpoints (e.g. "books.get_all_books") in a class, and
+# ADMISSION_LIMITS gives each class the requests it can serve at once and the requests that can wait for them.
+# Requests that cannot be admitted within ADMISSION_QUEUE_TIMEOUT seconds are answered with 503 and
+# Retry-After. Endpoints that are not in a class, e.g. looking up a single book, are never limited.
+class AdmissionControl(object):
+    def __init__(self, app=None):
+        self.bulkheads = {}
+        self.classes = {}
+        self.timeout = 1.0
+        self.retry_after = 1
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        if not app.config.get("ADMISSION_CONTROL_ENABLED", True):
+            return
+
+        self.timeout = app.config.get("ADMISSION_QUEUE_TIMEOUT", 1.0)
+        self.retry_after = app.config.get("ADMISSION_RETRY_AFTER", 1)
+        self.bulkheads = {
+            name: Bulkhead(name, limit, queue)
+            for name, (limit, queue) in parse_limits(app.config.get("ADMISSION_LIMITS", "")).items()
+        }
+        self.classes = {
+            route: name for route, name in app.config.get("ADMISSION_CLASSES", {}).items() if name in self.bulkheads
+        }
+
+        app.before_request(self._admit)
+        app.teardown_request(self._release)
+
+    # Return the state of every bulkhead, for /metrics
+    def status(self):
+        return {name: bulkhead.status() for name, bulkhead in self.bulkheads.items()}
+
+    def _admit(self):
+        name = self.classes.get(request.endpoint) or self.classes.get(request.blueprint)
+        if name is None:
+            return
+
+        bulkhead = self.bulkheads[name]
+        if not bulkhead.acquire(self.timeout):
+            raise ServiceUnavailable(description="The server is busy. Please try again shortly.", retry_after=self.retry_after)
+        g.admission_bulkhead = bulkhead
+
+    def _release(self, error=None):
+        bulkhead = g.pop("admission_bulkhead", None)
+        if bulkhead is not None:
+            bulkhead.release()
+
+
+# Read limits given as "name=limit:queue" separated by commas, e.g. "auth=4:8,bulk=2:4"
+def parse_limits(value):
+    limits = {}
+    for item in value.split(","):
+        if not item.strip():
+            continue
+        name, _, sizes = item.partition("=")
+        limit, _, queue = sizes.partition(":")
+        limits[name.strip()] = (int(limit), int(queue or 0))
+    return limits
@@ -3,12 +3,20 @@ from flask_sqlalchemy import SQLAlchemy
 from flask_marshmallow import Marshmallow
 from flask_bcrypt import Bcrypt
 from flask_jwt_extended import JWTManager
+from cache import ResponseCache
+from request_metrics import RequestMetrics
+from slow_queries import SlowQueryLog
+from admission import AdmissionControl
 
 
 db = SQLAlchemy()
 ma = Marshmallow()
 bcrypt = Bcrypt()
 jwt = JWTManager()
+response_cache = ResponseCache()
+request_metrics = RequestMetrics()
+slow_query_log = SlowQueryLog()
+admission_control = AdmissionControl()
 
 
 def create_app():
@@ -18,11 +26,19 @@ def create_app():
     # Configure Flask
     app.config.from_object("config.app_config")
 
-    # Create SQLAlchemy, Marshmallow, JWT and Bcrypt objects
+    # Create SQLAlchemy, Marshmallow, JWT, Bcrypt, response cache, request metrics, slow query log and admission control objects
     db.init_app(app)
     ma.init_app(app)
     bcrypt.init_app(app)
     jwt.init_app(app)
+    response_cache.init_app(app)
+    request_metrics.init_app(app)
+    slow_query_log.init_app(app)
+    admission_control.init_app(app)
+
+    # Start writing reviews in batches if configured
+    from group_commit import review_writer
+    review_writer.init_app(app)
 
     # Import commands
     from commands import db_commands
@@ -0,0 +1,119 @@
+import time
+import threading
+from functools import wraps
+from flask import abort, current_app
+from flask_jwt_extended import create_access_token, verify_jwt_in_request, get_jwt, get_jwt_identity
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from app import db, jwt
+from models.users import User, DeletedUser
+
+
+# Lowest token generation still accepted for each user id, and the time each deleted user was deleted
+# Tokens issued with an older generation, or to a deleted user before they were deleted, have been revoked,
+# so checking a token is a dictionary lookup. These are held per process, and rebuilt from the user and
+# deleted_user tables every JWT_REVOCATION_REFRESH_SECONDS so revocations made by other processes are picked up.
+# A deleted user's generation is dropped, as a new user can be given the same id on SQLite
+valid_generations = {}
+deleted_users = {}
+_loaded_at = None
+_lock = threading.Lock()
+
+
+# Load the token generation of every user whose tokens have been revoked at least once, and every deleted user
+# The lock is held while loading, so revocations committed meanwhile are applied after the maps are replaced
+def _load_generations():
+    global valid_generations, deleted_users, _loaded_at
+    with _lock:
+        generations = dict(db.session.query(User.id, User.token_generation).filter(User.token_generation > 0).all())
+        deleted = dict(db.session.query(DeletedUser.user_id, DeletedUser.tokens_revoked_at).all())
+        valid_generations, deleted_users = generations, deleted
+        _loaded_at = time.monotonic()
+
+
+# Tell Flask-JWT-Extended to reject tokens from revoked generations
+# Tokens issued before generations were added to the claims are also rejected, so the user must login again
+@jwt.token_in_blocklist_loader
+def token_revoked(jwt_header, jwt_payload):
+    if "gen" not in jwt_payload or "admin" not in jwt_payload:
+        return True
+    refresh = current_app.config.get("JWT_REVOCATION_REFRESH_SECONDS", 30)
+    if _loaded_at is None or time.monotonic() - _loaded_at > refresh:
+        _load_generations()
+    user_id = int(jwt_payload["sub"])
+    if user_id in deleted_users and jwt_payload.get("iat", 0) <= deleted_users[user_id]:
+        return True
+    return jwt_payload["gen"] < valid_generations.get(user_id, 0)
+
+
+# Create a JWT for the user with their admin status and token generation in the claims
+def create_user_token(user, expires_delta):
+    claims = {"admin": user.admin == True, "gen": user.token_generation or 0}
+    return create_access_token(identity=str(user.id), additional_claims=claims, expires_delta=expires_delta)
+
+
+# Revoke every token issued to the user so far
+# Call before committing the change that makes their tokens stale, so both are committed together
+def revoke_user_tokens(user):
+    user.token_generation = (user.token_generation or 0) + 1
+    db.session.info.setdefault("revoked_generations", {})[user.id] = user.token_generation
+
+
+# Revoke every token issued to a user that is being deleted
+# Call before committing the deletion, so both are committed together
+def revoke_deleted_user_tokens(user_id):
+    revoked_at = int(time.time())
+    db.session.merge(DeletedUser(user_id=user_id, tokens_revoked_at=revoked_at))
+    db.session.info.setdefault("deleted_users", {})[user_id] = revoked_at
+
+
+# Apply the revocations made in a transaction to this process once it has been committed
+# Other processes pick them up when they next reload the generations
+@event.listens_for(Session, "after_commit")
+def _apply_revocations(session):
+    generations = session.info.pop("revoked_generations", {})
+    deleted = session.info.pop("deleted_users", {})
+    if not generations and not deleted:
+        return
+    with _lock:
+        for user_id, generation in generations.items():
+            valid_generations[user_id] = max(valid_generations.get(user_id, 0), generation)
+        for user_id, revoked_at in deleted.items():
+            deleted_users[user_id] = max(deleted_users.get(user_id, 0), revoked_at)
+            valid_generations.pop(user_id, None)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_revocations(session):
+    session.info.pop("revoked_generations", None)
+    session.info.pop("deleted_users", None)
+
+
+# Return the id of the user the JWT was issued to
+def current_user_id():
+    return int(get_jwt_identity())
+
+
+# Decorator to require a valid JWT from any registered user
+def user_required():
+    def decorator(func):
+        @wraps(func)
+        def function(*args, **kwargs):
+            verify_jwt_in_request()
+            return func(*args, **kwargs)
+        return function
+    return decorator
+
+
+# Decorator to require a valid JWT from an admin user
+# The admin status is read from the token's claims, so the database is not queried
+def admin_required(description="You are not authorized to make this change."):
+    def decorator(func):
+        @wraps(func)
+        def function(*args, **kwargs):
+            verify_jwt_in_request()
+            if get_jwt().get("admin") != True:
+                return abort(403, description=description)
+            return func(*args, **kwargs)
+        return function
+    return decorator
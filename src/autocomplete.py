@@ -0,0 +1,219 @@
+import bisect
+import heapq
+import re
+import threading
+import time
+from collections import OrderedDict
+from flask import current_app
+from sqlalchemy import func, select
+from app import db
+from models.books import Book, Author, Publisher
+from models.movies import Movie, Director, ProductionCompany
+from models.ratings import BookRating, MovieRating
+
+
+# Largest number of suggestions returned for a prefix, the best this many are cached for each prefix looked up
+MAX_SUGGESTIONS = 20
+
+# Largest number of prefixes whose suggestions are cached in each index, the least recently used are dropped after that
+MAX_CACHED_PREFIXES = 10000
+
+
+# Return the lowercase keys a name can be found by, one starting at each word
+# e.g. "The Dark Tower" is found by prefixes of "the dark tower", "dark tower" and "tower"
+def name_keys(name):
+    name = " ".join(re.findall(r"\w+", (name or "").lower()))
+    return [name[match.start():] for match in re.finditer(r"\b\w", name)]
+
+
+# Names of one type of entity, e.g. every book title, held in memory for prefix lookups
+# keys is sorted so the keys starting with a prefix are found with a binary search. Popularity is the
+# number of reviews, of the book or movie itself, or of all the books or movies of an author, director etc.
+class NameIndex(object):
+    def __init__(self):
+        self.keys = []
+        self.names = {}
+        self.popularity = {}
+        self.parents = {}
+        self._cache = OrderedDict()
+
+    # Fill an empty index from (id, name, popularity, parents) rows, sorting the keys once at the end
+    def build(self, rows):
+        for id, name, popularity, parents in rows:
+            self.names[id] = name
+            self.popularity[id] = popularity
+            self.parents[id] = parents
+            self.keys.extend((key, id) for key in name_keys(name))
+        self.keys.sort()
+
+    def put(self, id, name, popularity=None, parents=()):
+        self.remove(id)
+        self.names[id] = name
+        self.parents[id] = list(parents)
+        if popularity is not None or id not in self.popularity:
+            self.popularity[id] = popularity or 0
+        for key in name_keys(name):
+            bisect.insort(self.keys, (key, id))
+            self._forget(key)
+
+    def remove(self, id):
+        name = self.names.pop(id, None)
+        self.parents.pop(id, None)
+        if name is None:
+            return
+        for key in name_keys(name):
+            index = bisect.bisect_left(self.keys, (key, id))
+            if index < len(self.keys) and self.keys[index] == (key, id):
+                del self.keys[index]
+            self._forget(key)
+
+    def add_popularity(self, id, change):
+        if id not in self.names:
+            return
+        self.popularity[id] = self.popularity.get(id, 0) + change
+        for key in name_keys(self.names[id]):
+            self._forget(key)
+
+    # Return the ids of the most popular names with a key starting with prefix, most popular first
+    def lookup(self, prefix):
+        ids = self._cache.get(prefix)
+        if ids is None:
+            matches = set()
+            index = bisect.bisect_left(self.keys, (prefix,))
+            while index < len(self.keys) and self.keys[index][0].startswith(prefix):
+                matches.add(self.keys[index][1])
+                index += 1
+            ids = heapq.nsmallest(MAX_SUGGESTIONS, matches, key=lambda id: (-self.popularity.get(id, 0), len(self.names[id]), id))
+            self._cache[prefix] = ids
+            if len(self._cache) > MAX_CACHED_PREFIXES:
+                self._cache.popitem(last=False)
+        else:
+            self._cache.move_to_end(prefix)
+        return ids
+
+    # Drop the cached results for every prefix of a key, as the names they were chosen from have changed
+    def _forget(self, key):
+        for length in range(1, len(key) + 1):
+            self._cache.pop(key[:length], None)
+
+
+# Prefix index of book and movie titles and author, director, publisher and production company names
+# Built from the database the first time it is used in each process, rather than when the app is created, as the
+# app is also created for CLI commands such as "flask db create" that run before the tables exist. It is rebuilt
+# every AUTOCOMPLETE_REFRESH_SECONDS so changes made by other processes are picked up. Changes made by this
+# process are applied straight away by the controllers, after they are committed.
+class Autocomplete(object):
+    TYPES = ["book", "movie", "author", "director", "publisher", "production_company"]
+
+    # The entity each book and movie adds its reviews to the popularity of
+    PARENTS = {
+        "book": ["author", "publisher"],
+        "movie": ["director", "production_company"]
+    }
+
+    def __init__(self):
+        self.indexes = None
+        self._loaded_at = None
+        self._lock = threading.RLock()
+
+    # Load every name and its number of reviews from the database
+    def load(self):
+        indexes = {entity: NameIndex() for entity in self.TYPES}
+        popularity = {entity: {} for entity in self.TYPES}
+
+        books = db.session.execute(
+            select(Book.id, Book.title, Book.author_id, Book.publisher_id, func.coalesce(BookRating.rating_count, 0))
+            .outerjoin(BookRating, BookRating.book_id == Book.id)
+        ).all()
+        movies = db.session.execute(
+            select(Movie.id, Movie.title, Movie.director_id, Movie.production_company_id, func.coalesce(MovieRating.rating_count, 0))
+            .outerjoin(MovieRating, MovieRating.movie_id == Movie.id)
+        ).all()
+
+        for entity, rows in (("book", books), ("movie", movies)):
+            first_parent, second_parent = self.PARENTS[entity]
+            entries = []
+            for id, name, first_id, second_id, reviews in rows:
+                parents = [(first_parent, first_id), (second_parent, second_id)]
+                entries.append((id, name, reviews, parents))
+                # Authors, publishers etc. are as popular as all their books or movies together
+                for parent, parent_id in parents:
+                    popularity[parent][parent_id] = popularity[parent].get(parent_id, 0) + reviews
+            indexes[entity].build(entries)
+
+        for entity, model, column in [("author", Author, Author.published_name), ("publisher", Publisher, Publisher.publisher_name),
+                                      ("director", Director, Director.director_name), ("production_company", ProductionCompany, ProductionCompany.name)]:
+            indexes[entity].build(
+                (id, name, popularity[entity].get(id, 0), []) for id, name in db.session.execute(select(model.id, column))
+            )
+
+        with self._lock:
+            self.indexes = indexes
+            self._loaded_at = time.monotonic()
+
+    # Rebuild the index from the database the next time it is used, e.g. after a bulk insert
+    def invalidate(self):
+        with self._lock:
+            self._loaded_at = None
+
+    def _ensure_loaded(self):
+        refresh = current_app.config.get("AUTOCOMPLETE_REFRESH_SECONDS", 300)
+        if self._loaded_at is None or time.monotonic() - self._loaded_at > refresh:
+            self.load()
+
+    # Return up to limit suggestions for a prefix as (type, id, name, reviews), most reviewed first
+    def suggest(self, prefix, types=None, limit=10):
+        prefix = " ".join(re.findall(r"\w+", prefix.lower()))
+        if not prefix:
+            return []
+
+        self._ensure_loaded()
+        with self._lock:
+            suggestions = []
+            for entity in types or self.TYPES:
+                index = self.indexes[entity]
+                for id in index.lookup(prefix)[:limit]:
+                    suggestions.append((entity, id, index.names[id], index.popularity.get(id, 0)))
+
+        suggestions.sort(key=lambda suggestion: (-suggestion[3], len(suggestion[2])))
+        return suggestions[:limit]
+
+    # Add or rename a book, movie, author, director, publisher or production company
+    # parent_ids are the author_id and publisher_id of a book, or the director_id and production_company_id of a movie
+    def put(self, entity, id, name, *parent_ids):
+        with self._lock:
+            if self.indexes is None:
+                return
+            index = self.indexes[entity]
+            parents = list(zip(self.PARENTS.get(entity, []), parent_ids))
+            reviews = index.popularity.get(id, 0)
+            # Move the reviews to the new author etc. if they have changed
+            for parent, parent_id in index.parents.get(id, []):
+                self.indexes[parent].add_popularity(parent_id, -reviews)
+            for parent, parent_id in parents:
+                self.indexes[parent].add_popularity(parent_id, reviews)
+            index.put(id, name, parents=parents)
+
+    # Remove a deleted book, movie, author, director, publisher or production company
+    def remove(self, entity, id):
+        with self._lock:
+            if self.indexes is None:
+                return
+            index = self.indexes[entity]
+            reviews = index.popularity.pop(id, 0)
+            for parent, parent_id in index.parents.get(id, []):
+                self.indexes[parent].add_popularity(parent_id, -reviews)
+            index.remove(id)
+
+    # Add (or with a negative change, remove) reviews of a book or movie
+    def add_reviews(self, entity, id, change):
+        with self._lock:
+            if self.indexes is None:
+                return
+            index = self.indexes[entity]
+            index.add_popularity(id, change)
+            for parent, parent_id in index.parents.get(id, []):
+                self.indexes[parent].add_popularity(parent_id, change)
+
+
+autocomplete = Autocomplete()
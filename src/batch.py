@@ -0,0 +1,40 @@
+from flask import request, abort, current_app, jsonify
+from sqlalchemy.orm import undefer
+from eager_loading import schema_query
+from serializers import dump
+
+
+# Read the keys to look up from the query string, given separated by commas and/or by repeating the parameter
+# e.g. ?ids=1,2,3 or ?ids=1&ids=2. Returns the keys in the order given, without duplicates
+def requested_keys(name, parse=str):
+    keys = {}
+    for value in request.args.getlist(name):
+        for key in value.split(","):
+            key = key.strip()
+            if not key:
+                continue
+            try:
+                keys[parse(key)] = None
+            except ValueError:
+                return abort(400, description=f"Invalid value for {name} in query string.")
+
+    if not keys:
+        return abort(400, description=f"Missing {name} in query string.")
+
+    max_keys = current_app.config.get("BATCH_MAX_KEYS", 100)
+    if len(keys) > max_keys:
+        return abort(400, description=f"No more than {max_keys} {name} can be looked up at once.")
+
+    return list(keys)
+
+
+# Look up the rows of a model with any of the keys given in one query, loading the relationships the schema dumps
+# with it. Returns the dumped rows in the order of the keys, and the keys no row was found for as missing
+def batch_response(schema, model, column, keys):
+    rows = schema_query(schema, model, sparse=True).options(undefer(column)).filter(column.in_(keys)).all()
+    found = {getattr(row, column.key): row for row in rows}
+
+    return jsonify(
+        results=dump(schema, [found[key] for key in keys if key in found]),
+        missing=[key for key in keys if key not in found]
+    )
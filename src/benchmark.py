@@ -0,0 +1,223 @@
+# Benchmark the API end to end.
+#
+# Boots the app against a local database, seeds it with synthetic data and sends a mix of requests to
+# the books, movies, read, watched and auth blueprints through the Flask test client. Reports the
+# throughput, p50/p95/p99 latency and SQL statements per request for each endpoint, and saves the
+# results as JSON so they can be compared with an earlier run.
+#
+# Run from the src directory, e.g.
+#
+#     python benchmark.py --scale 1 --requests 5000 --output results.json
+#     python benchmark.py --no-seed --requests 5000 --baseline results.json
+#
+# The database given with --database-url is dropped and re-created unless --no-seed is used, so never
+# point it at a database holding real data.
+import argparse
+import json
+import os
+import random
+import sys
+import threading
+import time
+from collections import defaultdict
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark the API end to end.")
+    parser.add_argument("--database-url", default="sqlite:///benchmark.db", help="Local database to benchmark against.")
+    parser.add_argument("--scale", type=int, default=1, help="Scale of the synthetic data set, see flask db seed --scale.")
+    parser.add_argument("--no-seed", action="store_true", help="Use the data already in the database.")
+    parser.add_argument("--requests", type=int, default=2000, help="Total number of requests to send.")
+    parser.add_argument("--concurrency", type=int, default=1, help="Number of threads sending requests.")
+    parser.add_argument("--warmup", type=int, default=100, help="Requests sent before measuring starts.")
+    parser.add_argument("--seed", type=int, default=1, help="Random seed for the data set and the request mix.")
+    parser.add_argument("--output", help="File to save the results to as JSON.")
+    parser.add_argument("--baseline", help="Results file from an earlier run to compare against.")
+    return parser.parse_args()
+
+
+# Endpoints in the request mix, with how often each is sent relative to the others
+# Each takes the random generator and the benchmark state and returns (method, url, json body, needs token)
+# Reviews are written with /read/sync and /watched/sync, as a user can only add one review of each item with
+# /read/add and /watched/add and the mix picks items at random
+MIX = {
+    "books.get_all_books (page)": (20, lambda rng, s: ("GET", "/books/?limit=25", None, False)),
+    "books.get_all_books": (2, lambda rng, s: ("GET", "/books/", None, False)),
+    "books.search_book": (15, lambda rng, s: ("GET", f"/books/search/?id={rng.choice(s['book_ids'])}", None, False)),
+    "books.search_books": (8, lambda rng, s: ("GET", f"/books/search?author_id={rng.choice(s['author_ids'])}", None, False)),
+    "movies.get_all_movies (page)": (10, lambda rng, s: ("GET", "/movies/?limit=25", None, False)),
+    "movies.search_movie_id": (10, lambda rng, s: ("GET", f"/movies/search/{rng.choice(s['movie_ids'])}", None, False)),
+    "movies.sort_movies_ranking": (2, lambda rng, s: ("GET", "/movies/search/ranking", None, False)),
+    "read.read_ratings": (10, lambda rng, s: ("GET", f"/read/rating/{rng.choice(s['book_ids'])}", None, False)),
+    "watched.read_ratings": (5, lambda rng, s: ("GET", f"/watched/rating/{rng.choice(s['movie_ids'])}", None, False)),
+    "read.read_id": (5, lambda rng, s: ("GET", "/read/{user_id}", None, True)),
+    "watched.watched_id": (3, lambda rng, s: ("GET", "/watched/{user_id}", None, True)),
+    "read.sync_read": (4, lambda rng, s: ("POST", "/read/sync", [{"book_id": rng.choice(s["book_ids"]), "rating": rng.randint(1, 10)}], True)),
+    "watched.sync_watched": (2, lambda rng, s: ("POST", "/watched/sync", [{"movie_id": rng.choice(s["movie_ids"]), "rating": rng.randint(1, 10)}], True)),
+    "auth.auth_login": (1, lambda rng, s: ("POST", "/auth/login", {"email": rng.choice(s["emails"]), "password": s["password"]}, False)),
+}
+
+
+# Return the value at percentile p of a sorted list, using the nearest rank
+def percentile(values, p):
+    if not values:
+        return None
+    index = max(0, min(len(values) - 1, int(round(p / 100 * len(values))) - 1))
+    return values[index]
+
+
+def main():
+    args = parse_args()
+
+    # The app reads its configuration from the environment when it is imported
+    os.environ["DATABASE_URL"] = args.database_url
+    os.environ.setdefault("FLASK_ENV", "testing")
+    os.environ.setdefault("SECRET_KEY", "benchmark")
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+    from sqlalchemy import event, select
+    from app import create_app, db
+    from models.users import User
+    from models.books import Book, Author
+    from models.movies import Movie
+    from synthetic_data import generate, PASSWORD
+
+    app = create_app()
+
+    with app.app_context():
+        if not args.no_seed:
+            db.drop_all()
+            db.create_all()
+            print(f"Seeding the database at scale {args.scale}...")
+            for table, rows, seconds in generate(args.scale, args.seed):
+                print(f"  {table}: {rows:,} rows in {seconds:.2f}s")
+
+        state = {
+            "book_ids": db.session.execute(select(Book.id)).scalars().all(),
+            "author_ids": db.session.execute(select(Author.id)).scalars().all(),
+            "movie_ids": db.session.execute(select(Movie.id)).scalars().all(),
+            "emails": db.session.execute(select(User.email).limit(100)).scalars().all(),
+            "password": PASSWORD
+        }
+
+        # Count the SQL statements run by each thread's current request
+        statements = threading.local()
+
+        def count_statement(*args, **kwargs):
+            statements.count = getattr(statements, "count", 0) + 1
+
+        event.listen(db.engine, "before_cursor_execute", count_statement)
+
+    # Log every user in the mix in once so authenticated requests can be sent
+    client = app.test_client()
+    tokens = []
+    for email in state["emails"][:20]:
+        response = client.post("/auth/login", json={"email": email, "password": PASSWORD})
+        if response.status_code == 200:
+            tokens.append((response.get_json()["token"], email))
+    with app.app_context():
+        ids = dict(db.session.execute(select(User.email, User.id).where(User.email.in_([email for token, email in tokens]))).all())
+    tokens = [(token, ids[email]) for token, email in tokens]
+
+    names = list(MIX)
+    weights = [MIX[name][0] for name in names]
+    results = defaultdict(lambda: {"latencies": [], "statements": [], "errors": 0})
+    lock = threading.Lock()
+
+    def worker(count, seed, record):
+        rng = random.Random(seed)
+        worker_client = app.test_client()
+        for number in range(count):
+            name = rng.choices(names, weights=weights)[0]
+            method, url, body, needs_token = MIX[name][1](rng, state)
+            headers = {}
+            if needs_token:
+                token, user_id = rng.choice(tokens)
+                headers["Authorization"] = f"Bearer {token}"
+                url = url.format(user_id=user_id)
+
+            statements.count = 0
+            start = time.perf_counter()
+            response = worker_client.open(url, method=method, json=body, headers=headers)
+            elapsed = time.perf_counter() - start
+
+            if record:
+                with lock:
+                    result = results[name]
+                    result["latencies"].append(elapsed)
+                    result["statements"].append(statements.count)
+                    if response.status_code >= 400:
+                        result["errors"] += 1
+
+    def run(total, record):
+        threads = [
+            threading.Thread(target=worker, args=(total // args.concurrency, args.seed + number, record))
+            for number in range(args.concurrency)
+        ]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return time.perf_counter() - start
+
+    run(args.warmup, False)
+    wall_time = run(args.requests, True)
+
+    report = {
+        "database": args.database_url.split("://")[0],
+        "scale": args.scale,
+        "concurrency": args.concurrency,
+        "requests": sum(len(result["latencies"]) for result in results.values()),
+        "wall_time_s": round(wall_time, 3),
+        "endpoints": {}
+    }
+    report["throughput_rps"] = round(report["requests"] / wall_time, 1)
+
+    for name in names:
+        result = results.get(name)
+        if not result or not result["latencies"]:
+            continue
+        latencies = sorted(result["latencies"])
+        report["endpoints"][name] = {
+            "requests": len(latencies),
+            "errors": result["errors"],
+            "throughput_rps": round(len(latencies) / sum(latencies), 1),
+            "p50_ms": round(percentile(latencies, 50) * 1000, 3),
+            "p95_ms": round(percentile(latencies, 95) * 1000, 3),
+            "p99_ms": round(percentile(latencies, 99) * 1000, 3),
+            "sql_per_request": round(sum(result["statements"]) / len(latencies), 2)
+        }
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as file:
+            baseline = json.load(file)["endpoints"]
+
+    print_report(report, baseline)
+
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(report, file, indent=2)
+        print(f"Results saved to {args.output}")
+
+
+def print_report(report, baseline=None):
+    print(f"\n{report['requests']} requests in {report['wall_time_s']}s ({report['throughput_rps']} req/s, concurrency {report['concurrency']})\n")
+    header = f"{'endpoint':<32}{'requests':>9}{'errors':>8}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'sql/req':>9}"
+    if baseline:
+        header += f"{'p50 change':>12}"
+    print(header)
+
+    for name, result in report["endpoints"].items():
+        line = (f"{name:<32}{result['requests']:>9}{result['errors']:>8}{result['throughput_rps']:>10}"
+                f"{result['p50_ms']:>10}{result['p95_ms']:>10}{result['p99_ms']:>10}{result['sql_per_request']:>9}")
+        if baseline and name in baseline:
+            change = (result["p50_ms"] - baseline[name]["p50_ms"]) / baseline[name]["p50_ms"] * 100
+            line += f"{change:>+11.1f}%"
+        print(line)
+    print()
+
+
+if __name__ == "__main__":
+    main()
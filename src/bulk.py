@@ -0,0 +1,132 @@
+import json
+from flask import request, abort, current_app
+from marshmallow import exceptions
+from sqlalchemy import exc, insert, select
+from app import db
+from full_text_search import INDEXED, index_documents
+
+
+# Content types accepted for a stream of newline delimited JSON objects
+NDJSON_MIMETYPES = ("application/x-ndjson", "application/ndjson")
+
+
+# Yield each row of the request body with its position, as (row, data)
+# The body is either a JSON array, or NDJSON which is read line by line so the whole body is never held in memory
+# A line that is not valid JSON is yielded as the error raised when parsing it
+def read_rows():
+    if request.mimetype in NDJSON_MIMETYPES:
+        row = 0
+        for line in request.stream:
+            if not line.strip():
+                continue
+            try:
+                yield row, json.loads(line)
+            except ValueError as error:
+                yield row, error
+            row += 1
+        return
+
+    rows = request.get_json()
+    if not isinstance(rows, list):
+        return abort(400, description="Request body must be a JSON array or NDJSON.")
+    yield from enumerate(rows)
+
+
+# Split rows into lists of at most size rows
+def chunked(rows, size):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+# Validate and insert every row in the request body into the model's table
+# Rows are validated with the schema and inserted with multi-row statements, committing once per chunk.
+# A row that fails validation, repeats the value of the unique column or breaks a constraint is
+# reported in the errors and does not stop the rest of the rows being inserted.
+def bulk_insert(model, schema, columns, unique=None):
+    chunk_size = current_app.config.get("BULK_CHUNK_SIZE", 500)
+    inserted = 0
+    errors = []
+
+    for chunk in chunked(read_rows(), chunk_size):
+        valid = _validate(chunk, schema, columns, errors)
+        if unique:
+            valid = _remove_duplicates(valid, getattr(model, unique), errors)
+        inserted += _insert(model, valid, errors)
+
+    errors.sort(key=lambda error: error["row"])
+    return {"inserted": inserted, "failed": len(errors), "errors": errors}
+
+
+def _validate(chunk, schema, columns, errors):
+    valid = []
+    for row, data in chunk:
+        if isinstance(data, Exception):
+            errors.append({"row": row, "error": "Invalid JSON."})
+            continue
+        try:
+            fields = schema.load(data)
+        except exceptions.ValidationError as error:
+            errors.append({"row": row, "error": error.messages})
+            continue
+        missing = [column for column in columns if fields.get(column) is None]
+        if missing:
+            errors.append({"row": row, "error": f"Field missing from request body: {', '.join(missing)}."})
+            continue
+        valid.append((row, {column: fields[column] for column in columns}))
+    return valid
+
+
+# Remove rows whose unique value is already in the table, or appears earlier in the chunk
+def _remove_duplicates(valid, column, errors):
+    values = [values[column.key] for row, values in valid]
+    existing = set(db.session.execute(select(column).where(column.in_(values))).scalars()) if values else set()
+    seen = set()
+    kept = []
+
+    for row, values in valid:
+        value = values[column.key]
+        if value in existing or value in seen:
+            errors.append({"row": row, "error": f"{column.key} is already associated with another entry in the database."})
+            continue
+        seen.add(value)
+        kept.append((row, values))
+    return kept
+
+
+def _insert(model, valid, errors):
+    if not valid:
+        return 0
+
+    try:
+        ids = db.session.execute(insert(model).returning(model.id), [values for row, values in valid]).scalars().all()
+        _index(model, ids)
+        db.session.commit()
+        return len(valid)
+    except (exc.IntegrityError, exc.DataError):
+        db.session.rollback()
+
+    # Find the rows that failed by inserting the chunk again one row at a time
+    ids = []
+    for row, values in valid:
+        try:
+            with db.session.begin_nested():
+                ids.append(db.session.execute(insert(model).returning(model.id), [values]).scalar_one())
+        except exc.IntegrityError:
+            errors.append({"row": row, "error": "Data entered matches an existing entry or refers to an entry that does not exist."})
+        except exc.DataError:
+            errors.append({"row": row, "error": "Invalid value in row."})
+    _index(model, ids)
+    db.session.commit()
+    return len(ids)
+
+
+# Add the inserted rows to the full-text search index, in the same transaction as the insert
+def _index(model, ids):
+    if model in INDEXED:
+        index_documents(model, ids)
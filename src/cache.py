@@ -0,0 +1,154 @@
+import pickle
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+from urllib.parse import urlencode
+from flask import request, g, current_app
+from werkzeug.exceptions import HTTPException
+from werkzeug.wrappers import Response
+
+
+# In-process cache backend
+# Least recently used entries are removed once max_entries is reached, and entries expire after their ttl
+class MemoryBackend(object):
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._counters = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get_counters(self, keys):
+        with self._lock:
+            return [self._counters.get(key, 0) for key in keys]
+
+    def incr(self, key):
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + 1
+
+
+# Cache backend shared between processes, using Redis
+# Requires the redis package, which is only imported when this backend is configured
+class RedisBackend(object):
+    def __init__(self, url, prefix="stephen_king_api:"):
+        import redis
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+
+    def get(self, key):
+        value = self.client.get(self.prefix + key)
+        return pickle.loads(value) if value is not None else None
+
+    def set(self, key, value, ttl):
+        self.client.set(self.prefix + key, pickle.dumps(value), ex=ttl)
+
+    def get_counters(self, keys):
+        if not keys:
+            return []
+        return [int(value or 0) for value in self.client.mget([self.prefix + key for key in keys])]
+
+    def incr(self, key):
+        self.client.incr(self.prefix + key)
+
+
+# Cache for the responses of public GET endpoints
+# Each cached response is stored with the version of every tag it depends on, e.g. "book" for any list
+# of books and "book:5" for the book with id 5. Invalidating a tag increments its version, so only the
+# responses tagged with it are treated as stale.
+class ResponseCache(object):
+    def __init__(self, app=None):
+        self.backend = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        backend = app.config.get("RESPONSE_CACHE_BACKEND", "memory")
+        self.ttl = app.config.get("RESPONSE_CACHE_TTL", 60)
+
+        if backend == "memory":
+            self.backend = MemoryBackend(app.config.get("RESPONSE_CACHE_MAX_ENTRIES", 1024))
+        elif backend == "redis":
+            self.backend = RedisBackend(app.config["RESPONSE_CACHE_REDIS_URL"])
+        elif backend == "none":
+            self.backend = None
+        else:
+            raise ValueError(f"Unknown RESPONSE_CACHE_BACKEND: {backend}")
+
+    # Decorator to cache the response of a GET endpoint
+    # Responses are keyed by the path and normalized query string, and tagged with the tags given
+    # plus any added by the endpoint with add_tags. Error responses, such as 400 "not found", are cached too.
+    def cached(self, *tags):
+        def decorator(func):
+            @wraps(func)
+            def function(*args, **kwargs):
+                if self.backend is None or request.method != "GET":
+                    return func(*args, **kwargs)
+
+                key = "response:" + request.path + "?" + urlencode(sorted(request.args.items(multi=True)))
+                entry = self.backend.get(key)
+
+                if entry is not None:
+                    status, body, headers, entry_tags, versions = entry
+                    if self._versions(entry_tags) == versions:
+                        response = Response(body, status=status, headers=headers)
+                        response.headers["X-Cache"] = "HIT"
+                        return response
+
+                # Note the number of invalidations before the query is run, so a response that may have
+                # been built from data changed while it ran is not cached
+                writes = self.backend.get_counters(["writes"])[0]
+                g.cache_tags = set(tags)
+
+                try:
+                    response = current_app.make_response(func(*args, **kwargs))
+                except HTTPException as error:
+                    if error.code >= 500:
+                        raise
+                    response = error.get_response()
+
+                if response.status_code < 500 and not response.is_streamed:
+                    entry_tags = sorted(g.cache_tags)
+                    counters = self.backend.get_counters(["writes"] + ["tag:" + tag for tag in entry_tags])
+                    if counters[0] == writes:
+                        entry = (response.status_code, response.get_data(), list(response.headers), entry_tags, counters[1:])
+                        self.backend.set(key, entry, self.ttl)
+
+                response.headers["X-Cache"] = "MISS"
+                return response
+            return function
+        return decorator
+
+    # Add tags to the response currently being cached, e.g. the ids of the entities it contains
+    def add_tags(self, *tags):
+        if "cache_tags" in g:
+            g.cache_tags.update(tags)
+
+    # Mark every cached response tagged with any of the tags given as stale
+    def invalidate(self, *tags):
+        if self.backend is None:
+            return
+        for tag in set(tags):
+            self.backend.incr("tag:" + tag)
+        self.backend.incr("writes")
+
+    def _versions(self, tags):
+        return self.backend.get_counters(["tag:" + tag for tag in tags])
@@ -1,10 +1,16 @@
 from app import db, bcrypt
 from flask import Blueprint
+import click
 from models.users import User
 from models.books import Book, Author, Publisher
 from models.movies import Movie, Director, ProductionCompany
 from models.read import Read
 from models.watched import Watched
+from models.ratings import BookRating, MovieRating
+from rating_aggregates import rebuild_ratings
+from full_text_search import rebuild_search_index
+from synthetic_data import generate
+from migrations import run_migrations, mark_migrations_applied
 
 
 # Create database commands Blueprint
@@ -15,11 +21,22 @@ db_commands = Blueprint("db", __name__)
 @db_commands .cli.command("create")
 def create_db():
     db.create_all()
+    mark_migrations_applied()
     print("Tables Created.")
 
 
+# Seed table CLI command - execute using "flask db seed" on the command line
+# Use "flask db seed --scale N" to generate a larger synthetic data set for load testing instead
 @db_commands .cli.command("seed")
-def seed_db():
+@click.option("--scale", type=int, default=None, help="Generate synthetic data, e.g. --scale 100 for 100,000 books and 2 million reviews.")
+@click.option("--seed", default=1, show_default=True, help="Random seed used to generate synthetic data.")
+def seed_db(scale, seed):
+    if scale:
+        seed_synthetic(scale, seed)
+        return
+
+    # Hash the shared password once, rather than for each user
+    password = bcrypt.generate_password_hash("12345678").decode("utf-8")
 
     #Seed the user table first
     admin = User(
@@ -35,7 +52,7 @@ def seed_db():
         first_name = "Another Admin",
         surname = "Another User",
         email = "adminemail@email.com",
-        password = bcrypt.generate_password_hash("12345678").decode("utf-8"),
+        password = password,
         admin = True
     )
     db.session.add(admin2)
@@ -44,7 +61,7 @@ def seed_db():
         first_name = "Jane",
         surname = "Doe",
         email = "email1@email.com",
-        password = bcrypt.generate_password_hash("12345678").decode("utf-8"),
+        password = password,
         admin = False
     )
     db.session.add(user1)
@@ -53,7 +70,7 @@ def seed_db():
         first_name = "John",
         surname = "Smith",
         email = "email@email.com",
-        password = bcrypt.generate_password_hash("12345678").decode("utf-8"),
+        password = password,
         admin = False
     )
     db.session.add(user2)
@@ -103,9 +120,9 @@ def seed_db():
     carrie = Book(
         title = "Carrie",
         isbn = "0385086954",
-        length = "199",
+        length = 199,
         first_publication_date = "1974-04-05",
-        copies_published = "30000",
+        copies_published = 30000,
         author_id = author1.id,
         publisher_id = publisher1.id
     )
@@ -114,9 +131,9 @@ def seed_db():
     salems_lot = Book(
         title = "'Salem's Lot",
         isbn = "0385007515",
-        length = "439",
+        length = 439,
         first_publication_date = "1975-10-17",
-        copies_published = "20000",
+        copies_published = 20000,
         author_id = author1.id,
         publisher_id = publisher1.id
     )
@@ -125,9 +142,9 @@ def seed_db():
     the_shining = Book(
         title = "The Shining",
         isbn = "0385121679",
-        length = "447",
+        length = 447,
         first_publication_date = "1977-01-28",
-        copies_published = "25000",
+        copies_published = 25000,
         author_id = author1.id,
         publisher_id = publisher1.id
     )
@@ -136,9 +153,9 @@ def seed_db():
     rage = Book(
         title = "Rage",
         isbn = "0451076451",
-        length = "211",
+        length = 211,
         first_publication_date = "1977-09-06",
-        copies_published = "75000",
+        copies_published = 75000,
         author_id = author2.id,
         publisher_id = publisher2.id
     )
@@ -147,9 +164,9 @@ def seed_db():
     the_stand = Book(
         title = "The Stand",
         isbn = "0385121687",
-        length = "823",
+        length = 823,
         first_publication_date = "1978-10-03",
-        copies_published = "70000",
+        copies_published = 70000,
         author_id = author1.id,
         publisher_id = publisher1.id
     )
@@ -158,9 +175,9 @@ def seed_db():
     the_talisman = Book(
         title = "The Talisman",
         isbn = "0670691992",
-        length = "646",
+        length = 646,
         first_publication_date = "1984-11-08",
-        copies_published = "1250",
+        copies_published = 1250,
         author_id = author3.id,
         publisher_id = publisher3.id
     )
@@ -169,9 +186,9 @@ def seed_db():
     pet_sematary = Book(
         title = "Pet Sematary",
         isbn = "0805775129",
-        length = "374",
+        length = 374,
         first_publication_date = "1983-11-14",
-        copies_published = "250000",
+        copies_published = 250000,
         author_id = author1.id,
         publisher_id = publisher1.id
     )
@@ -219,7 +236,7 @@ def seed_db():
     carrie_movie = Movie(
         title = "Carrie",
         release_date = "1976-11-03",
-        length = "98",
+        length = 98,
         box_office_ranking = 22298,
         book_id = carrie.id,
         director_id = director1.id,
@@ -230,7 +247,7 @@ def seed_db():
     the_shining_movie = Movie(
         title = "The Shining",
         release_date = "1980-05-23",
-        length = "144",
+        length = 144,
         box_office_ranking = 10123,
         book_id = the_shining.id,
         director_id = director2.id,
@@ -241,7 +258,7 @@ def seed_db():
     pet_sematary_movie = Movie(
         title = "Pet Sematary",
         release_date = "1989-04-21",
-        length = "103",
+        length = 103,
         box_office_ranking = 26006,
         book_id = pet_sematary.id,
         director_id = director3.id,
@@ -301,9 +318,61 @@ def seed_db():
     db.session.commit()
 
 
+    # Calculate the rating aggregates for the seeded reviews
+    rebuild_ratings(BookRating)
+    rebuild_ratings(MovieRating)
+
+
     print("Tables Seeded.")
 
 
+# Generate a synthetic data set and report how quickly each table was loaded
+def seed_synthetic(scale, seed):
+    total_rows = 0
+    total_seconds = 0
+
+    for table, rows, seconds in generate(scale, seed):
+        print(f"{table}: {rows:,} rows in {seconds:.2f}s ({rows / max(seconds, 1e-9):,.0f} rows/s)")
+        total_rows += rows
+        total_seconds += seconds
+
+    print(f"Tables Seeded. {total_rows:,} rows in {total_seconds:.2f}s ({total_rows / max(total_seconds, 1e-9):,.0f} rows/s)")
+
+
+# Rebuild the book and movie rating aggregates from the read and watched tables
+# Execute using "flask db rebuild-ratings" on the command line
+@db_commands .cli.command("rebuild-ratings")
+@click.option("--chunk-size", default=1000, show_default=True, help="Number of books or movies to rebuild per transaction.")
+def rebuild_ratings_db(chunk_size):
+    books = rebuild_ratings(BookRating, chunk_size)
+    print(f"Ratings rebuilt for {books} books.")
+    movies = rebuild_ratings(MovieRating, chunk_size)
+    print(f"Ratings rebuilt for {movies} movies.")
+
+
+# Rebuild the full-text search index from the book, movie, author, director, publisher and production company tables
+# Execute using "flask db rebuild-search" on the command line
+@db_commands .cli.command("rebuild-search")
+def rebuild_search_db():
+    documents = rebuild_search_index()
+    print(f"Search index rebuilt with {documents} entries.")
+
+
+# Migrate CLI command - execute using "flask db migrate" on the command line
+# Brings a database created by an earlier version of the API up to date with the models
+# Use "flask db migrate --online" on a live PostgreSQL database to build indexes without blocking writes
+@db_commands .cli.command("migrate")
+@click.option("--online", is_flag=True, help="Build indexes concurrently, without locking tables for writes.")
+def migrate_db(online):
+    try:
+        ran = run_migrations(online)
+    except ValueError as error:
+        raise click.ClickException(str(error))
+    for name, summary in ran:
+        print(f"Applied {name}." + (f" {summary}" if summary else ""))
+    print("Database is up to date." if not ran else f"{len(ran)} migration(s) applied.")
+
+
 # Drop table CLI command - execute using "flask drop" on the command line
 @db_commands .cli.command("drop")
 def drop_db():
@@ -1,10 +1,100 @@
 import os
+from sqlalchemy.engine import make_url
+from pool_monitor import MonitoredQueuePool
+
+
+# Read a true/false setting from an environment variable
+def env_bool(name, default):
+    value = os.environ.get(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+# Read a setting given as "key=value" pairs separated by commas from an environment variable
+def env_map(name, default):
+    value = os.environ.get(name)
+    if value is None:
+        return default
+    return {key.strip(): item.strip() for key, _, item in (pair.partition("=") for pair in value.split(",")) if key.strip()}
 
 class Config(object):
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     # Get SECRET_Key
     JWT_SECRET_KEY =  os.environ.get("SECRET_KEY")
+    # How often each process reloads revoked token generations from the user table
+    JWT_REVOCATION_REFRESH_SECONDS = int(os.environ.get("JWT_REVOCATION_REFRESH_SECONDS", 30))
     JSON_SORT_KEYS=False
+    # bcrypt work factor for new password hashes, existing hashes are upgraded when the user next logs in
+    BCRYPT_LOG_ROUNDS = int(os.environ.get("BCRYPT_LOG_ROUNDS", 12))
+    # Number of passwords hashed at the same time, and the number of requests allowed to wait for a free worker
+    PASSWORD_HASH_WORKERS = int(os.environ.get("PASSWORD_HASH_WORKERS", max(1, (os.cpu_count() or 2) // 2)))
+    PASSWORD_HASH_QUEUE = int(os.environ.get("PASSWORD_HASH_QUEUE", 16))
+    # Page size used by list endpoints when ?after= is given without ?limit=, and the largest page allowed
+    PAGINATION_DEFAULT_LIMIT = int(os.environ.get("PAGINATION_DEFAULT_LIMIT", 25))
+    PAGINATION_MAX_LIMIT = int(os.environ.get("PAGINATION_MAX_LIMIT", 100))
+    # Number of rows validated and inserted per transaction by the bulk endpoints
+    BULK_CHUNK_SIZE = int(os.environ.get("BULK_CHUNK_SIZE", 500))
+    # Largest number of ratings a user can send to /read/sync or /watched/sync at once
+    SYNC_MAX_ITEMS = int(os.environ.get("SYNC_MAX_ITEMS", 1000))
+    # Largest number of ids or isbns that can be looked up in one request to the /batch endpoints
+    BATCH_MAX_KEYS = int(os.environ.get("BATCH_MAX_KEYS", 100))
+    # Number of rows fetched from the database at a time by the /export endpoints
+    EXPORT_BATCH_SIZE = int(os.environ.get("EXPORT_BATCH_SIZE", 1000))
+    # Write new reviews from /read/add and /watched/add in batches, committed every REVIEW_GROUP_COMMIT_MS milliseconds
+    # or every REVIEW_GROUP_COMMIT_ROWS reviews, whichever comes first. Larger values mean fewer commits but slower replies
+    REVIEW_GROUP_COMMIT = env_bool("REVIEW_GROUP_COMMIT", False)
+    REVIEW_GROUP_COMMIT_MS = int(os.environ.get("REVIEW_GROUP_COMMIT_MS", 10))
+    REVIEW_GROUP_COMMIT_ROWS = int(os.environ.get("REVIEW_GROUP_COMMIT_ROWS", 100))
+    # Cache for public GET endpoints, "memory" (per process), "redis" (shared) or "none"
+    RESPONSE_CACHE_BACKEND = os.environ.get("RESPONSE_CACHE_BACKEND", "memory")
+    RESPONSE_CACHE_REDIS_URL = os.environ.get("RESPONSE_CACHE_REDIS_URL")
+    RESPONSE_CACHE_TTL = int(os.environ.get("RESPONSE_CACHE_TTL", 60))
+    RESPONSE_CACHE_MAX_ENTRIES = int(os.environ.get("RESPONSE_CACHE_MAX_ENTRIES", 1024))
+    # Record the timing of every request for the Server-Timing header and /metrics, and the token /metrics
+    # requires as "Authorization: Bearer <token>" (open to anyone if not set)
+    METRICS_ENABLED = env_bool("METRICS_ENABLED", True)
+    METRICS_TOKEN = os.environ.get("METRICS_TOKEN")
+    # How often each process rebuilds its autocomplete index from the database, to pick up changes made by other processes
+    AUTOCOMPLETE_REFRESH_SECONDS = int(os.environ.get("AUTOCOMPLETE_REFRESH_SECONDS", 300))
+    # What happens when a route runs more SQL statements than its @query_budget: "log" a warning, "raise" an error
+    # or "off" to stop counting. In strict mode lazy loading a relationship in a route with a budget raises an error
+    QUERY_BUDGET_MODE = os.environ.get("QUERY_BUDGET_MODE", "log")
+    QUERY_BUDGET_STRICT = env_bool("QUERY_BUDGET_STRICT", False)
+    # Log SQL statements taking longer than this many milliseconds (-1 to turn it off), explaining each at most once
+    # every SLOW_QUERY_EXPLAIN_INTERVAL seconds. They are written to SLOW_QUERY_LOG_FILE if it is set, rotated at
+    # SLOW_QUERY_LOG_MAX_BYTES keeping SLOW_QUERY_LOG_BACKUPS old files. Their parameters, which can hold emails
+    # and password hashes, are only logged with SLOW_QUERY_LOG_PARAMETERS
+    SLOW_QUERY_THRESHOLD_MS = int(os.environ.get("SLOW_QUERY_THRESHOLD_MS", 500))
+    SLOW_QUERY_LOG_FILE = os.environ.get("SLOW_QUERY_LOG_FILE")
+    SLOW_QUERY_LOG_PARAMETERS = env_bool("SLOW_QUERY_LOG_PARAMETERS", False)
+    SLOW_QUERY_LOG_MAX_BYTES = int(os.environ.get("SLOW_QUERY_LOG_MAX_BYTES", 10 * 1024 * 1024))
+    SLOW_QUERY_LOG_BACKUPS = int(os.environ.get("SLOW_QUERY_LOG_BACKUPS", 5))
+    SLOW_QUERY_EXPLAIN_INTERVAL = int(os.environ.get("SLOW_QUERY_EXPLAIN_INTERVAL", 300))
+    # Classes of endpoints (by blueprint, or "blueprint.endpoint") limited to a number of requests served at once by
+    # each process, and the requests of each class that can wait, as "class=limit:queue". Requests still waiting
+    # after ADMISSION_QUEUE_TIMEOUT seconds, or finding the queue full, get a 503 with Retry-After
+    ADMISSION_CONTROL_ENABLED = env_bool("ADMISSION_CONTROL_ENABLED", True)
+    ADMISSION_CLASSES = env_map("ADMISSION_CLASSES", {
+        "auth": "auth",
+        "books.get_all_books": "bulk",
+        "movies.get_all_movies": "bulk",
+        "books.bulk_add_books": "bulk",
+        "movies.bulk_add_movies": "bulk",
+        "export": "bulk"
+    })
+    ADMISSION_LIMITS = os.environ.get("ADMISSION_LIMITS", "auth=4:8,bulk=4:8")
+    ADMISSION_QUEUE_TIMEOUT = float(os.environ.get("ADMISSION_QUEUE_TIMEOUT", 1.0))
+    ADMISSION_RETRY_AFTER = int(os.environ.get("ADMISSION_RETRY_AFTER", 1))
+    # Connection pool for each process: connections kept open, extra connections allowed under load,
+    # seconds to wait for a free connection, and seconds before a connection is replaced (-1 to keep them)
+    DB_POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", 5))
+    DB_MAX_OVERFLOW = int(os.environ.get("DB_MAX_OVERFLOW", 10))
+    DB_POOL_TIMEOUT = int(os.environ.get("DB_POOL_TIMEOUT", 30))
+    DB_POOL_RECYCLE = int(os.environ.get("DB_POOL_RECYCLE", 1800))
+    # Test each connection before it is used, so connections dropped by the server are replaced
+    DB_POOL_PRE_PING = env_bool("DB_POOL_PRE_PING", True)
+    # PostgreSQL cancels any statement running longer than this many milliseconds (0 for no limit)
+    DB_STATEMENT_TIMEOUT_MS = int(os.environ.get("DB_STATEMENT_TIMEOUT_MS", 30000))
     @property
     def SQLALCHEMY_DATABASE_URI(self):
         # Get DATABASE_URL
@@ -15,14 +105,51 @@ class Config(object):
 
         return URL
 
+    @property
+    def SQLALCHEMY_ENGINE_OPTIONS(self):
+        options = {
+            "pool_pre_ping": self.DB_POOL_PRE_PING,
+            "pool_recycle": self.DB_POOL_RECYCLE
+        }
+        url = make_url(self.SQLALCHEMY_DATABASE_URI)
+
+        # In-memory SQLite databases live in a single connection, so there is no pool to size
+        if url.get_backend_name() == "sqlite" and url.database in (None, "", ":memory:"):
+            return options
+
+        options.update({
+            "poolclass": MonitoredQueuePool,
+            "pool_size": self.DB_POOL_SIZE,
+            "max_overflow": self.DB_MAX_OVERFLOW,
+            "pool_timeout": self.DB_POOL_TIMEOUT
+        })
+
+        # Set the timeout on the server when each connection is opened, so it applies to every statement
+        if url.get_backend_name() == "postgresql" and self.DB_STATEMENT_TIMEOUT_MS > 0:
+            options["connect_args"] = {"options": f"-c statement_timeout={self.DB_STATEMENT_TIMEOUT_MS}"}
+
+        return options
+
 class DevelopmentConfig(Config):
     DEBUG = True
+    # Long running queries are allowed while developing
+    DB_STATEMENT_TIMEOUT_MS = int(os.environ.get("DB_STATEMENT_TIMEOUT_MS", 0))
 
 class ProductionConfig(Config):
-    pass
+    DB_POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", 10))
+    DB_MAX_OVERFLOW = int(os.environ.get("DB_MAX_OVERFLOW", 20))
+    DB_POOL_TIMEOUT = int(os.environ.get("DB_POOL_TIMEOUT", 10))
 
 class TestingConfig(Config):
-    pass
+    # Do not cache responses in tests unless asked to
+    RESPONSE_CACHE_BACKEND = os.environ.get("RESPONSE_CACHE_BACKEND", "none")
+    # Fail quickly rather than hang when a test leaks connections or runs a slow query
+    DB_POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", 2))
+    DB_POOL_TIMEOUT = int(os.environ.get("DB_POOL_TIMEOUT", 5))
+    DB_STATEMENT_TIMEOUT_MS = int(os.environ.get("DB_STATEMENT_TIMEOUT_MS", 5000))
+    # Fail tests that run more statements than a route's budget, or lazy load a relationship
+    QUERY_BUDGET_MODE = os.environ.get("QUERY_BUDGET_MODE", "raise")
+    QUERY_BUDGET_STRICT = env_bool("QUERY_BUDGET_STRICT", True)
 
 environment = os.environ.get("FLASK_ENV")
 
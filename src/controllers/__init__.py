@@ -8,6 +8,11 @@ from controllers.director_controller import directors
 from controllers.movie_controller import movies
 from controllers.read_controller import read
 from controllers.watched_controller import watched
+from controllers.admin_controller import admin
+from controllers.search_controller import search
+from controllers.autocomplete_controller import autocomplete_suggestions
+from controllers.export_controller import export
+from controllers.metrics_controller import metrics
 
 
 registerable_controllers = [
@@ -20,5 +25,10 @@ registerable_controllers = [
     directors,
     movies,
     read,
-    watched
+    watched,
+    search,
+    autocomplete_suggestions,
+    export,
+    metrics,
+    admin
 ]
\ No newline at end of file
@@ -0,0 +1,47 @@
+from flask import Blueprint, jsonify, request, abort
+from app import db, slow_query_log
+from authorization import admin_required
+from pool_monitor import pool_status
+
+
+# Define blueprint 
+admin = Blueprint('admin', __name__, url_prefix="/admin")
+
+
+# Return the connection pool statistics for the process serving the request
+# Only available to an admin
+@admin.route("/pool", methods=["GET"])
+@admin_required(description="You are not authorized to view this information.")
+def get_pool_status():
+    return jsonify(pool_status(db.engine))
+
+
+# Return the SQL statements slower than SLOW_QUERY_THRESHOLD_MS run by the process serving the request,
+# grouped by statement with their values replaced by ?, most costly first
+# Sort by ?sort=total (default), count, max or mean, and return ?limit= statements (20 by default)
+# Only available to an admin
+@admin.route("/slow-queries", methods=["GET"])
+@admin_required(description="You are not authorized to view this information.")
+def get_slow_queries():
+    sort = request.args.get("sort", "total")
+    if sort not in ("total", "count", "max", "mean"):
+        return abort(400, description="Invalid sort, choose from total, count, max or mean.")
+
+    limit = request.args.get("limit", 20, type=int)
+    if limit < 1:
+        return abort(400, description="Invalid limit in query string.")
+
+    key = "count" if sort == "count" else f"{sort}_ms"
+    return jsonify(
+        threshold_ms=None if slow_query_log.threshold is None else slow_query_log.threshold * 1000,
+        statements=slow_query_log.top(limit, key)
+    )
+
+
+# Clear the slow query statistics of the process serving the request
+# Only available to an admin
+@admin.route("/slow-queries", methods=["DELETE"])
+@admin_required(description="You are not authorized to clear this information.")
+def clear_slow_queries():
+    slow_query_log.clear()
+    return jsonify(message="Slow query statistics cleared.")
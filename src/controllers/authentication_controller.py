@@ -2,11 +2,17 @@ from flask import Blueprint, jsonify, request, abort
 from app import db
 from marshmallow import exceptions
 from models.users import User
+from models.ratings import BookRating, MovieRating
 from schemas.user_schema import user_schema, users_schema
+from serializers import schema_response
 from datetime import timedelta
-from app import bcrypt
-from flask_jwt_extended import create_access_token, jwt_required, get_jwt_identity
+from passwords import hash_password, check_password, needs_rehash
+from authorization import admin_required, user_required, current_user_id, create_user_token, revoke_user_tokens, revoke_deleted_user_tokens
 from helper import exception_handler
+from query_budget import query_budget
+from autocomplete import autocomplete
+from rating_aggregates import refresh_ratings
+from pagination import paginate, paginated_response
 
 
 # Define blueprint 
@@ -32,7 +38,7 @@ def auth_register():
             user.first_name  = user_fields["first_name"]
             user.surname = user_fields["surname"]
             user.email = user_fields["email"]
-            user.password = bcrypt.generate_password_hash(user_fields["password"]).decode("utf-8")
+            user.password = hash_password(user_fields["password"])
             
             # Commit the new user's details to the user table
             db.session.add(user)
@@ -53,13 +59,18 @@ def auth_login():
     user = db.session.query(User).filter_by(email=user_fields["email"]).first()
 
     # Return an error if the user's details are incorrect or the user does not exist in the database
-    if not user or not bcrypt.check_password_hash(user.password, user_fields["password"]):
+    if not user or not check_password(user.password, user_fields["password"]):
         return abort(400, description="Account not found. Incorrect username and/or password.")
 
+    # Upgrade the password hash if the bcrypt work factor has changed since it was created
+    if needs_rehash(user.password):
+        user.password = hash_password(user_fields["password"])
+        db.session.commit()
+
     # Set JWT expiry time-frame
     expiry = timedelta(days=1)
-    # Create JWT and assign to the user
-    access_token = create_access_token(identity=str(user.id), expires_delta=expiry)
+    # Create JWT and assign to the user, with their admin status and token generation in the claims
+    access_token = create_user_token(user, expiry)
     # Return the user's email address and the access token
     return jsonify({"user": user.first_name, "token": access_token})
 
@@ -67,42 +78,22 @@ def auth_login():
 # Allow admin users to view all user
 @auth.route("/user/all", methods=["GET"])
 @exception_handler
-@jwt_required()
+@admin_required(description="You are not authorized to access this information.")
+@query_budget(1)
 def admin_get_users():
-    # Verify the user by getting their JWT identity querying the database with the id
-    validate_user = get_jwt_identity()
-    user = db.session.query(User).get(validate_user)
-
-    # If the user's id from the token does not match any record in the database, return an error
-    if not user:
-        return abort(401, description="User not found.")
-    
-    # Get all users from the database
-    users = db.session.query(User).all()
-
-    # If user is an admin return all users
-    if user.admin == True:
-        result = users_schema.dump(users)
-        return jsonify(result)
-    # If not, return an error
-    else:
-        return abort(403, description="You are not authorized to access this information.")
+    # Return all users
+    # Optional keyset pagination with ?limit= and ?after=
+    users, next_cursor = paginate(db.session.query(User), User.id)
+    return paginated_response(schema_response(users_schema, users), next_cursor)
 
 
 # Return a user from the database
 # Query by email address
 @auth.route("/user/<string:email>", methods=["GET"])
 @exception_handler
-@jwt_required()
+@user_required()
+@query_budget(1)
 def get_user(email):
-    # Verify the user by getting their JWT identity querying the database with the id
-    validate_user = get_jwt_identity()
-    user = db.session.query(User).get(validate_user)
-
-    # If the user's id from the token does not match any record in the database, return an error
-    if not user:
-        return abort(400, description="User not found.")
-    
     # Use the email address provided in the URL to query the database for a match
     user_email = db.session.query(User).filter(User.email == email).first()
 
@@ -111,11 +102,11 @@ def get_user(email):
         return abort(400, description="User not found.")
     
     # If a record is found but the user id from the JWT token does not match the user id on the record, return an error
-    if (user_email.id != user.id):
+    if (user_email.id != current_user_id()):
         return abort(403, description="You are not authorized to access this information.")
     
     # Return the user's user_id, first_name and surname
-    result = user_schema.dump(user)
+    result = user_schema.dump(user_email)
     return jsonify(result)
 
 
@@ -125,12 +116,11 @@ def get_user(email):
 # Must include first_name, surname, email and password
 @auth.route("/user/update", methods=["PUT"])
 @exception_handler
-@jwt_required()
+@user_required()
 def auth_update():
     try:
-        # Verify the user by getting their JWT identity querying the database with the id
-        validate_user = get_jwt_identity()
-        user = db.session.query(User).get(validate_user)
+        # Get the user to update from their JWT identity
+        user = db.session.get(User, current_user_id())
         
         # If the user's id from the token does not match any record in the database, return an error
         if not user:
@@ -141,7 +131,9 @@ def auth_update():
         user.first_name = user_fields["first_name"]
         user.surname = user_fields["surname"]
         user.email = user_fields["email"]
-        user.password = bcrypt.generate_password_hash(user_fields["password"]).decode("utf-8")
+        user.password = hash_password(user_fields["password"])
+        # Revoke the user's existing tokens, as their details have changed they must login again
+        revoke_user_tokens(user)
 
         # Commit the user's new details to the user table
         db.session.commit()
@@ -155,23 +147,15 @@ def auth_update():
 # Requires the new admin status in the request body
 @auth.route("/register/admin/<int:id>", methods=["PUT"])
 @exception_handler
-@jwt_required()
+@admin_required(description="You are not authorized to access to make this change.")
 def auth_admin_register(id):
-    # Verify the user by getting their JWT identity querying the database with the id
-    validate_user = get_jwt_identity()
-    user = db.session.query(User).get(validate_user)
-
-    # If the user's id from the token does not match any record in the database, return an error
-    if not user:
-        return abort(400, description="User not found.")
-    elif user.admin != True:
-        return abort(403, description="You are not authorized to access to make this change.")
-    
     user_to_admin = db.session.query(User).filter(User.id == id).first()
     
     # If the user is registered, change their admin status
     user_fields = user_schema.load(request.json)
     user_to_admin.admin = user_fields["admin"]
+    # Revoke the user's existing tokens, as the admin status in their claims is out of date
+    revoke_user_tokens(user_to_admin)
 
     # Commit the new user's details to the user table
     db.session.commit()
@@ -182,31 +166,34 @@ def auth_admin_register(id):
 # Delete a user from the database
 @auth.route("/user/unregister/<string:email>", methods=["DELETE"])
 @exception_handler
-@jwt_required()
+@user_required()
 def auth_delete(email):
-    # Verify the user by getting their JWT identity querying the database with the id
-    validate_user = get_jwt_identity()
-    user = db.session.query(User).get(validate_user)
-
-    # If the user's id from the token does not match any record in the database, return an error
-    if not user:
-        return abort(401, description="User not found.")
-
     # Use the email address provided in the URL to query the database for a match
-    user_email = db.session.query(User).filter(User.email == email).first()
+    user = db.session.query(User).filter(User.email == email).first()
 
     # If email provided does not match any record in the database, return an error
-    if not user_email:
+    if not user:
         return abort(400, description="User not found.")
     
     # If a record is found but the user id from the JWT token does not match the user id on the record, return an error
-    if (user_email.id != user.id):
+    if (user.id != current_user_id()):
         return abort(403, description="You are not authorized to access this information.")
 
 
+    # Find the books and movies the user has rated before their reviews are removed
+    book_ids = [read.book_id for read in user.read]
+    movie_ids = [watched.movie_id for watched in user.watched]
+
     # Delete the user from the database
     # Cascading delete on User model will ensure all entries made to the database by the user will also be removed
     db.session.delete(user)
+    # Recalculate the rating aggregates for the books and movies the user had rated
+    refresh_ratings(BookRating, book_ids)
+    refresh_ratings(MovieRating, movie_ids)
+    # Revoke the deleted user's tokens in every process
+    revoke_deleted_user_tokens(user.id)
     db.session.commit()
+    # The user's reviews no longer count towards the popularity of books and movies
+    autocomplete.invalidate()
 
     return jsonify(message="User registration has been removed."), 200
\ No newline at end of file
@@ -1,12 +1,17 @@
 from flask import Blueprint, jsonify, request, abort
-from app import db
+from app import db, response_cache
 from sqlalchemy import exc
 from marshmallow import exceptions
 from models.books import Author
 from schemas.author_schema import author_schema, authors_schema
-from flask_jwt_extended import jwt_required, get_jwt_identity
-from models.users import User
+from serializers import schema_response
+from authorization import admin_required
 from helper import exception_handler
+from query_budget import query_budget
+from autocomplete import autocomplete
+from eager_loading import schema_query
+from pagination import paginate, paginated_response
+from sparse_fieldsets import requested_fields
 
 
 # Define blueprint 
@@ -16,16 +21,22 @@ authors = Blueprint('authors', __name__, url_prefix="/authors")
 # Query database to get all the authors from the author table
 # Public access - no authentication required
 @authors.route("/", methods=["GET"])
+@response_cache.cached("author")
 @exception_handler
+@query_budget(1)
 def get_all_authors():
-    authors = db.session.query(Author).all()
-    result = authors_schema.dump(authors)
-    return jsonify(result)
+    # Optional sparse fieldset with ?fields=, e.g. ?fields=id,published_name
+    schema = requested_fields(authors_schema)
+    # Optional keyset pagination with ?limit= and ?after=
+    authors, next_cursor = paginate(schema_query(schema, Author, sparse=True), Author.id)
+    return paginated_response(schema_response(schema, authors), next_cursor)
 
 
 # Query the authors table with a query string
 @authors.route("/search", methods=["GET"])
+@response_cache.cached("author")
 # @exception_handler
+@query_budget(1)
 def search_authors():
     try:
         # Create a list to hold the results
@@ -48,8 +59,7 @@ def search_authors():
             return abort(400, description="Missing or invalid query string.")
 
         # Return authors_list in JSON format
-        result = authors_schema.dump(authors_list)
-        return jsonify(result)
+        return schema_response(authors_schema, authors_list)
     # Catch errors if an invalid query is attempted
     except exc.DataError:
         return abort(400, description="Invalid parameter in query string")
@@ -57,11 +67,16 @@ def search_authors():
 
 # Query the authors table with author_id
 @authors.route("/search/<int:id>", methods=["GET"])
+@response_cache.cached()
 @exception_handler
+@query_budget(1)
 def search_author(id):
     # Query database by author_id
     author = db.session.query(Author).filter_by(id=id).first()
 
+    # Tag the cached response with the author found, or with the author table if there is no match
+    response_cache.add_tags(f"author:{id}" if author else "author")
+
     # Return error message if the id passed is invalid
     if not author:
         return jsonify(message="Invalid query string.")
@@ -77,19 +92,9 @@ def search_author(id):
 # "published_name", "collaboration, collaborator_name" and "pen_name"
 @authors.route("/add", methods=["POST"])
 @exception_handler
-@jwt_required()
+@admin_required(description="You are not authorized to add an author.")
 def add_author():
     try:
-        # Verify the user by getting their JWT identity and querying the database with the id
-        validate_user = get_jwt_identity()
-        user = db.session.query(User).get(validate_user)
-        
-        # If the user's id from the token does not match any record in the database, return an error
-        if not user:
-            return abort(400, description="User not found.")
-        if user.admin != True:
-            return abort(403, description="You are not authorized to add an author.")
-        
         # Add the new author's details
         author = Author()
         author_fields = author_schema.load(request.json)
@@ -101,6 +106,8 @@ def add_author():
         # Commit the new author's details to the author table
         db.session.add(author)
         db.session.commit()
+        response_cache.invalidate("author")
+        autocomplete.put("author", author.id, author.published_name)
 
         return jsonify(message="You have added an author to the table."), 200
     # Handle errors within the request body
@@ -114,19 +121,9 @@ def add_author():
 # "published_name", "collaboration, collaborator_name" and "pen_name"
 @authors.route("/update/<int:author_id>", methods=["PUT"])
 @exception_handler
-@jwt_required()
+@admin_required(description="You are not authorized to add an author.")
 def update_author(author_id):
     try:
-        # Verify the user by getting their JWT identity and querying the database with the id
-        validate_user = get_jwt_identity()
-        user = db.session.query(User).get(validate_user)
-        
-        # If the user's id from the token does not match any record in the database, return an error
-        if not user:
-            return abort(400, description="User not found.")
-        if user.admin != True:
-            return abort(403, description="You are not authorized to add an author.")
-        
         # Find the author by id
         author = db.session.query(Author).filter_by(id=author_id).first()
         if not author:
@@ -141,6 +138,8 @@ def update_author(author_id):
 
         # Commit the updated details to the author table
         db.session.commit()
+        response_cache.invalidate("author", f"author:{author_id}")
+        autocomplete.put("author", author.id, author.published_name)
 
         return jsonify(message="You have successfully updated this author to the database."), 200
     except exceptions.ValidationError:
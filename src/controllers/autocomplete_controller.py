@@ -0,0 +1,41 @@
+from flask import Blueprint, jsonify, request, abort
+from helper import exception_handler
+from autocomplete import autocomplete, MAX_SUGGESTIONS
+
+
+# Define blueprint 
+autocomplete_suggestions = Blueprint('autocomplete', __name__, url_prefix="/autocomplete")
+
+
+# Suggest book and movie titles and author, director, publisher and production company names starting with a prefix
+# e.g. /autocomplete?prefix=dark%20t, or /autocomplete?prefix=dark&type=book to only suggest books
+# Suggestions are served from memory, most reviewed first
+# Public access - no authentication required
+@autocomplete_suggestions.route("", methods=["GET"])
+@exception_handler
+def get_suggestions():
+    unknown = sorted(set(request.args) - {"prefix", "type", "limit"})
+    if unknown:
+        return abort(400, description=f"Unknown query parameter(s): {', '.join(unknown)}.")
+
+    prefix = request.args.get("prefix", "")
+    if not prefix.strip():
+        return abort(400, description="Missing prefix. Please search with ?prefix=")
+
+    types = None
+    if request.args.get("type"):
+        types = [entity.strip() for entity in request.args.get("type").split(",") if entity.strip()]
+        if any(entity not in autocomplete.TYPES for entity in types):
+            return abort(400, description=f"Invalid type. Suggest one or more of: {', '.join(autocomplete.TYPES)}.")
+
+    try:
+        limit = int(request.args.get("limit", 10))
+    except ValueError:
+        return abort(400, description="Limit must be a whole number.")
+    if limit < 1 or limit > MAX_SUGGESTIONS:
+        return abort(400, description=f"Limit must be between 1 and {MAX_SUGGESTIONS}.")
+
+    return jsonify([
+        {"type": entity, "id": id, "name": name, "reviews": reviews}
+        for entity, id, name, reviews in autocomplete.suggest(prefix, types, limit)
+    ])
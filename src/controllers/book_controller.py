@@ -1,12 +1,20 @@
 from flask import Blueprint, jsonify, request, abort
-from app import db
+from app import db, response_cache
 from sqlalchemy import exc
 from marshmallow import exceptions
 from models.books import Book
 from schemas.book_schema import book_schema, books_schema
-from flask_jwt_extended import jwt_required, get_jwt_identity
-from models.users import User
+from serializers import schema_response
+from authorization import admin_required
 from helper import exception_handler
+from query_budget import query_budget
+from autocomplete import autocomplete
+from eager_loading import schema_query
+from pagination import paginate, paginated_response
+from sparse_fieldsets import requested_fields
+from search import search, equals, at_least, at_most, parse_date
+from bulk import bulk_insert
+from batch import requested_keys, batch_response
 
 
 # Define blueprint 
@@ -16,53 +24,67 @@ books = Blueprint('books', __name__, url_prefix="/books")
 # Query database to get all the books from the book table.
 # Public access - no authentication required
 @books.route("/", methods=["GET"])
+@response_cache.cached("book", "author", "publisher")
 @exception_handler
+@query_budget(1)
 def get_all_books():
-    books = db.session.query(Book).all()
+    # Optional sparse fieldset with ?fields=, e.g. ?fields=id,title
+    schema = requested_fields(books_schema)
+    # Optional keyset pagination with ?limit= and ?after=
+    books, next_cursor = paginate(schema_query(schema, Book, sparse=True), Book.id)
 
     # Return an error if no books are located
     if not books:
         return abort(400, description="Book table not located.") 
 
-    result = books_schema.dump(books)
-    return jsonify(result)
+    return paginated_response(schema_response(schema, books), next_cursor)
+
+
+# Filters and sorts accepted by the book search, any combination of the filters can be used together
+BOOK_FILTERS = {
+    "title": equals(Book.title),
+    "length": equals(Book.length, int),
+    "length_min": at_least(Book.length),
+    "length_max": at_most(Book.length),
+    "copies_min": at_least(Book.copies_published),
+    "copies_max": at_most(Book.copies_published),
+    "published_from": at_least(Book.first_publication_date, parse_date),
+    "published_to": at_most(Book.first_publication_date, parse_date),
+    "author_id": equals(Book.author_id, int),
+    "publisher_id": equals(Book.publisher_id, int)
+}
+BOOK_SORTS = {
+    "id": Book.id,
+    "title": Book.title,
+    "length": Book.length,
+    "first_publication_date": Book.first_publication_date,
+    "copies_published": Book.copies_published
+}
 
 
 # Query the books table with a query string
+# e.g. ?author_id=1&length_min=300&published_from=01-01-1980&sort=-length&limit=10&fields=id,title
 @books.route("/search", methods=["GET"])
+@response_cache.cached("book", "author", "publisher")
 @exception_handler
+@query_budget(1)
 def search_books():
-    try:
-        # Create a list to hold the results
-        books_list = []
-
-        # Query database by book title
-        if request.args.get('title'):
-            books_list = db.session.query(Book).filter_by(title=request.args.get('title'))
-        # Query database by length of book
-        elif request.args.get('length'):
-            books_list = db.session.query(Book).filter_by(length=request.args.get('length'))
-        # Query database by an author_id and return all books written by that author
-        elif request.args.get('author_id'):
-            books_list = db.session.query(Book).filter_by(author_id=request.args.get('author_id'))
-        # Query database by publisher_id and return all books published by that publisher
-        elif request.args.get('publisher_id'):
-            books_list = db.session.query(Book).filter_by(publisher_id=request.args.get('publisher_id'))
-        # Return an error if the query string is invalid
-        elif books_list == []:
-            return abort(400, description="Missing or invalid query string.")
-
-        # Return books_list in JSON format
-        result = books_schema.dump(books_list)
-        return jsonify(result)
-    # Catch errors if an invalid query is attempted
-    except exc.DataError:
-        return abort(400, description="Invalid parameter in query string")
+    # Return an error if no query string is given
+    if not request.args:
+        return abort(400, description="Missing or invalid query string.")
+
+    schema = requested_fields(books_schema)
+    books_list, next_cursor = search(schema_query(schema, Book, sparse=True), Book.id, BOOK_FILTERS, BOOK_SORTS)
+
+    # Return books_list in JSON format
+    return paginated_response(schema_response(schema, books_list), next_cursor)
     
 
 # Query the books table with a query string
 @books.route("/search/", methods=["GET"])
+@response_cache.cached()
 @exception_handler
+@query_budget(1)
 def search_book():
     try:
         # Create a list to hold the results
@@ -70,10 +92,16 @@ def search_book():
 
         # Query database by a book's unique isbn number
         if request.args.get('isbn'):
-            book_list = db.session.query(Book).filter_by(isbn=request.args.get('isbn')).first()
+            book_list = schema_query(book_schema, Book).filter_by(isbn=request.args.get('isbn')).first()
         # Query database by book_id
         elif request.args.get('id'):
-            book_list = db.session.query(Book).filter_by(id=request.args.get('id')).first()
+            book_list = schema_query(book_schema, Book).filter_by(id=request.args.get('id')).first()
+
+        # Tag the cached response with the book it contains, or with the book table if no book was found
+        if book_list:
+            response_cache.add_tags(f"book:{book_list.id}", f"author:{book_list.author_id}", f"publisher:{book_list.publisher_id}")
+        else:
+            response_cache.add_tags("book")
 
         # Return book_list in JSON format
         result = book_schema.dump(book_list)
@@ -83,24 +111,33 @@ def search_book():
         return abort(400, description="Invalid parameter in query string")
 
 
+# Look up several books at once by id or isbn, e.g. ?ids=1,2,3 or ?isbns=9780385086950,9780385121675
+# The books are returned under results in the order requested, and the ids or isbns not found under missing
+# Public access - no authentication required
+@books.route("/batch", methods=["GET"])
+@response_cache.cached("book", "author", "publisher")
+@exception_handler
+@query_budget(1)
+def batch_books():
+    if "ids" in request.args and "isbns" in request.args:
+        return abort(400, description="Look up books by ids or isbns, not both.")
+
+    # Optional sparse fieldset with ?fields=
+    schema = requested_fields(books_schema)
+
+    if "isbns" in request.args:
+        return batch_response(schema, Book, Book.isbn, requested_keys("isbns"))
+    return batch_response(schema, Book, Book.id, requested_keys("ids", int))
+
+
 # Allow an admin user to add a new book to the book table
 # Requires details for the new book in the request body
 # Must include "title", "isbn", "length", "first_publication_date", "copies_published", "author_id" and "publisher_id"
 @books.route("/add", methods=["POST"])
 @exception_handler
-@jwt_required()
+@admin_required(description="You are not authorized to add a book.")
 def add_book():
     try:
-        # Verify the user by getting their JWT identity and querying the database with the id
-        validate_user = get_jwt_identity()
-        user = db.session.query(User).get(validate_user)
-        
-        # If the user's id from the token does not match any record in the database, return an error
-        if not user:
-            return abort(400, description="User not found.")
-        if user.admin != True:
-            return abort(403, description="You are not authorized to add a book.")
-
         # Add the new book's details
         book = Book()
         book_fields = book_schema.load(request.json)
@@ -115,6 +152,8 @@ def add_book():
         # Commit the new book's details to the book table
         db.session.add(book)
         db.session.commit()
+        response_cache.invalidate("book")
+        autocomplete.put("book", book.id, book.title, book.author_id, book.publisher_id)
 
         return jsonify(message="You have added a book to the table."), 200
     except exceptions.ValidationError:
@@ -123,24 +162,32 @@ def add_book():
         return abort(400, description="ISBN number is already associated with another entry in the database.")
     
 
+# Allow an admin user to add many books to the book table at once
+# Request body must be a JSON array of books, or one book per line with the application/x-ndjson content type
+# Each book must include "title", "isbn", "length", "first_publication_date", "copies_published", "author_id" and "publisher_id"
+# Returns the number of books added and an error for each book that could not be added
+@books.route("/bulk", methods=["POST"])
+@exception_handler
+@admin_required(description="You are not authorized to add a book.")
+def bulk_add_books():
+    columns = ["title", "isbn", "length", "first_publication_date", "copies_published", "author_id", "publisher_id"]
+    result = bulk_insert(Book, book_schema, columns, unique="isbn")
+
+    if result["inserted"]:
+        response_cache.invalidate("book")
+        autocomplete.invalidate()
+
+    return jsonify(result), 200
+
+
 # Allow an admin user to change data for an entry in the book table
 # Requires details of the change to a book in the request body
 # Request body must include "title", "isbn", "length", "first_publication_date", "copies_published", "author_id" and "publisher_id"
 @books.route("/update/<int:book_id>", methods=["PUT"])
 @exception_handler
-@jwt_required()
+@admin_required(description="You are not authorized to add an author.")
 def update_book(book_id):
     try:
-        # Verify the user by getting their JWT identity and querying the database with the id
-        validate_user = get_jwt_identity()
-        user = db.session.query(User).get(validate_user)
-        
-        # If the user's id from the token does not match any record in the database, return an error
-        if not user:
-            return abort(400, description="User not found.")
-        if user.admin != True:
-            return abort(403, description="You are not authorized to add an author.")
-        
         # Find the book by id
         book = Book.query.filter_by(id=book_id).first()
         if not book:
@@ -158,6 +205,8 @@ def update_book(book_id):
 
         # Commit the updated details to the book table
         db.session.commit()
+        response_cache.invalidate("book", f"book:{book_id}")
+        autocomplete.put("book", book.id, book.title, book.author_id, book.publisher_id)
 
         return jsonify(message="You have successfully updated the database."), 200
     except exceptions.ValidationError:
@@ -169,18 +218,8 @@ def update_book(book_id):
 # # Allow an admin user to delete an entry from the book table
 @books.route("/delete/<int:book_id>", methods=["DELETE"])
 # @exception_handler
-@jwt_required()
+@admin_required(description="You are not authorized to add an author.")
 def delete_book(book_id):
-    # Verify the user by getting their JWT identity and querying the database with the id
-    validate_user = get_jwt_identity()
-    user = db.session.query(User).get(validate_user)
-    
-    # If the user's id from the token does not match any record in the database, return an error
-    if not user:
-        return abort(400, description="User not found.")
-    if user.admin != True:
-        return abort(403, description="You are not authorized to add an author.")
-    
     # Find the book by id
     book = db.session.query(Book).filter_by(id=book_id).first()
 
@@ -188,8 +227,15 @@ def delete_book(book_id):
         return abort(400, description= "Book could not be located in the database.")
     
 
+    # Movies adapted from the book are deleted with it
+    movie_ids = [movie.id for movie in book.movie]
+
     # Commit the updated details to the book table
     db.session.delete(book)
     db.session.commit()
+    response_cache.invalidate("book", f"book:{book_id}", "movie")
+    autocomplete.remove("book", book_id)
+    for movie_id in movie_ids:
+        autocomplete.remove("movie", movie_id)
 
     return jsonify(message="You have successfully removed this book and associated information from the database."), 200
@@ -1,11 +1,16 @@
 from flask import Blueprint, jsonify, request, abort
-from app import db
+from app import db, response_cache
 from marshmallow import exceptions
 from models.movies import Director
 from schemas.director_schema import director_schema, directors_schema
-from flask_jwt_extended import jwt_required, get_jwt_identity
-from models.users import User
+from serializers import schema_response
+from authorization import admin_required
 from helper import exception_handler
+from query_budget import query_budget
+from autocomplete import autocomplete
+from eager_loading import schema_query
+from pagination import paginate, paginated_response
+from sparse_fieldsets import requested_fields
 
 
 # Define blueprint 
@@ -15,16 +20,22 @@ directors = Blueprint('directors', __name__, url_prefix="/directors")
 # Query database to get all the directors from the director table. 
 # Public access - no authentication required
 @directors.route("/", methods=["GET"])
+@response_cache.cached("director")
 @exception_handler
+@query_budget(1)
 def get_all_directors():
-        directors = db.session.query(Director).all()
-        result = directors_schema.dump(directors)
-        return jsonify(result)
+        # Optional sparse fieldset with ?fields=, e.g. ?fields=id,director_name
+        schema = requested_fields(directors_schema)
+        # Optional keyset pagination with ?limit= and ?after=
+        directors, next_cursor = paginate(schema_query(schema, Director, sparse=True), Director.id)
+        return paginated_response(schema_response(schema, directors), next_cursor)
 
 
 # Query the directors table with a query string to get a director by name
 @directors.route("/search/name/<string:name>", methods=["GET"])
+@response_cache.cached("director")
 @exception_handler
+@query_budget(1)
 def search_director_name(name):
     # Query database by publisher_id
     director = db.session.query(Director).filter_by(director_name=name).first()
@@ -40,11 +51,16 @@ def search_director_name(name):
 
 # Query the directors table with director_id
 @directors.route("/search/<int:id>", methods=["GET"])
+@response_cache.cached()
 @exception_handler
+@query_budget(1)
 def search_director_id(id):
     # Query database by publisher_id
     director = db.session.query(Director).filter_by(id=id).first()
 
+    # Tag the cached response with the director found, or with the director table if there is no match
+    response_cache.add_tags(f"director:{id}" if director else "director")
+
     # Return error message if the id passed is invalid
     if not director:
         return jsonify(message="Invalid query string.")
@@ -59,20 +75,9 @@ def search_director_id(id):
 # Must include "director_name"
 @directors.route("/add", methods=["POST"])
 @exception_handler
-@jwt_required()
+@admin_required(description="You are not authorized to add a director.")
 def add_director():
     try:
-        # Verify the user by getting their JWT identity and querying the database with the id
-        validate_user = get_jwt_identity()
-        user = db.session.query(User).get(validate_user)
-
-        # If user is not already registered return an error message
-        if not user:
-            return abort(400, description="User not found. Please login.")
-        # If the user does not have admin privileges return an error
-        if user.admin != True:
-            return abort(403, description="You are not authorized to add a director.")
-
         # Add the new director's details
         director = Director()
         director_fields = director_schema.load(request.json)
@@ -81,6 +86,8 @@ def add_director():
         # Commit the new director's details to the director table
         db.session.add(director)
         db.session.commit()
+        response_cache.invalidate("director")
+        autocomplete.put("director", director.id, director.director_name)
 
         return jsonify(message="You have added a director to the table."), 200
     # Handle errors within the request body
@@ -93,19 +100,9 @@ def add_director():
 # Must include "publisher_name"
 @directors.route("/update/<int:director_id>", methods=["PUT"])
 @exception_handler
-@jwt_required()
+@admin_required(description="You are not authorized to add a director.")
 def update_director(director_id):
     try:
-         # Verify the user by getting their JWT identity and querying the database with the id
-        validate_user = get_jwt_identity()
-        user = db.session.query(User).get(validate_user)
-
-        # If user is not already registered return an error message
-        if not user:
-            return abort(400, description="User not found. Please login.")
-        if user.admin != True:
-            return abort(403, description="You are not authorized to add a director.")
-        
         # Find the director by id
         director = db.session.query(Director).filter_by(id=director_id).first()
         if not director:
@@ -118,6 +115,8 @@ def update_director(director_id):
         # Commit the updated details to the director table
         db.session.add(director)
         db.session.commit()
+        response_cache.invalidate("director", f"director:{director_id}")
+        autocomplete.put("director", director.id, director.director_name)
 
         return jsonify(message="You have successfully updated the database."), 200
     except exceptions.ValidationError:
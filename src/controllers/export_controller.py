@@ -0,0 +1,39 @@
+from flask import Blueprint
+from models.books import Book
+from models.movies import Movie
+from models.read import Read
+from models.watched import Watched
+from schemas.book_schema import books_schema
+from schemas.movie_schema import movies_schema
+from schemas.read_schema import reads_schema
+from schemas.watched_schema import watched_schema
+from authorization import admin_required
+from export import export_response
+from sparse_fieldsets import requested_fields
+
+
+# Define blueprint
+export = Blueprint('export', __name__, url_prefix="/export")
+
+
+# Stream every book as newline delimited JSON, each line in the same format as the entries of GET /books/
+# Public access - no authentication required
+@export.route("/books", methods=["GET"])
+def export_books():
+    return export_response([(requested_fields(books_schema), Book, None)])
+
+
+# Stream every movie as newline delimited JSON, each line in the same format as the entries of GET /movies/
+# Public access - no authentication required
+@export.route("/movies", methods=["GET"])
+def export_movies():
+    return export_response([(requested_fields(movies_schema), Movie, None)])
+
+
+# Stream every book review followed by every movie review as newline delimited JSON
+# Each line starts with "type": "book" or "type": "movie"
+# Only available to an admin
+@export.route("/reviews", methods=["GET"])
+@admin_required(description="You are not authorized to view this information.")
+def export_reviews():
+    return export_response([(reads_schema, Read, {"type": "book"}), (watched_schema, Watched, {"type": "movie"})])
@@ -0,0 +1,25 @@
+import hmac
+from flask import Blueprint, request, abort, current_app
+from app import db, request_metrics, admission_control
+from pool_monitor import pool_status
+from request_metrics import pool_metric_lines, admission_metric_lines
+
+
+# Define blueprint 
+metrics = Blueprint('metrics', __name__)
+
+
+# Return the request, connection pool and admission control metrics of the process serving the request in the Prometheus text format
+# Requires "Authorization: Bearer <METRICS_TOKEN>" if METRICS_TOKEN is set
+@metrics.route("/metrics", methods=["GET"])
+def get_metrics():
+    if not current_app.config.get("METRICS_ENABLED", True):
+        return abort(404)
+
+    token = current_app.config.get("METRICS_TOKEN")
+    if token and not hmac.compare_digest(request.headers.get("Authorization", ""), f"Bearer {token}"):
+        return abort(401, description="You are not authorized to view this information.")
+
+    extra_lines = pool_metric_lines(pool_status(db.engine)) + admission_metric_lines(admission_control.status())
+    body = request_metrics.render(extra_lines)
+    return current_app.response_class(body, mimetype="text/plain; version=0.0.4")
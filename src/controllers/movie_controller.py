@@ -1,12 +1,20 @@
 from flask import Blueprint, jsonify, request, abort
-from app import db
+from app import db, response_cache
 from sqlalchemy import exc, desc, asc
 from marshmallow import exceptions
 from models.movies import Movie
 from schemas.movie_schema import movie_schema, movies_schema
-from flask_jwt_extended import jwt_required, get_jwt_identity
-from models.users import User
+from serializers import schema_response
+from authorization import admin_required
 from helper import exception_handler
+from query_budget import query_budget
+from autocomplete import autocomplete
+from eager_loading import schema_query
+from pagination import paginate, paginated_response
+from sparse_fieldsets import requested_fields
+from search import search, equals, at_least, at_most, parse_date
+from bulk import bulk_insert
+from batch import requested_keys, batch_response
 
 
 # Define blueprint 
@@ -16,87 +24,111 @@ movies = Blueprint('movies', __name__, url_prefix="/movies")
 # Query database to get all the movies from the movie table. 
 # Public access - no authentication required
 @movies.route("/", methods=["GET"])
+@response_cache.cached("movie", "director", "production", "book")
 @exception_handler
+@query_budget(1)
 def get_all_movies():
-    movies = db.session.query(Movie).all()
+    # Optional sparse fieldset with ?fields=, e.g. ?fields=id,title
+    schema = requested_fields(movies_schema)
+    # Optional keyset pagination with ?limit= and ?after=
+    movies, next_cursor = paginate(schema_query(schema, Movie, sparse=True), Movie.id)
 
     # Return an error if no movies are located
     if not movies:
         return abort(400, description="Movie table not located.") 
     
-    result = movies_schema.dump(movies)
-    return jsonify(result)
+    return paginated_response(schema_response(schema, movies), next_cursor)
+
+
+# Filters and sorts accepted by the movie search, any combination of the filters can be used together
+MOVIE_FILTERS = {
+    "title": equals(Movie.title),
+    "length": equals(Movie.length, int),
+    "length_min": at_least(Movie.length),
+    "length_max": at_most(Movie.length),
+    "released_from": at_least(Movie.release_date, parse_date),
+    "released_to": at_most(Movie.release_date, parse_date),
+    "director_id": equals(Movie.director_id, int),
+    "production_company_id": equals(Movie.production_company_id, int),
+    "book_id": equals(Movie.book_id, int)
+}
+MOVIE_SORTS = {
+    "id": Movie.id,
+    "title": Movie.title,
+    "release_date": Movie.release_date,
+    "length": Movie.length,
+    "box_office_ranking": Movie.box_office_ranking
+}
 
 
 # Query the movies table with a query string
+# e.g. ?director_id=2&length_max=120&sort=-box_office_ranking&limit=10&fields=id,title
 @movies.route("/search", methods=["GET"])
+@response_cache.cached("movie", "director", "production", "book")
 @exception_handler
+@query_budget(1)
 def search_movies():
-    try:
-        # Create a list to hold the results
-        movies_list = []
-
-        # Query database by movie title
-        if request.args.get('title'):
-            movies_list = db.session.query(Movie).filter_by(title=request.args.get('title'))      
-        # Query database by an director_id and return all movies directed by that director
-        elif request.args.get('director_id'):
-            movies_list = db.session.query(Movie).filter_by(director_id=request.args.get('director_id'))
-        # Query database by an production_company_id and return all movies made by that production company
-        elif request.args.get('production_company_id'):
-            movies_list = db.session.query(Movie).filter_by(production_company_id=request.args.get('production_company_id'))
-        # Query database by book_id and return all the movies adapted from that book
-        elif request.args.get('book_id'):
-            movies_list = db.session.query(Movie).filter_by(book_id=request.args.get('book_id'))
+    # Return an error if no query string is given
+    if not request.args:
+        return abort(400, description="Missing or invalid query string.")
 
-        # Return movies_list in JSON format
-        result = movies_schema.dump(movies_list)
-        return jsonify(result)
-    # Catch errors if an invalid query is attempted
-    except exc.DataError:
-        return abort(400, description="Invalid parameter in query string")
+    schema = requested_fields(movies_schema)
+    movies_list, next_cursor = search(schema_query(schema, Movie, sparse=True), Movie.id, MOVIE_FILTERS, MOVIE_SORTS)
+
+    # Return movies_list in JSON format
+    return paginated_response(schema_response(schema, movies_list), next_cursor)
     
 
 # Query the movies table to return all movies sorted by length in ascending
 @movies.route("/search/length", methods=["GET"])
+@response_cache.cached("movie", "director", "production", "book")
 @exception_handler
+@query_budget(1)
 def sort_movies_length():
-    movies = db.session.query(Movie).order_by(asc(Movie.length)).all()
+    schema = requested_fields(movies_schema)
+    movies = schema_query(schema, Movie, sparse=True).order_by(asc(Movie.length)).all()
 
     # Return an error if no movies are located
     if not movies:
             return abort(400, description="Movies not found.") 
 
     # Return movies JSON format
-    result = movies_schema.dump(movies)
-    return jsonify(result)   
+    return schema_response(schema, movies)
 
 
 # Query the movies table and return all movies sorted by box office ranking in descending order
 @movies.route("/search/ranking", methods=["GET"])
+@response_cache.cached("movie", "director", "production", "book")
 @exception_handler
+@query_budget(1)
 def sort_movies_ranking():
-    movies = db.session.query(Movie).order_by(desc(Movie.box_office_ranking)).all()
+    schema = requested_fields(movies_schema)
+    movies = schema_query(schema, Movie, sparse=True).order_by(desc(Movie.box_office_ranking)).all()
 
     # Return an error if no movies are located
     if not movies:
             return abort(400, description="Movies not found.") 
 
     # Return movies JSON format
-    result = movies_schema.dump(movies)
-    return jsonify(result)  
+    return schema_response(schema, movies)
 
 
 # Query the movies table by movie_id
 @movies.route("/search/<int:id>", methods=["GET"])
+@response_cache.cached()
+@query_budget(1)
 def search_movie_id(id):
     try:
-        movie = db.session.query(Movie).filter_by(id=id).first()
+        movie = schema_query(movie_schema, Movie).filter_by(id=id).first()
 
         # Return an error if no movies are located
         if not movie:
+            response_cache.add_tags("movie")
             return abort(400, description= "Movie could not be located in the database.")
 
+        # Tag the cached response with the movie and the entries nested in it
+        response_cache.add_tags(f"movie:{movie.id}", f"book:{movie.book_id}", f"director:{movie.director_id}", f"production:{movie.production_company_id}")
+
         # Return movies_list in JSON format
         result = movie_schema.dump(movie)
         return jsonify(result)
@@ -105,24 +137,27 @@ def search_movie_id(id):
         return abort(400, description="Invalid parameter in query string")
 
 
+# Look up several movies at once by id, e.g. ?ids=1,2,3
+# The movies are returned under results in the order requested, and the ids not found under missing
+# Public access - no authentication required
+@movies.route("/batch", methods=["GET"])
+@response_cache.cached("movie", "director", "production", "book")
+@exception_handler
+@query_budget(1)
+def batch_movies():
+    # Optional sparse fieldset with ?fields=
+    schema = requested_fields(movies_schema)
+    return batch_response(schema, Movie, Movie.id, requested_keys("ids", int))
+
+
 # Allow an admin user to add a new movie to the movie table
 # Request body must include:
 # "title", "release_date", "length", "box_office_ranking", "book_id", "director_id", "production_company_id"
 @movies.route("/add", methods=["POST"])
 @exception_handler
-@jwt_required()
+@admin_required(description="You are not authorized to add a movie.")
 def add_movie():
     try:
-        # Verify the user by getting their JWT identity and querying the database with the id
-        validate_user = get_jwt_identity()
-        user = db.session.query(User).get(validate_user)
-        
-        # If the user's id from the token does not match any record in the database, return an error
-        if not user:
-            return abort(400, description="User not found.")
-        if user.admin != True:
-            return abort(403, description="You are not authorized to add a movie.")
-
         # Add the new movie's details
         movie = Movie()
         movie_fields = movie_schema.load(request.json)
@@ -137,6 +172,8 @@ def add_movie():
         # Commit the new movie's details to the movie table
         db.session.add(movie)
         db.session.commit()
+        response_cache.invalidate("movie")
+        autocomplete.put("movie", movie.id, movie.title, movie.director_id, movie.production_company_id)
 
         return jsonify(message="You have added a movie to the table."), 200
     # Catch errors if an invalid query is attempted
@@ -144,25 +181,34 @@ def add_movie():
         return abort(400, description="Error in request body. Please check for spelling mistakes and that all fields are included.")
 
     
+# Allow an admin user to add many movies to the movie table at once
+# Request body must be a JSON array of movies, or one movie per line with the application/x-ndjson content type
+# Each movie must include:
+# "title", "release_date", "length", "box_office_ranking", "book_id", "director_id", "production_company_id"
+# Returns the number of movies added and an error for each movie that could not be added
+@movies.route("/bulk", methods=["POST"])
+@exception_handler
+@admin_required(description="You are not authorized to add a movie.")
+def bulk_add_movies():
+    columns = ["title", "release_date", "length", "box_office_ranking", "book_id", "director_id", "production_company_id"]
+    result = bulk_insert(Movie, movie_schema, columns)
+
+    if result["inserted"]:
+        response_cache.invalidate("movie")
+        autocomplete.invalidate()
+
+    return jsonify(result), 200
+
+
 # Allow an admin user to change data for an entry in the movie table
 # Requires details of the change to a movie in the request body
 # Request body must include:
 # "title", "release_date", "length", "box_office_ranking", "book_id", "director_id", "production_company_id" 
 @movies.route("/update/<int:id>", methods=["PUT"])
 @exception_handler
-@jwt_required()
+@admin_required(description="You are not authorized to add a movie.")
 def update_movie(id):
     try:
-        # Verify the user by getting their JWT identity and querying the database with the id
-        validate_user = get_jwt_identity()
-        user = db.session.query(User).get(validate_user)
-        
-        # If the user's id from the token does not match any record in the database, return an error
-        if not user:
-            return abort(400, description="User not found.")
-        if user.admin != True:
-            return abort(403, description="You are not authorized to add a movie.")
-        
         # Find the movie by id
         movie = db.session.query(Movie).filter_by(id=id).first()
         if not movie:
@@ -180,6 +226,8 @@ def update_movie(id):
 
         # Commit the updated details to the movie table
         db.session.commit()
+        response_cache.invalidate("movie", f"movie:{id}")
+        autocomplete.put("movie", movie.id, movie.title, movie.director_id, movie.production_company_id)
 
         return jsonify(message="You have successfully updated the database."), 200
     # Catch errors if an invalid query is attempted
@@ -191,18 +239,8 @@ def update_movie(id):
 # # Allow an admin user to delete an entry from the book table
 @movies.route("/delete/<int:movie_id>", methods=["DELETE"])
 # @exception_handler
-@jwt_required()
+@admin_required(description="You are not authorized to add an author.")
 def delete_movie(movie_id):
-    # Verify the user by getting their JWT identity and querying the database with the id
-    validate_user = get_jwt_identity()
-    user = db.session.query(User).get(validate_user)
-    
-    # If the user's id from the token does not match any record in the database, return an error
-    if not user:
-        return abort(400, description="User not found.")
-    if user.admin != True:
-        return abort(403, description="You are not authorized to add an author.")
-    
     # Find the book by id
     movie = db.session.query(Movie).filter_by(id=movie_id).first()
 
@@ -210,9 +248,17 @@ def delete_movie(movie_id):
         return abort(400, description= "Book could not be located in the database.")
     
 
+    # The book the movie is adapted from is deleted with it, along with any other movies adapted from that book
+    book_id = movie.book_id
+    movie_ids = [adaptation.id for adaptation in movie.book.movie] if movie.book else [movie_id]
+
     # Commit the updated details to the book table
     db.session.delete(movie)
     db.session.commit()
+    response_cache.invalidate("movie", "book", f"book:{book_id}", *(f"movie:{id}" for id in movie_ids))
+    for id in movie_ids:
+        autocomplete.remove("movie", id)
+    autocomplete.remove("book", book_id)
 
     return jsonify(message="You have successfully removed this movie and associated information from the database."), 200
 
@@ -1,11 +1,16 @@
 from flask import Blueprint, jsonify, request, abort
-from app import db
+from app import db, response_cache
 from marshmallow import exceptions
 from models.movies import ProductionCompany
 from schemas.production_company_schema import production_schema, productions_schema
-from flask_jwt_extended import jwt_required, get_jwt_identity
-from models.users import User
+from serializers import schema_response
+from authorization import admin_required
 from helper import exception_handler
+from query_budget import query_budget
+from autocomplete import autocomplete
+from eager_loading import schema_query
+from pagination import paginate, paginated_response
+from sparse_fieldsets import requested_fields
 
 
 # Define blueprint 
@@ -15,16 +20,22 @@ production = Blueprint('production', __name__, url_prefix="/production")
 # Query database to get all the production companies from the production_company table. 
 # Public access - no authentication required
 @production.route("/", methods=["GET"])
+@response_cache.cached("production")
 @exception_handler
+@query_budget(1)
 def get_all_production_companies():
-    production = db.session.query(ProductionCompany).all()
-    result = productions_schema.dump(production)
-    return jsonify(result)
+    # Optional sparse fieldset with ?fields=, e.g. ?fields=id,name
+    schema = requested_fields(productions_schema)
+    # Optional keyset pagination with ?limit= and ?after=
+    production, next_cursor = paginate(schema_query(schema, ProductionCompany, sparse=True), ProductionCompany.id)
+    return paginated_response(schema_response(schema, production), next_cursor)
 
 
 # Query the production_company table with a query string to get a production company by name
 @production.route("/search/name/<string:name>", methods=["GET"])
+@response_cache.cached("production")
 @exception_handler
+@query_budget(1)
 def search_production_name(name):
     # Query database by the name of the production company
     production = db.session.query(ProductionCompany).filter_by(name=name).first()
@@ -40,11 +51,16 @@ def search_production_name(name):
 
 # Query the production_company table with production_company_id to return the company
 @production.route("/search/<int:id>", methods=["GET"])
+@response_cache.cached()
 @exception_handler
+@query_budget(1)
 def search_production_id(id):
     # Query database by production_id
     production = db.session.query(ProductionCompany).filter_by(id=id).first()
 
+    # Tag the cached response with the production found, or with the production table if there is no match
+    response_cache.add_tags(f"production:{id}" if production else "production")
+
     # Return error message if the id passed is invalid
     if not production:
         return abort(400, description="Production company not found.")
@@ -59,29 +75,21 @@ def search_production_id(id):
 # Must include production company "name"
 @production.route("/add", methods=["POST"])
 @exception_handler
-@jwt_required()
+@admin_required(description="You are not authorized to add a production company.")
 def add_production_company():
     try:
-        # Verify the user by getting their JWT identity and querying the database with the id
-        validate_user = get_jwt_identity()
-        user = db.session.query(User).get(validate_user)
-
-        # If user is not already registered return an error message
-        if not user:
-            return abort(400, description="User not found. Please login.")
-        if user.admin != True:
-            return abort(403, description="You are not authorized to add a production company.")
-        else:
-            # Add the new production company's details
-            production = ProductionCompany()
-            production_fields = production_schema.load(request.json)
-            production.name = production_fields["name"]
-
-            # Commit the new production companies details to the production company table
-            db.session.add(production)
-            db.session.commit()
-
-            return jsonify(message="You have added a production company to the table."), 200
+        # Add the new production company's details
+        production = ProductionCompany()
+        production_fields = production_schema.load(request.json)
+        production.name = production_fields["name"]
+
+        # Commit the new production companies details to the production company table
+        db.session.add(production)
+        db.session.commit()
+        response_cache.invalidate("production")
+        autocomplete.put("production_company", production.id, production.name)
+
+        return jsonify(message="You have added a production company to the table."), 200
     # Handle errors within the request body
     except exceptions.ValidationError:
         return abort(400, description="Error in request body. Please check for spelling mistakes and that all fields are included.") 
@@ -92,19 +100,9 @@ def add_production_company():
 # Must include production company "name"
 @production.route("/update/<int:id>", methods=["PUT"])
 @exception_handler
-@jwt_required()
+@admin_required(description="You are not authorized to add a production company.")
 def update_production_company(id):
     try:
-        # Verify the user by getting their JWT identity and querying the database with the id
-        validate_user = get_jwt_identity()
-        user = db.session.query(User).get(validate_user)
-
-        # If user is not already registered return an error message
-        if not user:
-            return abort(400, description="User not found. Please login.")
-        if user.admin != True:
-            return abort(403, description="You are not authorized to add a production company.")
-        
         # Find the production company by id
         production = db.session.query(ProductionCompany).filter_by(id=id).first()
         if not production:
@@ -116,6 +114,8 @@ def update_production_company(id):
 
         # Commit the updated details to the publisher table
         db.session.commit()
+        response_cache.invalidate("production", f"production:{id}")
+        autocomplete.put("production_company", production.id, production.name)
 
         return jsonify(message="You have successfully updated the database."), 200
     except exceptions.ValidationError:
@@ -1,11 +1,16 @@
 from flask import Blueprint, jsonify, request, abort
-from app import db
+from app import db, response_cache
 from marshmallow import exceptions
 from models.books import Publisher
 from schemas.publisher_schema import publisher_schema, publishers_schema
-from flask_jwt_extended import jwt_required, get_jwt_identity
-from models.users import User
+from serializers import schema_response
+from authorization import admin_required
 from helper import exception_handler
+from query_budget import query_budget
+from autocomplete import autocomplete
+from eager_loading import schema_query
+from pagination import paginate, paginated_response
+from sparse_fieldsets import requested_fields
 
 
 # Define blueprint 
@@ -15,16 +20,22 @@ publishers = Blueprint('publishers', __name__, url_prefix="/publishers")
 # Query database to get all the publishers from the publisher table. 
 # Public access - no authentication required
 @publishers.route("/", methods=["GET"])
+@response_cache.cached("publisher")
 @exception_handler
+@query_budget(1)
 def get_all_publishers():
-    publishers = db.session.query(Publisher).all()
-    result = publishers_schema.dump(publishers)
-    return jsonify(result)
+    # Optional sparse fieldset with ?fields=, e.g. ?fields=id,publisher_name
+    schema = requested_fields(publishers_schema)
+    # Optional keyset pagination with ?limit= and ?after=
+    publishers, next_cursor = paginate(schema_query(schema, Publisher, sparse=True), Publisher.id)
+    return paginated_response(schema_response(schema, publishers), next_cursor)
 
 
 # Query the publishers table with a query string to get publisher by name
 @publishers.route("/search/name/<string:name>", methods=["GET"])
+@response_cache.cached("publisher")
 @exception_handler
+@query_budget(1)
 def search_publisher_name(name):
     # Query database by publisher_id
     publisher = db.session.query(Publisher).filter_by(publisher_name=name).first()
@@ -40,11 +51,16 @@ def search_publisher_name(name):
 
 # Query the publishers table with publisher_id
 @publishers.route("/search/<int:id>", methods=["GET"])
+@response_cache.cached()
 @exception_handler
+@query_budget(1)
 def search_publisher_id(id):
     # Query database by publisher_id
     publisher = db.session.query(Publisher).filter_by(id=id).first()
 
+    # Tag the cached response with the publisher found, or with the publisher table if there is no match
+    response_cache.add_tags(f"publisher:{id}" if publisher else "publisher")
+
     # Return error message if the id passed is invalid
     if not publisher:
         return jsonify(message="Invalid query string.")
@@ -59,20 +75,9 @@ def search_publisher_id(id):
 # Must include "publisher_name"
 @publishers.route("/add", methods=["POST"])
 @exception_handler
-@jwt_required()
+@admin_required(description="You are not authorized to add a Publisher.")
 def add_publisher():
     try:
-         # Verify the user by getting their JWT identity and querying the database with the id
-        validate_user = get_jwt_identity()
-        user = db.session.query(User).get(validate_user)
-
-        # If user is not already registered return an error message
-        if not user:
-            return abort(400, description="User not found. Please login.")
-        # If the user does not have admin privileges return an error
-        if user.admin != True:
-            return abort(403, description="You are not authorized to add a Publisher.")
-
         # Add the new publisher's details
         publisher = Publisher()
         publisher_fields = publisher_schema.load(request.json)
@@ -81,6 +86,8 @@ def add_publisher():
         # Commit the new publisher's details to the publisher table
         db.session.add(publisher)
         db.session.commit()
+        response_cache.invalidate("publisher")
+        autocomplete.put("publisher", publisher.id, publisher.publisher_name)
 
         return jsonify(message="You have added an publisher to the table."), 200
     # Handle errors within the request body
@@ -93,20 +100,9 @@ def add_publisher():
 # Must include "publisher_name"
 @publishers.route("/update/<int:publisher_id>", methods=["PUT"])
 @exception_handler
-@jwt_required()
+@admin_required(description="You are not authorized to add a publisher.")
 def update_publisher(publisher_id):
     try:
-         # Verify the user by getting their JWT identity and querying the database with the id
-        validate_user = get_jwt_identity()
-        user = db.session.query(User).get(validate_user)
-
-        # If user is not already registered return an error message
-        if not user:
-            return abort(400, description="User not found. Please login.")
-        # If the user does not have admin privileges return an error
-        if user.admin != True:
-            return abort(403, description="You are not authorized to add a publisher.")
-        
         # Find the publisher by id
         publisher = db.session.query(Publisher).filter_by(id=publisher_id).first()
         if not publisher:
@@ -118,6 +114,8 @@ def update_publisher(publisher_id):
 
         # Commit the updated details to the publisher table
         db.session.commit()
+        response_cache.invalidate("publisher", f"publisher:{publisher_id}")
+        autocomplete.put("publisher", publisher.id, publisher.publisher_name)
 
         return jsonify(message="You have successfully updated the database."), 200
     except exceptions.ValidationError:
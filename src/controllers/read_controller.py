@@ -1,11 +1,18 @@
 from flask import Blueprint, jsonify, request, abort
 from app import db
 from marshmallow import exceptions
-from models.users import User
 from models.read import Read
+from models.ratings import BookRating
 from schemas.read_schema import read_schema, reads_schema
-from flask_jwt_extended import jwt_required, get_jwt_identity
+from serializers import schema_response
+from authorization import user_required, current_user_id
 from helper import exception_handler
+from query_budget import query_budget
+from autocomplete import autocomplete
+from rating_aggregates import add_rating, change_rating, remove_rating
+from eager_loading import schema_query
+from group_commit import review_writer
+from review_sync import sync_reviews
 
 
 # Define blueprint 
@@ -15,92 +22,88 @@ read = Blueprint('read', __name__, url_prefix="/read")
 # Query the read table to return all and only the user's entries 
 @read.route("/<int:user_id>", methods=["GET"])
 @exception_handler
-@jwt_required()
+@user_required()
+@query_budget(1)
 def read_id(user_id):
-    # Verify the user by getting their JWT identity and querying the database with the id
-    verify_user = get_jwt_identity()
-    user = db.session.query(User).get(verify_user)
-
-    # If user is not already registered return an error message
-    if not user:
-        return abort(400, description="User not found. Please login.")
-    
     # Return reviews matching the user id
-    if user.id == user_id:
-        results = db.session.query(Read).filter(Read.user_id == user_id).all()
+    if current_user_id() == user_id:
+        results = schema_query(reads_schema, Read).filter(Read.user_id == user_id).all()
         # Return a message if there are no reviews
         if len(results) == 0:
             return jsonify(message="You have not reviewed any books.")
-        result = reads_schema.dump(results)
-        return jsonify(result)
+        return schema_response(reads_schema, results)
     # Return error message if the user id does not match the user id for the review
-    elif user.id != user_id:
+    elif current_user_id() != user_id:
         return abort(403, "Invalid user id. You are not authorized to access this information.")
 
 
-# Query read table with book id to see the average rating 
+# Query the book_rating table with book id to see the average rating 
 @read.route("/rating/<int:book_id>", methods=["GET"])
 @exception_handler
+@query_budget(1)
 def read_ratings(book_id):
-    try:
-        # Query read table to book id and get the average rating
-        average = db.session.query(Read).filter(Read.book_id == book_id).with_entities(db.func.avg(Read.rating)).scalar()
-        
-        # Return a message if book id does not match an entry in the database
-        if not average:
-            return jsonify(message="No rating available for this book id.")
-        
-        average = round(average, 2)
+    # The rating aggregate is kept up to date as reviews change, so this is a single primary key lookup
+    rating = db.session.get(BookRating, book_id)
 
-        # Return rating in a message
-        return jsonify(message=f"The average rating of this book is: {average}"), 200
-        # Return an error message if the book id does not match an entry in the database
-    except TypeError:
+    # Return a message if book id does not match an entry in the database
+    if not rating or not rating.average:
         return jsonify(message="No rating available for this book id.")
 
+    # Return rating in a message
+    return jsonify(message=f"The average rating of this book is: {rating.average}"), 200
+
 
 # Allow a user to add a rating
 @read.route("/add", methods=["POST"])
 @exception_handler
-@jwt_required()
+@user_required()
 def add_read():
     try:
-        # Verify the user by getting their JWT identity and querying the database with the id
-        verify_user = get_jwt_identity()
-        user = db.session.query(User).get(verify_user)
-
-        # If user is not already registered return an error message
-        if not user:
-            return abort(400, description="User not found. Please login.")
+        # Get the user's id from their JWT identity
+        user_id = current_user_id()
 
         # Get the details of the new book view
         read = Read()
         read_fields = read_schema.load(request.json)
         read.rating = read_fields["rating"]
         read.book_id = read_fields["book_id"]
-        read.user_id = user.id
+        read.user_id = user_id
 
-        # Commit the review to the read table
+        # With group commit on, the review is written with others received at the same time
+        if review_writer.enabled:
+            review_writer.submit(Read, {"rating": read.rating, "book_id": read.book_id, "user_id": user_id})
+            return jsonify(message="You have added a review."), 200
+
+        # Commit the review to the read table and update the rating aggregate in the same transaction
         db.session.add(read)
+        add_rating(BookRating, read.book_id, read.rating)
         db.session.commit()
+        autocomplete.add_reviews("book", read.book_id, 1)
 
         return jsonify(message="You have added a review."), 200
     except exceptions.ValidationError:
         return abort(400, description="Error in request body. Please check for spelling mistakes and that all fields are included.")
 
 
+# Allow a user to set their ratings of many books at once, e.g. when syncing their library from the mobile app
+# Request body must be a JSON array of {"book_id": id, "rating": rating}, or one per line with the application/x-ndjson content type
+# A review is added for each book the user has not reviewed yet, and the rating of the others is replaced
+# Returns the book_ids created, updated and unchanged, and an error for each entry that could not be used
+@read.route("/sync", methods=["POST"])
+@exception_handler
+@user_required()
+def sync_read():
+    return jsonify(sync_reviews(Read, current_user_id())), 200
+
+
 # Update the rating for an entry in the read table only if the same user is attempting to make the change
 @read.route("/update/<int:review_id>", methods=["PUT"])
 @exception_handler
-@jwt_required()
+@user_required()
 def update_read(review_id):
     try:
-        # Verify the user by getting their JWT identity and querying the database with the id
-        verify_user = get_jwt_identity()
-        user = db.session.query(User).get(verify_user)
-
-        if not user:
-            return abort(400, description="User not found. Please login.")
+        # Get the user's id from their JWT identity
+        user_id = current_user_id()
         
         # Get the requested review from the database
         read = db.session.query(Read).filter(Read.id == review_id).first()
@@ -109,15 +112,17 @@ def update_read(review_id):
             return abort(404, description="A review with this id does not exist.")
 
         # Return an error if the user does not own the review
-        if read.user_id != user.id:
+        if read.user_id != user_id:
             return abort(403, description="You are not authorized to change this record.")
             
         # Update the rating
         read_fields = read_schema.load(request.json)
+        old_rating = read.rating
         read.rating = read_fields["rating"]
 
-        # Commit the update to the database
+        # Commit the update and the change to the rating aggregate to the database
         db.session.add(read)
+        change_rating(BookRating, read.book_id, old_rating, read.rating)
         db.session.commit()
 
         return jsonify(message="You have successfully updated your rating for this book."), 200
@@ -128,17 +133,13 @@ def update_read(review_id):
 # Allow a user to delete an individual entry from the read table
 @read.route("/delete/<int:read_id>", methods=["DELETE"])
 @exception_handler
-@jwt_required()
+@user_required()
 def delete_read(read_id):
-    # Verify the user by getting their JWT identity and querying the database with the id
-    verify_user = get_jwt_identity()
-    user = db.session.query(User).get(verify_user)
-    
-    if not user:
-        return abort(400, description="User not found. Please login.")
+    # Get the user's id from their JWT identity
+    user_id = current_user_id()
     
     # Get the requested review from the database
-    read = db.session.query(Read).filter(Read.user_id == user.id).first()
+    read = db.session.query(Read).filter(Read.user_id == user_id).first()
 
     if not read:
         return abort(403, description="You are not authorized to change this record.")
@@ -148,8 +149,10 @@ def delete_read(read_id):
     if not read:
         return abort(400, description="Review could not be located. Incorrect or invalid id.")
 
-    # Delete the review from the database
+    # Delete the review and remove it from the rating aggregate
     db.session.delete(read)
+    remove_rating(BookRating, read.book_id, read.rating)
     db.session.commit()
+    autocomplete.add_reviews("book", read.book_id, -1)
 
     return jsonify(message="You have successfully deleted your review for this book."), 200
\ No newline at end of file
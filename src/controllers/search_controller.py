@@ -0,0 +1,43 @@
+from flask import Blueprint, jsonify, request, abort
+from app import response_cache
+from helper import exception_handler
+from query_budget import query_budget
+from pagination import get_limit
+from full_text_search import search_documents, ENTITY_TYPES
+
+
+# Define blueprint 
+search = Blueprint('search', __name__, url_prefix="/search")
+
+
+# Search the titles of books and movies and the names of authors, directors, publishers and production companies
+# e.g. /search?q=stephen%20king, or /search?q=shining&type=book,movie to only search books and movies
+# Each word is matched as the start of a word, and the best matches across every type are returned first
+# Public access - no authentication required
+@search.route("", methods=["GET"])
+@response_cache.cached("book", "movie", "author", "director", "publisher", "production")
+@exception_handler
+@query_budget(1)
+def search_all():
+    unknown = sorted(set(request.args) - {"q", "type", "limit"})
+    if unknown:
+        return abort(400, description=f"Unknown query parameter(s): {', '.join(unknown)}.")
+
+    query = request.args.get("q", "").strip()
+    if not query:
+        return abort(400, description="Missing search query. Please search with ?q=")
+
+    types = None
+    if request.args.get("type"):
+        types = [entity.strip() for entity in request.args.get("type").split(",") if entity.strip()]
+        invalid = [entity for entity in types if entity not in ENTITY_TYPES]
+        if invalid:
+            return abort(400, description=f"Invalid type. Search one or more of: {', '.join(ENTITY_TYPES)}.")
+
+    limit = get_limit() if "limit" in request.args else 20
+    results = search_documents(query, types, limit)
+
+    return jsonify([
+        {"type": entity, "id": entity_id, "name": name, "rank": round(float(rank), 4)}
+        for entity, entity_id, name, rank in results
+    ])
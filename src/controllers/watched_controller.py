@@ -1,11 +1,18 @@
 from flask import Blueprint, jsonify, request, abort
 from app import db
 from marshmallow import exceptions
-from models.users import User
 from models.watched import Watched
+from models.ratings import MovieRating
 from schemas.watched_schema import watched_schema, watch_schema
-from flask_jwt_extended import jwt_required, get_jwt_identity
+from serializers import schema_response
+from authorization import user_required, current_user_id
 from helper import exception_handler
+from query_budget import query_budget
+from autocomplete import autocomplete
+from rating_aggregates import add_rating, change_rating, remove_rating
+from eager_loading import schema_query
+from group_commit import review_writer
+from review_sync import sync_reviews
 
 
 # Define blueprint 
@@ -15,93 +22,88 @@ watched = Blueprint('watched', __name__, url_prefix="/watched")
 # Query watched table to return all and only the user's entries 
 @watched.route("/<int:user_id>", methods=["GET"])
 @exception_handler
-@jwt_required()
+@user_required()
+@query_budget(1)
 def watched_id(user_id):
-    # Verify the user by getting their JWT identity and querying the database with the id
-    validate_user = get_jwt_identity()
-    user = db.session.query(User).get(validate_user)
-
-    # If user is not already registered return an error message
-    if not user:
-        return abort(400, description="User not found. Please login.")
-    
     # Return results if JWT identity matches the user id for the results
-    if user.id == user_id:
-        results = db.session.query(Watched).filter(Watched.user_id == user_id).all()
+    if current_user_id() == user_id:
+        results = schema_query(watched_schema, Watched).filter(Watched.user_id == user_id).all()
         # Return a message if there are no reviews
         if len(results) == 0:
             return jsonify(message="You have not reviewed any books.")
-        result = watched_schema.dump(results)
-        return jsonify(result)
+        return schema_response(watched_schema, results)
     # Return error message if the user id does not match the user id for the review
-    elif user.id != user_id:
+    elif current_user_id() != user_id:
         return abort(403, "Invalid user id. You are not authorized to access this information.")
 
 
-# Query read table with movie id to see the average rating 
+# Query the movie_rating table with movie id to see the average rating 
 @watched.route("/rating/<int:movie_id>", methods=["GET"])
 @exception_handler
+@query_budget(1)
 def read_ratings(movie_id):
-    try:
-        # Query read table to book id and get the average rating
-        average = db.session.query(Watched).filter(Watched.movie_id == movie_id).with_entities(db.func.avg(Watched.rating)).scalar()
-        
-        # Return a message if movie id does not match an entry in the database
-        if not average:
-            return jsonify(message="No rating available for this movie id.")
-        
-        average = round(average, 2)
+    # The rating aggregate is kept up to date as reviews change, so this is a single primary key lookup
+    rating = db.session.get(MovieRating, movie_id)
 
-        # Return rating in a message
-        return jsonify(message=f"The average rating of this movie is: {average}"), 200
-        # Return an error message if the book id does not match an entry in the database
-    except TypeError:
+    # Return a message if movie id does not match an entry in the database
+    if not rating or not rating.average:
         return jsonify(message="No rating available for this movie id.")
 
+    # Return rating in a message
+    return jsonify(message=f"The average rating of this movie is: {rating.average}"), 200
+
 
 # Allow a user to add a rating
 @watched.route("/add", methods=["POST"])
 @exception_handler
-@jwt_required()
+@user_required()
 def add_watched():
     try:
-        # Verify the user by getting their JWT identity and querying the database with the id
-        verify_user = get_jwt_identity()
-        user = db.session.query(User).get(verify_user)
-
-        # If user is not already registered return an error message
-        if not user:
-            return abort(400, description="User not found. Please login.")
+        # Get the user's id from their JWT identity
+        user_id = current_user_id()
 
         # Get the details of the new movie review
         watched = Watched()
         watched_fields = watch_schema.load(request.json)
         watched.rating = watched_fields["rating"]
         watched.movie_id = watched_fields["movie_id"]
-        watched.user_id = user.id
+        watched.user_id = user_id
 
-        # Commit the review to the watched table
+        # With group commit on, the review is written with others received at the same time
+        if review_writer.enabled:
+            review_writer.submit(Watched, {"rating": watched.rating, "movie_id": watched.movie_id, "user_id": user_id})
+            return jsonify(message="You have added a review."), 200
+
+        # Commit the review to the watched table and update the rating aggregate in the same transaction
         db.session.add(watched)
+        add_rating(MovieRating, watched.movie_id, watched.rating)
         db.session.commit()
+        autocomplete.add_reviews("movie", watched.movie_id, 1)
 
         return jsonify(message="You have added a review."), 200
     except exceptions.ValidationError:
         return abort(400, description="Error in request body. Please check for spelling mistakes and that all fields are included.")
-    
+
+
+# Allow a user to set their ratings of many movies at once, e.g. when syncing their library from the mobile app
+# Request body must be a JSON array of {"movie_id": id, "rating": rating}, or one per line with the application/x-ndjson content type
+# A review is added for each movie the user has not reviewed yet, and the rating of the others is replaced
+# Returns the movie_ids created, updated and unchanged, and an error for each entry that could not be used
+@watched.route("/sync", methods=["POST"])
+@exception_handler
+@user_required()
+def sync_watched():
+    return jsonify(sync_reviews(Watched, current_user_id())), 200
 
 
 # Update the rating for an entry in the watched table only if the same user is attempting to make the change
 @watched.route("/update/<int:id>", methods=["PUT"])
 @exception_handler
-@jwt_required()
+@user_required()
 def update_watched(id):
     try:
-        # Verify the user by getting their JWT identity querying the database with the id
-        verify_user = get_jwt_identity()
-        user = User.query.get(verify_user)
-
-        if not user:
-            return abort(400, description="User not found. Please login.")
+        # Get the user's id from their JWT identity
+        user_id = current_user_id()
         
         # Get the requested review from the database
         watched = db.session.query(Watched).filter(Watched.id == id).first()
@@ -110,15 +112,17 @@ def update_watched(id):
             return abort(404, description="A review with this id does not exist.")
 
         # Return an error if the user does not own the review
-        if watched.user_id != user.id:
+        if watched.user_id != user_id:
             return abort(403, description="You are not authorized to change this record.")
             
          # Update the rating
         watched_fields = watch_schema.load(request.json)
+        old_rating = watched.rating
         watched.rating = watched_fields["rating"]
 
-        # Commit the update to the database
+        # Commit the update and the change to the rating aggregate to the database
         db.session.add(watched)
+        change_rating(MovieRating, watched.movie_id, old_rating, watched.rating)
         db.session.commit()
 
         return jsonify(message="You have successfully updated your rating for this movie."), 200
@@ -129,17 +133,13 @@ def update_watched(id):
 # Allow a user to delete an individual entry from the watched table
 @watched.route("/delete/<int:watched_id>", methods=["DELETE"])
 @exception_handler
-@jwt_required()
+@user_required()
 def delete_watched(watched_id):
-    # Verify the user by getting their JWT identity and querying the database with the id
-    verify_user = get_jwt_identity()
-    user = db.session.query(User).get(verify_user)
-    
-    if not user:
-        return abort(400, description="User not found. Please login.")
+    # Get the user's id from their JWT identity
+    user_id = current_user_id()
     
     # Get the requested review from the database
-    watched = db.session.query(Watched).filter(Watched.user_id == user.id).first()
+    watched = db.session.query(Watched).filter(Watched.user_id == user_id).first()
 
     if not watched:
         return abort(403, description="You are not authorized to change this record.")
@@ -149,8 +149,10 @@ def delete_watched(watched_id):
     if not watched:
         return abort(400, description="Review could not be located. Incorrect or invalid id.")
 
-    # Delete the review from the database
+    # Delete the review and remove it from the rating aggregate
     db.session.delete(watched)
+    remove_rating(MovieRating, watched.movie_id, watched.rating)
     db.session.commit()
+    autocomplete.add_reviews("movie", watched.movie_id, -1)
 
     return jsonify(message="You have successfully deleted your review for this movie."), 200
\ No newline at end of file
@@ -0,0 +1,75 @@
+from sqlalchemy import inspect
+from sqlalchemy.orm import joinedload, selectinload, load_only, ColumnProperty
+from marshmallow import fields
+from app import db
+
+
+# Loader options already built for a schema and model, so the schemas are only walked once
+_options_cache = {}
+
+
+# Build the loader options needed to dump a query's results with a schema without lazy loading
+# Every Nested field the schema will dump is matched to the relationship of the same name on the model
+# Many-to-one relationships are joined into the main query, collections are loaded with one extra SELECT ... IN
+# With sparse=True only the columns the schema dumps are loaded, of the model and of each nested relationship
+def schema_load_options(schema, model, sparse=False):
+    key = (type(schema), tuple(schema.dump_fields), model, sparse)
+
+    if key not in _options_cache:
+        _options_cache[key] = tuple(_build_options(schema, model, sparse))
+
+    return _options_cache[key]
+
+
+# Start a query for a model with the loader options needed to dump its results with the schema
+# Use sparse=True when nothing but the schema reads the rows, e.g. for a list, as other columns are not loaded
+def schema_query(schema, model, sparse=False):
+    return db.session.query(model).options(*schema_load_options(schema, model, sparse))
+
+
+# Return the columns of a model a schema dumps, or None if a field may read something other than a column
+# The primary key is returned if the schema only dumps relationships
+def schema_columns(schema, model):
+    mapper = inspect(model)
+    attributes = mapper.attrs
+    columns = []
+
+    for name, field in schema.dump_fields.items():
+        attribute = attributes.get(field.attribute or name)
+        if isinstance(attribute, ColumnProperty):
+            columns.append(getattr(model, attribute.key))
+        elif not isinstance(field, fields.Nested) or attribute is None:
+            return None
+
+    return columns or [getattr(model, mapper.get_property_by_column(column).key) for column in mapper.primary_key]
+
+
+def _build_options(schema, model, sparse=False):
+    options = []
+    relationships = inspect(model).relationships
+
+    if sparse:
+        columns = schema_columns(schema, model)
+        if columns is not None:
+            options.append(load_only(*columns))
+
+    for name, field in schema.dump_fields.items():
+        if not isinstance(field, fields.Nested):
+            continue
+
+        relationship = relationships.get(field.attribute or name)
+        # Skip nested fields that are not backed by a relationship on the model
+        if relationship is None:
+            continue
+
+        attribute = getattr(model, relationship.key)
+        loader = selectinload(attribute) if relationship.uselist else joinedload(attribute)
+
+        # Load any relationships the nested schema will dump in turn
+        nested_options = _build_options(field.schema, relationship.mapper.class_, sparse)
+        if nested_options:
+            loader = loader.options(*nested_options)
+
+        options.append(loader)
+
+    return options
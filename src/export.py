@@ -0,0 +1,42 @@
+from flask import current_app, stream_with_context
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from app import db
+from eager_loading import schema_load_options
+from serializers import compiled, encode
+
+
+# Stream every row of one or more models as newline delimited JSON (NDJSON), one row per line
+# sources is a list of (schema, model, extra) where extra is None or a dict of fields written before each
+# row's own, e.g. {"type": "book"}. Rows are read in order of id through a server-side cursor, EXPORT_BATCH_SIZE
+# at a time, and each batch is written out before the next is fetched, so memory use does not grow with the
+# size of the tables. On PostgreSQL every source is read in one REPEATABLE READ transaction, so the export
+# is a consistent snapshot however long it takes. Other databases read each source with a single statement.
+def export_response(sources):
+    def generate():
+        batch_size = current_app.config.get("EXPORT_BATCH_SIZE", 1000)
+
+        with db.engine.connect() as connection:
+            if connection.dialect.name == "postgresql":
+                connection = connection.execution_options(isolation_level="REPEATABLE READ", postgresql_readonly=True)
+
+            with Session(bind=connection) as session:
+                for schema, model, extra in sources:
+                    row = compiled(schema)
+                    statement = (
+                        select(model)
+                        .options(*schema_load_options(schema, model, sparse=True))
+                        .order_by(model.id)
+                        .execution_options(yield_per=batch_size)
+                    )
+                    for batch in session.scalars(statement).partitions():
+                        if extra:
+                            lines = (encode(dict(extra, **row(instance))) for instance in batch)
+                        else:
+                            lines = (encode(row(instance)) for instance in batch)
+                        yield b"\n".join(lines) + b"\n"
+
+    # Ask proxies such as nginx to pass each batch on straight away rather than buffering the response
+    return current_app.response_class(
+        stream_with_context(generate()), mimetype="application/x-ndjson", headers={"X-Accel-Buffering": "no"}
+    )
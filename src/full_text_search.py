@@ -0,0 +1,130 @@
+import re
+from sqlalchemy import bindparam, event, delete, func, insert, inspect, select, literal, text, and_, or_
+from sqlalchemy.orm import Session
+from app import db
+from models.books import Book, Author, Publisher
+from models.movies import Movie, Director, ProductionCompany
+from models.search_documents import SearchDocument
+
+
+# The models searched by /search, with the entity type returned for each and the column holding its name
+INDEXED = {
+    Book: ("book", Book.title),
+    Movie: ("movie", Movie.title),
+    Author: ("author", Author.published_name),
+    Director: ("director", Director.director_name),
+    Publisher: ("publisher", Publisher.publisher_name),
+    ProductionCompany: ("production_company", ProductionCompany.name)
+}
+ENTITY_TYPES = [entity for entity, column in INDEXED.values()]
+
+
+# Return the words in a search, each word is matched as a prefix so "stephen ki" finds "Stephen King"
+def search_words(query):
+    return re.findall(r"\w+", query.lower())
+
+
+# Add or replace the search documents for the rows of a model with the ids given
+def index_documents(model, ids, connection=None):
+    if not ids:
+        return
+    connection = connection or db.session.connection()
+    entity, column = INDEXED[model]
+    remove_documents(model, ids, connection)
+    connection.execute(insert(SearchDocument).from_select(
+        ["entity", "entity_id", "name"],
+        select(literal(entity), model.id, column).where(model.id.in_(ids))
+    ))
+
+
+# Remove the search documents for the rows of a model with the ids given
+def remove_documents(model, ids, connection=None):
+    if not ids:
+        return
+    connection = connection or db.session.connection()
+    entity = INDEXED[model][0]
+    connection.execute(delete(SearchDocument).where(SearchDocument.entity == entity, SearchDocument.entity_id.in_(ids)))
+
+
+# Rebuild every search document from the indexed tables, returns the number of documents
+def rebuild_search_index():
+    db.session.execute(delete(SearchDocument))
+    for model, (entity, column) in INDEXED.items():
+        db.session.execute(insert(SearchDocument).from_select(
+            ["entity", "entity_id", "name"], select(literal(entity), model.id, column)
+        ))
+    db.session.commit()
+    return db.session.query(SearchDocument).count()
+
+
+# Keep the search documents up to date with every book, movie, author etc. added, renamed or deleted
+# through the ORM, including rows deleted by a cascade. The documents are written in the same transaction.
+@event.listens_for(Session, "after_flush")
+def index_flushed(session, flush_context):
+    changed = {}
+    removed = {}
+
+    for instance in session.new:
+        if type(instance) in INDEXED:
+            changed.setdefault(type(instance), set()).add(instance.id)
+
+    for instance in session.dirty:
+        if type(instance) in INDEXED:
+            entity, column = INDEXED[type(instance)]
+            if inspect(instance).attrs[column.key].history.has_changes():
+                changed.setdefault(type(instance), set()).add(instance.id)
+
+    for instance in session.deleted:
+        if type(instance) in INDEXED:
+            removed.setdefault(type(instance), set()).add(instance.id)
+
+    if not changed and not removed:
+        return
+
+    connection = session.connection()
+    for model, ids in changed.items():
+        index_documents(model, ids, connection)
+    for model, ids in removed.items():
+        remove_documents(model, ids, connection)
+
+
+# Search the names of every indexed entity, or only those of the types given
+# Returns up to limit matches as (entity, entity_id, name, rank), best match first
+def search_documents(query, types=None, limit=20):
+    words = search_words(query)
+    if not words:
+        return []
+
+    dialect = db.session.get_bind().dialect.name
+    types = types or ENTITY_TYPES
+    parameters = {"types": types, "limit": limit}
+
+    if dialect == "postgresql":
+        parameters["query"] = " & ".join(f"{word}:*" for word in words)
+        statement = text(
+            "SELECT d.entity, d.entity_id, d.name, ts_rank(to_tsvector('simple', d.name), q.query) AS rank "
+            "FROM search_document d, to_tsquery('simple', :query) AS q(query) "
+            "WHERE to_tsvector('simple', d.name) @@ q.query AND d.entity IN :types "
+            "ORDER BY rank DESC, length(d.name), d.id LIMIT :limit"
+        ).bindparams(bindparam("types", expanding=True))
+    elif dialect == "sqlite":
+        # FTS5 ranks the best matches with the lowest bm25 score, it is negated so higher is better everywhere
+        parameters["query"] = " ".join(f'"{word}"*' for word in words)
+        statement = text(
+            "SELECT d.entity, d.entity_id, d.name, -bm25(search_document_fts) AS rank "
+            "FROM search_document_fts JOIN search_document d ON d.id = search_document_fts.rowid "
+            "WHERE search_document_fts MATCH :query AND d.entity IN :types "
+            "ORDER BY bm25(search_document_fts), length(d.name), d.id LIMIT :limit"
+        ).bindparams(bindparam("types", expanding=True))
+    else:
+        # No full-text index, match each word against the start of any word in the name
+        matches = [or_(SearchDocument.name.ilike(f"{word}%"), SearchDocument.name.ilike(f"% {word}%")) for word in words]
+        statement = (
+            select(SearchDocument.entity, SearchDocument.entity_id, SearchDocument.name, literal(0.0).label("rank"))
+            .where(and_(*matches), SearchDocument.entity.in_(types))
+            .order_by(func.length(SearchDocument.name), SearchDocument.id)
+            .limit(limit)
+        )
+        parameters = {}
+
+    return db.session.execute(statement, parameters).all()
@@ -0,0 +1,150 @@
+import os
+import threading
+import time
+from sqlalchemy import insert
+from werkzeug.exceptions import ServiceUnavailable
+from app import db
+from autocomplete import autocomplete
+from models.ratings import BookRating, MovieRating
+from models.read import Read
+from models.watched import Watched
+from rating_aggregates import SOURCES, add_ratings
+
+
+# Rating aggregate and autocomplete entity updated with each review table
+REVIEWS = {
+    Read: (BookRating, "book"),
+    Watched: (MovieRating, "movie")
+}
+
+# Longest a request waits for its review to be committed before giving up
+ACKNOWLEDGE_TIMEOUT = 30
+
+
+# A review waiting to be written, and the outcome of its write once the batch it is in has been committed
+class PendingReview(object):
+    __slots__ = ("model", "values", "done", "error")
+
+    def __init__(self, model, values):
+        self.model = model
+        self.values = values
+        self.done = threading.Event()
+        self.error = None
+
+
+# Writes reviews from every request in batches, so a burst of reviews shares a few commits instead of one each
+# With REVIEW_GROUP_COMMIT on, each review is added to a buffer and the request waits while a background thread
+# inserts the buffer with one multi-row insert per review table and updates the rating aggregates in the same
+# transaction. The buffer is written REVIEW_GROUP_COMMIT_MS milliseconds after its first review arrives, or as
+# soon as it holds REVIEW_GROUP_COMMIT_ROWS reviews. A request only returns once its review has been committed.
+class GroupCommit(object):
+    def __init__(self, app=None):
+        self.app = None
+        self.enabled = False
+        self.interval = 0.01
+        self.max_rows = 100
+        self._pending = []
+        self._condition = threading.Condition()
+        self._worker = None
+        self._pid = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.enabled = app.config.get("REVIEW_GROUP_COMMIT", False)
+        self.interval = app.config.get("REVIEW_GROUP_COMMIT_MS", 10) / 1000
+        self.max_rows = app.config.get("REVIEW_GROUP_COMMIT_ROWS", 100)
+
+    # Write a review, e.g. submit(Read, {"rating": 5, "book_id": 1, "user_id": 2}), and wait until it is committed
+    # Raises the error the insert failed with, e.g. IntegrityError if the book does not exist
+    def submit(self, model, values):
+        review = PendingReview(model, values)
+        with self._condition:
+            self._start_worker()
+            self._pending.append(review)
+            self._condition.notify()
+
+        if not review.done.wait(ACKNOWLEDGE_TIMEOUT):
+            raise ServiceUnavailable(description="Your review could not be saved in time. Please try again shortly.", retry_after=1)
+        if review.error is not None:
+            raise review.error
+
+    def _start_worker(self):
+        # Start a new thread after a fork, as the parent's thread is not copied
+        if self._pid != os.getpid():
+            self._pending = []
+            self._worker = None
+            self._pid = os.getpid()
+        if self._worker is None or not self._worker.is_alive():
+            self._worker = threading.Thread(target=self._write_batches, name="review-group-commit", daemon=True)
+            self._worker.start()
+
+    def _write_batches(self):
+        while True:
+            with self._condition:
+                while not self._pending:
+                    self._condition.wait()
+
+                # Wait for the batch to fill up, or for the oldest review to have waited long enough
+                deadline = time.monotonic() + self.interval
+                while len(self._pending) < self.max_rows:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._condition.wait(remaining)
+
+                batch = self._pending[:self.max_rows]
+                del self._pending[:self.max_rows]
+
+            try:
+                with self.app.app_context():
+                    self._write(batch)
+            except Exception as error:
+                # Release the requests waiting on a batch that could not be written at all, e.g. with the database down
+                for review in batch:
+                    if not review.done.is_set():
+                        review.error = error
+                        review.done.set()
+
+    def _write(self, batch):
+        try:
+            _insert(batch)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            # Write the reviews one at a time, so only those that cannot be written fail
+            for review in batch:
+                try:
+                    _insert([review])
+                    db.session.commit()
+                except Exception as error:
+                    db.session.rollback()
+                    review.error = error
+        finally:
+            db.session.remove()
+
+        for review in batch:
+            if review.error is None:
+                aggregate, entity = REVIEWS[review.model]
+                autocomplete.add_reviews(entity, review.values[SOURCES[aggregate].key], 1)
+            review.done.set()
+
+
+# Insert reviews and add their ratings to the rating aggregates, in the current transaction
+def _insert(batch):
+    for model, (aggregate, _) in REVIEWS.items():
+        rows = [review.values for review in batch if review.model is model]
+        if not rows:
+            continue
+
+        key = SOURCES[aggregate].key
+        ratings = {}
+        for row in rows:
+            ratings.setdefault(row[key], []).append(row["rating"])
+
+        db.session.execute(insert(model), rows)
+        add_ratings(aggregate, ratings)
+
+
+review_writer = GroupCommit()
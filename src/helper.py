@@ -28,4 +28,4 @@ def exception_handler(func):
             return abort(400, description="New entry already exist in the database.")
         except AttributeError:
             return abort(400, "No results found. Please check your query is accurate.")
-    return function
\ No newline at end of file
+    return function
@@ -0,0 +1,242 @@
+from sqlalchemy import inspect, select, delete, text
+from sqlalchemy.orm import aliased
+from sqlalchemy.types import Integer
+from app import db
+from models.books import Book
+from models.movies import Movie
+from models.read import Read
+from models.watched import Watched
+from models.ratings import BookRating, MovieRating
+from models.users import DeletedUser
+from models.schema_migrations import SchemaMigration
+from models.search_documents import SearchDocument
+from full_text_search import rebuild_search_index
+from rating_aggregates import SOURCES, refresh_ratings, rebuild_ratings
+
+
+# Changes to the schema of an existing database, applied in order by "flask db migrate"
+# Each migration runs once and is recorded in the schema_migration table. A database created with
+# "flask db create" already has the current schema, so every migration is recorded as applied then.
+MIGRATIONS = []
+
+
+# Register a function as a migration, it is called with online=True to avoid locking tables for writes
+# It can return a summary of the changes made to the data, e.g. the number of rows removed
+def migration(name):
+    def decorator(func):
+        MIGRATIONS.append((name, func))
+        return func
+    return decorator
+
+
+# Apply every migration not yet recorded in the schema_migration table and return the name and summary of each
+def run_migrations(online=False):
+    SchemaMigration.__table__.create(db.engine, checkfirst=True)
+    applied = set(db.session.execute(select(SchemaMigration.name)).scalars())
+    ran = []
+
+    for name, func in MIGRATIONS:
+        if name in applied:
+            continue
+        summary = func(online)
+        db.session.add(SchemaMigration(name=name))
+        db.session.commit()
+        ran.append((name, summary))
+
+    return ran
+
+
+# Record every migration as applied, for a database just created with the current schema
+def mark_migrations_applied():
+    applied = set(db.session.execute(select(SchemaMigration.name)).scalars())
+    db.session.add_all(SchemaMigration(name=name) for name, func in MIGRATIONS if name not in applied)
+    db.session.commit()
+
+
+# Return the index with the given name from a model's table
+def model_index(model, name):
+    return next(index for index in model.__table__.indexes if index.name == name)
+
+
+# Create an index declared on a model, if it does not already exist
+# The rows must already be unique for a unique index. With online=True on PostgreSQL the index is built CONCURRENTLY, so reads and writes to the table carry on
+# while it is built. This cannot run inside a transaction, and a build that fails leaves an invalid index
+# behind, which is dropped and built again.
+def create_index(index, online=False):
+    columns = ", ".join(f'"{column.name}"' for column in index.columns)
+
+    with db.engine.connect() as connection:
+        concurrently = ""
+        if online and connection.dialect.name == "postgresql":
+            connection = connection.execution_options(isolation_level="AUTOCOMMIT")
+            concurrently = "CONCURRENTLY "
+            invalid = connection.execute(text(
+                "SELECT 1 FROM pg_class c JOIN pg_index i ON i.indexrelid = c.oid "
+                "WHERE c.relname = :name AND NOT i.indisvalid"
+            ), {"name": index.name}).first()
+            if invalid:
+                connection.execute(text(f'DROP INDEX CONCURRENTLY "{index.name}"'))
+
+        unique = "UNIQUE " if index.unique else ""
+        connection.execute(text(
+            f'CREATE {unique}INDEX {concurrently}IF NOT EXISTS "{index.name}" ON "{index.table.name}" ({columns})'
+        ))
+        connection.commit()
+
+
+# Index the columns used to filter books and movies, join them to their authors, directors etc.,
+# average their ratings and list each user's reviews
+@migration("0001_add_lookup_indexes")
+def add_lookup_indexes(online):
+    indexes = {
+        Book: ["ix_book_title", "ix_book_author_id", "ix_book_publisher_id"],
+        Movie: ["ix_movie_title", "ix_movie_box_office_ranking", "ix_movie_book_id", "ix_movie_director_id",
+                "ix_movie_production_company_id"],
+        Read: ["ix_read_book_id_rating", "ix_read_user_id_id"],
+        Watched: ["ix_watched_movie_id_rating", "ix_watched_user_id_id"]
+    }
+    for model, names in indexes.items():
+        for name in names:
+            create_index(model_index(model, name), online)
+
+
+# Parse a number stored as a string, allowing spaces and thousands separators e.g. "25,000"
+def parse_integer(value):
+    if value is None:
+        return None
+    return int(str(value).replace(",", "").strip())
+
+
+# Convert a string column holding whole numbers to an integer column
+# The numbers are copied to a new column in chunks of chunk_size rows, each in its own transaction, so the
+# table is not locked while most rows are converted. Writes are then blocked for a last pass that picks up
+# rows changed in the meantime, before the new column replaces the old one. The old column is kept if any value
+# is not a whole number, and running it again after a failure carries on from the new column.
+def convert_to_integer(model, column, chunk_size=1000):
+    table = model.__tablename__
+    new_column = f"{column}_integer"
+    columns = {info["name"]: info for info in inspect(db.engine).get_columns(table)}
+
+    # Already converted, e.g. a database created with the current models
+    if isinstance(columns[column]["type"], Integer):
+        return
+
+    if new_column not in columns:
+        with db.engine.begin() as connection:
+            connection.execute(text(f'ALTER TABLE "{table}" ADD COLUMN "{new_column}" INTEGER'))
+
+    def convert(connection, rows):
+        values = []
+        invalid = []
+        for id, value, converted in rows:
+            try:
+                number = parse_integer(value)
+            except ValueError:
+                invalid.append(id)
+                continue
+            if number != converted:
+                values.append({"id": id, "value": number})
+        if invalid:
+            raise ValueError(f"{table}.{column} is not a whole number for id(s): {', '.join(map(str, invalid))}")
+        if values:
+            connection.execute(text(f'UPDATE "{table}" SET "{new_column}" = :value WHERE id = :id'), values)
+
+    select_rows = text(
+        f'SELECT id, "{column}", "{new_column}" FROM "{table}" WHERE id > :last_id ORDER BY id LIMIT :limit'
+    )
+
+    last_id = 0
+    while True:
+        with db.engine.begin() as connection:
+            rows = connection.execute(select_rows, {"last_id": last_id, "limit": chunk_size}).all()
+            if not rows:
+                break
+            convert(connection, rows)
+            last_id = rows[-1][0]
+
+    with db.engine.begin() as connection:
+        postgresql = connection.dialect.name == "postgresql"
+        if postgresql:
+            # Reads carry on, but writes wait until the column has been replaced
+            connection.execute(text(f'LOCK TABLE "{table}" IN EXCLUSIVE MODE'))
+        convert(connection, connection.execute(text(f'SELECT id, "{column}", "{new_column}" FROM "{table}"')).all())
+        connection.execute(text(f'ALTER TABLE "{table}" DROP COLUMN "{column}"'))
+        connection.execute(text(f'ALTER TABLE "{table}" RENAME COLUMN "{new_column}" TO "{column}"'))
+        # SQLite cannot add NOT NULL to an existing column, the models still require a value
+        if postgresql:
+            connection.execute(text(f'ALTER TABLE "{table}" ALTER COLUMN "{column}" SET NOT NULL'))
+
+
+# Store book lengths, copies published and movie lengths as integers, so they sort and compare as numbers,
+# and index them for range searches
+@migration("0002_integer_lengths")
+def integer_lengths(online):
+    convert_to_integer(Book, "length")
+    convert_to_integer(Book, "copies_published")
+    convert_to_integer(Movie, "length")
+
+    create_index(model_index(Book, "ix_book_length"), online)
+    create_index(model_index(Book, "ix_book_copies_published"), online)
+    create_index(model_index(Movie, "ix_movie_length"), online)
+
+
+# Add the full-text search index of book and movie titles and author, director, publisher and production
+# company names used by /search, and fill it from the existing rows
+@migration("0003_search_documents")
+def search_documents(online):
+    SearchDocument.__table__.create(db.engine, checkfirst=True)
+    rebuild_search_index()
+
+
+# Add the book_rating and movie_rating tables that hold each book's and movie's average rating, and fill
+# them from the existing reviews
+@migration("0004_rating_aggregates")
+def rating_aggregates(online):
+    BookRating.__table__.create(db.engine, checkfirst=True)
+    MovieRating.__table__.create(db.engine, checkfirst=True)
+    rebuild_ratings(BookRating)
+    rebuild_ratings(MovieRating)
+
+
+# Add the token generation of each user, incremented to revoke their tokens, and the deleted_user table
+# that revokes the tokens of deleted users in every process
+@migration("0005_token_revocation")
+def token_revocation(online):
+    columns = [info["name"] for info in inspect(db.engine).get_columns("user")]
+    if "token_generation" not in columns:
+        with db.engine.begin() as connection:
+            connection.execute(text('ALTER TABLE "user" ADD COLUMN token_generation INTEGER NOT NULL DEFAULT 0'))
+    DeletedUser.__table__.create(db.engine, checkfirst=True)
+
+
+# Delete every review a user has of an item except their latest, and recalculate the rating aggregates of
+# the items that had more than one review from the same user
+def remove_duplicate_reviews(aggregate):
+    source = SOURCES[aggregate]
+    model = source.class_
+    newer = aliased(model)
+    duplicates = (
+        select(model.id, source)
+        .join(newer, (newer.user_id == model.user_id) & (getattr(newer, source.key) == source) & (newer.id > model.id))
+        .distinct()
+    )
+
+    rows = db.session.execute(duplicates).all()
+    if not rows:
+        return 0
+
+    db.session.execute(delete(model).where(model.id.in_([id for id, item_id in rows])))
+    refresh_ratings(aggregate, [item_id for id, item_id in rows])
+    db.session.commit()
+    return len(rows)
+
+
+# Allow each user only one review of a book or movie, keeping their latest review where they have several,
+# so /read/sync and /watched/sync can update a review in place with INSERT ... ON CONFLICT
+@migration("0006_unique_reviews")
+def unique_reviews(online):
+    reads = remove_duplicate_reviews(BookRating)
+    create_index(model_index(Read, "ix_read_user_id_book_id"), online)
+    watched = remove_duplicate_reviews(MovieRating)
+    create_index(model_index(Watched, "ix_watched_user_id_movie_id"), online)
+    return f"Removed {reads} duplicate book review(s) and {watched} duplicate movie review(s)."
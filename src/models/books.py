@@ -4,17 +4,19 @@ from app import db
 # Define Book model
 class Book(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    title = db.Column(db.String(), nullable=False)
+    title = db.Column(db.String(), nullable=False, index=True)
     isbn = db.Column(db.String(), unique=True, nullable=False)
-    length = db.Column(db.String(), nullable=False)
+    length = db.Column(db.Integer, nullable=False, index=True)
     first_publication_date = db.Column(db.DateTime, nullable=False)
-    copies_published = db.Column(db.String(), nullable=False)
+    copies_published = db.Column(db.Integer, nullable=False, index=True)
     # Define Foreign Keys
-    author_id = db.Column(db.Integer, db.ForeignKey('author.id'), nullable=False)
-    publisher_id = db.Column(db.Integer, db.ForeignKey('publisher.id'), nullable=False)
-    # Define relationships with the read and movie tables
+    author_id = db.Column(db.Integer, db.ForeignKey('author.id'), nullable=False, index=True)
+    publisher_id = db.Column(db.Integer, db.ForeignKey('publisher.id'), nullable=False, index=True)
+    # Define relationships with the read, movie and book_rating tables
     read = db.relationship("Read", backref="book", cascade="all, delete-orphan")
     movie = db.relationship("Movie", backref="movie", cascade="all, delete-orphan")
+    # The rating aggregate is deleted with the book, as SQLite does not enforce its ON DELETE CASCADE
+    rating = db.relationship("BookRating", uselist=False, cascade="all, delete-orphan")
 
 
 # Define Author model
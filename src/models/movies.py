@@ -3,18 +3,20 @@ from app import db
 # Define Movie model
 class Movie(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    title = db.Column(db.String(), nullable=False)
+    title = db.Column(db.String(), nullable=False, index=True)
     release_date = db.Column(db.DateTime, nullable=False)
-    length = db.Column(db.String(), nullable=False)
-    box_office_ranking = db.Column(db.Integer, nullable=False)
+    length = db.Column(db.Integer, nullable=False, index=True)
+    box_office_ranking = db.Column(db.Integer, nullable=False, index=True)
     # Define Foreign Keys
-    book_id = db.Column(db.Integer, db.ForeignKey('book.id'), nullable=False)
+    book_id = db.Column(db.Integer, db.ForeignKey('book.id'), nullable=False, index=True)
     # book_id = db.Column(db.Integer, db.ForeignKey('book.id'))
-    director_id = db.Column(db.Integer, db.ForeignKey('director.id'), nullable=False)
-    production_company_id = db.Column(db.Integer, db.ForeignKey('production_company.id'), nullable=False)
-    # Define relationships with watched and book tables
+    director_id = db.Column(db.Integer, db.ForeignKey('director.id'), nullable=False, index=True)
+    production_company_id = db.Column(db.Integer, db.ForeignKey('production_company.id'), nullable=False, index=True)
+    # Define relationships with watched, book and movie_rating tables
     watched = db.relationship('Watched', backref='movie', cascade="all, delete-orphan")
     book = db.relationship('Book', overlaps="movie,movie", single_parent=True, cascade="all, delete-orphan")
+    # The rating aggregate is deleted with the movie, as SQLite does not enforce its ON DELETE CASCADE
+    rating = db.relationship('MovieRating', uselist=False, cascade="all, delete-orphan")
 
 
 # Define Director model
@@ -0,0 +1,29 @@
+from app import db
+from decimal import Decimal
+
+
+# Define the columns shared by the book and movie rating aggregates
+class RatingAggregate(object):
+    rating_count = db.Column(db.Integer, nullable=False, default=0)
+    rating_sum = db.Column(db.Integer, nullable=False, default=0)
+    rating_min = db.Column(db.Integer)
+    rating_max = db.Column(db.Integer)
+
+    # Return the average rating rounded to two decimal places, or None if there are no ratings
+    @property
+    def average(self):
+        if not self.rating_count:
+            return None
+        return round(Decimal(self.rating_sum) / self.rating_count, 2)
+
+
+# Define BookRating model
+# One row per book, kept up to date whenever an entry in the read table is added, updated or deleted
+class BookRating(RatingAggregate, db.Model):
+    book_id = db.Column(db.Integer, db.ForeignKey('book.id', ondelete="CASCADE"), primary_key=True)
+
+
+# Define MovieRating model
+# One row per movie, kept up to date whenever an entry in the watched table is added, updated or deleted
+class MovieRating(RatingAggregate, db.Model):
+    movie_id = db.Column(db.Integer, db.ForeignKey('movie.id', ondelete="CASCADE"), primary_key=True)
@@ -7,4 +7,12 @@ class Read(db.Model):
     rating = db.Column(db.Integer, nullable=False)
     # Define Foreign Keys
     book_id = db.Column(db.Integer, db.ForeignKey('book.id'), nullable=False)
-    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
\ No newline at end of file
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    # Define indexes
+    # A book's ratings are read from (book_id, rating) alone, and a user's history is listed from (user_id, id) in order
+    __table_args__ = (
+        db.Index("ix_read_book_id_rating", "book_id", "rating"),
+        db.Index("ix_read_user_id_id", "user_id", "id"),
+        # A user has one review of each book, which /read/sync updates in place
+        db.Index("ix_read_user_id_book_id", "user_id", "book_id", unique=True),
+    )
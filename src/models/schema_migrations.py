@@ -0,0 +1,10 @@
+from app import db
+from datetime import datetime
+
+
+# Define SchemaMigration model
+# One row per migration that has been applied to the database, see migrations.py
+class SchemaMigration(db.Model):
+    __tablename__ = "schema_migration"
+    name = db.Column(db.String(), primary_key=True)
+    applied_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
@@ -0,0 +1,40 @@
+from app import db
+from sqlalchemy import DDL, event, func, literal_column
+
+
+# Define SearchDocument model
+# One row per book, movie, author, director, publisher and production company, holding the title or name
+# searched by /search. The rows are kept up to date by full_text_search.py.
+class SearchDocument(db.Model):
+    __tablename__ = "search_document"
+    id = db.Column(db.Integer, primary_key=True)
+    entity = db.Column(db.String(), nullable=False)
+    entity_id = db.Column(db.Integer, nullable=False)
+    name = db.Column(db.String(), nullable=False)
+    # Define indexes
+    # PostgreSQL searches a GIN index of the words in each name, SQLite uses the FTS5 table created below
+    __table_args__ = (
+        db.UniqueConstraint("entity", "entity_id"),
+        db.Index(
+            "ix_search_document_name_tsvector",
+            func.to_tsvector(literal_column("'simple'"), literal_column("name")),
+            postgresql_using="gin"
+        ).ddl_if(dialect="postgresql"),
+    )
+
+
+# Full-text index of the names for SQLite, kept in step with the search_document table by triggers
+SQLITE_FTS = [
+    "CREATE VIRTUAL TABLE search_document_fts USING fts5(name, content='search_document', content_rowid='id')",
+    "CREATE TRIGGER search_document_insert AFTER INSERT ON search_document BEGIN "
+    "INSERT INTO search_document_fts(rowid, name) VALUES (new.id, new.name); END",
+    "CREATE TRIGGER search_document_delete AFTER DELETE ON search_document BEGIN "
+    "INSERT INTO search_document_fts(search_document_fts, rowid, name) VALUES ('delete', old.id, old.name); END",
+    "CREATE TRIGGER search_document_update AFTER UPDATE ON search_document BEGIN "
+    "INSERT INTO search_document_fts(search_document_fts, rowid, name) VALUES ('delete', old.id, old.name); "
+    "INSERT INTO search_document_fts(rowid, name) VALUES (new.id, new.name); END"
+]
+
+for statement in SQLITE_FTS:
+    event.listen(SearchDocument.__table__, "after_create", DDL(statement).execute_if(dialect="sqlite"))
+event.listen(SearchDocument.__table__, "before_drop", DDL("DROP TABLE IF EXISTS search_document_fts").execute_if(dialect="sqlite"))
@@ -9,6 +9,16 @@ class User(db.Model):
     email = db.Column(db.String(), unique=True, nullable=False)
     password = db.Column(db.String(), nullable=False)
     admin = db.Column(db.Boolean, default=False)
+    # Incremented to revoke every JWT issued to the user so far
+    token_generation = db.Column(db.Integer, nullable=False, default=0)
     # Define relationship with read and watched tables
     watched = db.relationship('Watched', backref='user', cascade="all, delete")
-    read = db.relationship('Read', backref='user', cascade="all, delete")
\ No newline at end of file
+    read = db.relationship('Read', backref='user', cascade="all, delete")
+
+
+# Define DeletedUser model
+# One row per deleted user, so every process rejects the tokens issued to them before they were deleted
+class DeletedUser(db.Model):
+    user_id = db.Column(db.Integer, primary_key=True)
+    # Unix time the user was deleted, tokens issued at or before it are revoked
+    tokens_revoked_at = db.Column(db.Integer, nullable=False)
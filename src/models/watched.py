@@ -8,4 +8,12 @@ class Watched(db.Model):
     # Define Foreign Keys
     movie_id = db.Column(db.Integer, db.ForeignKey('movie.id'), nullable=False)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
-    
\ No newline at end of file
+    
+    # Define indexes
+    # A movie's ratings are read from (movie_id, rating) alone, and a user's history is listed from (user_id, id) in order
+    __table_args__ = (
+        db.Index("ix_watched_movie_id_rating", "movie_id", "rating"),
+        db.Index("ix_watched_user_id_id", "user_id", "id"),
+        # A user has one review of each movie, which /watched/sync updates in place
+        db.Index("ix_watched_user_id_movie_id", "user_id", "movie_id", unique=True),
+    )
@@ -0,0 +1,132 @@
+import base64
+import binascii
+import json
+from datetime import datetime
+from urllib.parse import urlencode
+from flask import request, abort, current_app
+from sqlalchemy import and_, or_
+from sqlalchemy.orm import undefer
+
+
+# Encode a primary key value as an opaque, url safe cursor
+def encode_cursor(value):
+    return base64.urlsafe_b64encode(str(value).encode("utf-8")).decode("utf-8").rstrip("=")
+
+
+# Decode a cursor created by encode_cursor back into a primary key value
+def decode_cursor(cursor):
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        return int(base64.urlsafe_b64decode(padded.encode("utf-8")).decode("utf-8"))
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        return abort(400, description="Invalid pagination cursor.")
+
+
+# Encode the sort value and primary key of the last row on a page sorted by another column
+def encode_sort_cursor(value, key):
+    if isinstance(value, datetime):
+        value = value.isoformat()
+    return encode_cursor(json.dumps([value, key]))
+
+
+# Decode a cursor created by encode_sort_cursor into the sort value and primary key, as (value, key)
+def decode_sort_cursor(cursor, sort):
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        value, key = json.loads(base64.urlsafe_b64decode(padded.encode("utf-8")).decode("utf-8"))
+        # Sort columns cannot be NULL, see paginate
+        if value is None:
+            raise ValueError("Cursor has no sort value.")
+        if sort.type.python_type is datetime:
+            value = datetime.fromisoformat(value)
+        return value, int(key)
+    except (binascii.Error, UnicodeDecodeError, TypeError, ValueError):
+        return abort(400, description="Invalid pagination cursor.")
+
+
+# Read and validate the limit query string parameter
+def get_limit():
+    default_limit = current_app.config.get("PAGINATION_DEFAULT_LIMIT", 25)
+    max_limit = current_app.config.get("PAGINATION_MAX_LIMIT", 100)
+    limit = request.args.get("limit", default_limit)
+
+    try:
+        limit = int(limit)
+    except (TypeError, ValueError):
+        return abort(400, description="Limit must be a whole number.")
+
+    if limit < 1 or limit > max_limit:
+        return abort(400, description=f"Limit must be between 1 and {max_limit}.")
+
+    return limit
+
+
+# Apply opt-in keyset pagination to a query using ?limit= and ?after=
+# The query is always ordered by, and filtered on, the column passed in (the primary key) so no rows are skipped with OFFSET
+# Returns the rows for the page and a cursor for the next page, or None if this is the last page
+# If sort is given the rows are ordered by that column instead, with the primary key breaking ties
+# The sort column must be NOT NULL, as rows with a NULL sort value would never match the cursor and be skipped
+def paginate(query, column, sort=None, descending=False):
+    if sort is not None:
+        if any(sort_column.nullable for sort_column in sort.property.columns):
+            raise ValueError(f"Cannot paginate by {sort.key}, sort columns must be NOT NULL.")
+        return _paginate_sorted(query, column, sort, descending)
+
+    # Order by the column even without a page, or a query that only loads some columns could be answered from
+    # another index, e.g. ?fields=id,title from the title index, and list the rows in a different order
+    query = query.order_by(column)
+
+    # Return every row, as before, if the client has not asked for a page
+    if "limit" not in request.args and "after" not in request.args:
+        return query.all(), None
+
+    limit = get_limit()
+
+    after = request.args.get("after")
+    if after:
+        query = query.filter(column > decode_cursor(after))
+
+    # Fetch one extra row to find out if there is another page
+    rows = query.limit(limit + 1).all()
+
+    if len(rows) <= limit:
+        return rows, None
+
+    rows = rows[:limit]
+    return rows, encode_cursor(getattr(rows[-1], column.key))
+
+
+def _paginate_sorted(query, column, sort, descending):
+    # The sort column is read for the cursor even when the query only loads the columns a client asked for
+    query = query.options(undefer(sort)).order_by(sort.desc() if descending else sort.asc(), column)
+
+    if "limit" not in request.args and "after" not in request.args:
+        return query.all(), None
+
+    limit = get_limit()
+
+    after = request.args.get("after")
+    if after:
+        value, key = decode_sort_cursor(after, sort)
+        beyond = sort < value if descending else sort > value
+        query = query.filter(or_(beyond, and_(sort == value, column > key)))
+
+    rows = query.limit(limit + 1).all()
+
+    if len(rows) <= limit:
+        return rows, None
+
+    rows = rows[:limit]
+    return rows, encode_sort_cursor(getattr(rows[-1], sort.key), getattr(rows[-1], column.key))
+
+
+# Add the cursor for the next page to a JSON response of the rows on this page
+# The body keeps the same shape as an unpaginated response, the next cursor is returned in the response headers
+def paginated_response(response, next_cursor):
+    if next_cursor:
+        args = request.args.copy()
+        args["after"] = next_cursor
+        response.headers["X-Next-Cursor"] = next_cursor
+        response.headers["Link"] = f'<{request.base_url}?{urlencode(list(args.items(multi=True)))}>; rel="next"'
+
+    return response
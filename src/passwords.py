@@ -0,0 +1,62 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from flask import current_app
+from werkzeug.exceptions import ServiceUnavailable
+from app import bcrypt
+
+
+# Thread pool that runs bcrypt off the request thread, and the slots limiting how many requests can use it at once
+# Both are created the first time a password is hashed in each process
+_pool = None
+_slots = None
+_pid = None
+_lock = threading.Lock()
+
+
+def _get_pool():
+    global _pool, _slots, _pid
+    # Create a new pool after a fork, as the parent's worker threads are not copied
+    if _pid != os.getpid():
+        with _lock:
+            if _pid != os.getpid():
+                workers = current_app.config.get("PASSWORD_HASH_WORKERS", 2)
+                queue = current_app.config.get("PASSWORD_HASH_QUEUE", 16)
+                _pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="bcrypt")
+                _slots = threading.BoundedSemaphore(workers + queue)
+                _pid = os.getpid()
+    return _pool, _slots
+
+
+# Run a bcrypt function in the pool and wait for the result
+# If every worker is busy and the queue is full the request is rejected straight away, rather than tying up the worker
+def _run(func, *args):
+    pool, slots = _get_pool()
+
+    if not slots.acquire(blocking=False):
+        raise ServiceUnavailable(description="The server is busy. Please try again shortly.", retry_after=1)
+
+    try:
+        return pool.submit(func, *args).result()
+    finally:
+        slots.release()
+
+
+# Hash a password with the configured bcrypt work factor
+def hash_password(password):
+    rounds = current_app.config.get("BCRYPT_LOG_ROUNDS", 12)
+    return _run(bcrypt.generate_password_hash, password, rounds).decode("utf-8")
+
+
+# Check a password against a stored hash
+def check_password(password_hash, password):
+    return _run(bcrypt.check_password_hash, password_hash, password)
+
+
+# Return True if a stored hash was created with a different work factor to the one configured
+def needs_rehash(password_hash):
+    try:
+        rounds = int(password_hash.split("$")[2])
+    except (IndexError, ValueError):
+        return True
+    return rounds != current_app.config.get("BCRYPT_LOG_ROUNDS", 12)
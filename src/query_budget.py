@@ -0,0 +1,102 @@
+import threading
+from functools import wraps
+from flask import current_app, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+
+# Statements listed in the message when a budget is exceeded
+MAX_LISTED_STATEMENTS = 20
+
+# Budgets being counted by each thread, innermost last
+_active = threading.local()
+
+
+class QueryBudgetExceeded(RuntimeError):
+    pass
+
+
+class LazyLoadError(RuntimeError):
+    pass
+
+
+# Count the SQL statements run in a block of code and report it if more than limit are run
+# QUERY_BUDGET_MODE decides what happens then: "raise" raises QueryBudgetExceeded, "log" logs a warning
+# and "off" does not count at all. With strict=True (QUERY_BUDGET_STRICT by default) lazy loading a
+# relationship in the block, e.g. Book.author not loaded by the query, raises LazyLoadError straight away.
+# Use it around code in a test, e.g. with QueryBudget(1): client.get("/books/"), or on a route with query_budget
+class QueryBudget(object):
+    def __init__(self, limit, name=None, mode=None, strict=None):
+        self.limit = limit
+        self.name = name or "block"
+        self.mode = mode or current_app.config.get("QUERY_BUDGET_MODE", "log")
+        self.strict = current_app.config.get("QUERY_BUDGET_STRICT", False) if strict is None else strict
+        self.count = 0
+        self.statements = []
+
+    def __enter__(self):
+        if self.mode != "off":
+            _budgets().append(self)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if self.mode == "off":
+            return
+        _budgets().remove(self)
+        if exc_type is None:
+            self.check()
+
+    def record(self, statement):
+        self.count += 1
+        if len(self.statements) < MAX_LISTED_STATEMENTS:
+            self.statements.append(" ".join(statement.split())[:200])
+
+    def check(self):
+        if self.count <= self.limit:
+            return
+
+        message = f"{self.name} ran {self.count} SQL statements, more than its budget of {self.limit}:\n  " + "\n  ".join(self.statements)
+        if self.mode == "raise":
+            raise QueryBudgetExceeded(message)
+        current_app.logger.warning(message)
+
+
+# Decorator to declare the most SQL statements a route should run, e.g. @query_budget(1) for a list
+# that loads its relationships with the main query. Place it below the route's other decorators, so
+# only the statements run by the route itself are counted, and not those of caching or authorization.
+def query_budget(limit):
+    def decorator(func):
+        @wraps(func)
+        def function(*args, **kwargs):
+            name = request.endpoint if has_request_context() else func.__name__
+            with QueryBudget(limit, name):
+                return func(*args, **kwargs)
+        function.query_budget = limit
+        return function
+    return decorator
+
+
+def _budgets():
+    budgets = getattr(_active, "budgets", None)
+    if budgets is None:
+        budgets = _active.budgets = []
+    return budgets
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _count_statement(conn, cursor, statement, parameters, context, executemany):
+    for budget in getattr(_active, "budgets", ()):
+        budget.record(statement)
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _check_lazy_load(orm_execute_state):
+    if not orm_execute_state.is_select or orm_execute_state.lazy_loaded_from is None:
+        return
+    for budget in getattr(_active, "budgets", ()):
+        if budget.strict:
+            raise LazyLoadError(
+                f"{budget.name} lazy loaded {orm_execute_state.loader_strategy_path}, "
+                f"load it with the query instead, e.g. with eager_loading.schema_query"
+            )
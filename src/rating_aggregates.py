@@ -0,0 +1,157 @@
+from app import db
+from sqlalchemy import select, update, delete, insert, case, and_, or_, func
+from sqlalchemy.dialects import postgresql, sqlite
+from models.ratings import BookRating, MovieRating
+from models.read import Read
+from models.watched import Watched
+
+
+# Review column each aggregate is calculated from
+SOURCES = {
+    BookRating: Read.book_id,
+    MovieRating: Watched.movie_id
+}
+
+
+def _key(aggregate):
+    return aggregate.__table__.c[SOURCES[aggregate].key]
+
+
+# Add one rating to the aggregate for an item, creating the aggregate if this is the item's first rating
+def add_rating(aggregate, item_id, rating):
+    add_ratings(aggregate, {item_id: [rating]})
+
+
+# Add ratings to the aggregates of several items at once, given as {item id: [rating, ...]}
+# creating the aggregate of any item rated for the first time
+def add_ratings(aggregate, ratings):
+    table = aggregate.__table__
+    key = _key(aggregate)
+    rows = []
+    for item_id, values in ratings.items():
+        if len(values) == 1:
+            # A single rating is passed to the database as given, so an invalid value is rejected by the database
+            rows.append({key.name: item_id, "rating_count": 1, "rating_sum": values[0], "rating_min": values[0], "rating_max": values[0]})
+        elif values:
+            rows.append({key.name: item_id, "rating_count": len(values), "rating_sum": sum(values), "rating_min": min(values), "rating_max": max(values)})
+    if not rows:
+        return
+
+    dialect = db.session.get_bind().dialect.name
+    if dialect in ("postgresql", "sqlite"):
+        statement = (postgresql.insert(table) if dialect == "postgresql" else sqlite.insert(table)).values(rows)
+        added = statement.excluded
+        statement = statement.on_conflict_do_update(
+            index_elements=[key],
+            set_={
+                "rating_count": table.c.rating_count + added.rating_count,
+                "rating_sum": table.c.rating_sum + added.rating_sum,
+                "rating_min": case((table.c.rating_min <= added.rating_min, table.c.rating_min), else_=added.rating_min),
+                "rating_max": case((table.c.rating_max >= added.rating_max, table.c.rating_max), else_=added.rating_max)
+            }
+        )
+        db.session.execute(statement)
+        return
+
+    # Other databases do not support ON CONFLICT, so update each aggregate and insert it if it does not exist yet
+    for values in rows:
+        result = db.session.execute(
+            update(table).where(key == values[key.name]).values(
+                rating_count=table.c.rating_count + values["rating_count"],
+                rating_sum=table.c.rating_sum + values["rating_sum"],
+                rating_min=case((table.c.rating_min <= values["rating_min"], table.c.rating_min), else_=values["rating_min"]),
+                rating_max=case((table.c.rating_max >= values["rating_max"], table.c.rating_max), else_=values["rating_max"])
+            )
+        )
+        if result.rowcount == 0:
+            db.session.execute(insert(table).values(values))
+
+
+# Remove one rating from the aggregate for an item
+# The review must already be deleted or changed in the session, as the minimum and maximum are
+# recalculated from the review table when the rating removed was the lowest or highest
+def remove_rating(aggregate, item_id, rating):
+    table = aggregate.__table__
+    key = _key(aggregate)
+    source = SOURCES[aggregate]
+    source_rating = source.class_.rating
+
+    db.session.flush()
+    db.session.execute(
+        update(table).where(key == item_id).values(
+            rating_count=table.c.rating_count - 1,
+            rating_sum=table.c.rating_sum - rating
+        )
+    )
+    db.session.execute(
+        update(table).where(key == item_id, or_(table.c.rating_min == rating, table.c.rating_max == rating)).values(
+            rating_min=select(func.min(source_rating)).where(source == item_id).scalar_subquery(),
+            rating_max=select(func.max(source_rating)).where(source == item_id).scalar_subquery()
+        )
+    )
+
+
+# Replace one rating in the aggregate for an item with a new rating
+def change_rating(aggregate, item_id, old_rating, new_rating):
+    if old_rating == new_rating:
+        return
+    remove_rating(aggregate, item_id, old_rating)
+    add_rating(aggregate, item_id, new_rating)
+
+
+# Recalculate the aggregates for the items given from the review table
+def refresh_ratings(aggregate, item_ids):
+    item_ids = set(item_ids)
+    if not item_ids:
+        return
+
+    table = aggregate.__table__
+    key = _key(aggregate)
+    source = SOURCES[aggregate]
+
+    db.session.flush()
+    db.session.execute(delete(table).where(key.in_(item_ids)))
+    db.session.execute(insert(table).from_select(
+        [key.name, "rating_count", "rating_sum", "rating_min", "rating_max"],
+        _aggregate_select(source).where(source.in_(item_ids))
+    ))
+
+
+# Rebuild every aggregate from the review table, committing one chunk of items at a time
+# Returns the number of items with at least one rating
+def rebuild_ratings(aggregate, chunk_size=1000):
+    table = aggregate.__table__
+    key = _key(aggregate)
+    source = SOURCES[aggregate]
+    last_id = 0
+    total = 0
+
+    while True:
+        # Find the next chunk of reviewed items by keyset on the item id
+        item_ids = db.session.execute(
+            select(source).where(source > last_id).distinct().order_by(source).limit(chunk_size)
+        ).scalars().all()
+
+        # Aggregates past the last reviewed item are stale and are removed with the final chunk
+        in_chunk = key > last_id
+        if item_ids:
+            in_chunk = and_(in_chunk, key <= item_ids[-1])
+        db.session.execute(delete(table).where(in_chunk))
+
+        if item_ids:
+            db.session.execute(insert(table).from_select(
+                [key.name, "rating_count", "rating_sum", "rating_min", "rating_max"],
+                _aggregate_select(source).where(source > last_id, source <= item_ids[-1])
+            ))
+        db.session.commit()
+
+        if not item_ids:
+            return total
+
+        total += len(item_ids)
+        last_id = item_ids[-1]
+
+
+def _aggregate_select(source):
+    rating = source.class_.rating
+    return select(source, func.count(), func.sum(rating), func.min(rating), func.max(rating)).group_by(source)
@@ -0,0 +1,238 @@
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from flask import request
+from flask.json.provider import DefaultJSONProvider
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+
+# Upper bounds of the histogram buckets for durations in seconds, and for SQL statements per request
+DURATION_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+STATEMENT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+# Timings of the request being served by each thread
+_current = threading.local()
+
+
+# Time spent on the request being served, filled in by the request hooks and engine events below
+class RequestTimings(object):
+    __slots__ = ("start", "sql_count", "sql_time", "sql_start", "serialization_time", "serializing")
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.sql_count = 0
+        self.sql_time = 0.0
+        self.sql_start = None
+        self.serialization_time = 0.0
+        self.serializing = False
+
+
+# Histogram in the Prometheus format, with one series for each set of label values
+# Each observation adds to a single bucket, the cumulative counts are worked out when the metrics are read
+class Histogram(object):
+    def __init__(self, name, description, label_names, buckets):
+        self.name = name
+        self.description = description
+        self.label_names = label_names
+        self.buckets = buckets
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, labels, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = [(labels, list(counts), total) for labels, (counts, total) in self._series.items()]
+
+        for labels, counts, total in sorted(series):
+            label_text = _labels(self.label_names, labels)
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), counts):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{{label_text},le="{bound}"}} {cumulative}')
+            lines.append(f"{self.name}_sum{{{label_text}}} {total}")
+            lines.append(f"{self.name}_count{{{label_text}}} {cumulative}")
+        return lines
+
+
+# Counter in the Prometheus format, with one series for each set of label values
+class Counter(object):
+    def __init__(self, name, description, label_names):
+        self.name = name
+        self.description = description
+        self.label_names = label_names
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def inc(self, labels):
+        with self._lock:
+            self._series[labels] = self._series.get(labels, 0) + 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            series = sorted(self._series.items())
+        for labels, value in series:
+            lines.append(f"{self.name}{{{_labels(self.label_names, labels)}}} {value}")
+        return lines
+
+
+# JSON provider that adds the time jsonify spends encoding to the request's serialization time
+class TimedJSONProvider(DefaultJSONProvider):
+    def response(self, *args, **kwargs):
+        with serialization_timer():
+            return super().response(*args, **kwargs)
+
+
+# Per-request performance instrumentation
+# Records the wall time, number of SQL statements, time spent in SQL and time spent serializing of every request.
+# They are returned in a Server-Timing header, and added to histograms for each blueprint and endpoint that are
+# served in the Prometheus text format by /metrics. Metrics are held per process.
+class RequestMetrics(object):
+    def __init__(self, app=None):
+        label_names = ("blueprint", "endpoint")
+        self.requests = Counter("http_requests_total", "Requests served.", ("blueprint", "endpoint", "method", "status"))
+        self.duration = Histogram("http_request_duration_seconds", "Wall time to serve a request.", label_names, DURATION_BUCKETS)
+        self.sql_statements = Histogram("http_request_sql_statements", "SQL statements run by a request.", label_names, STATEMENT_BUCKETS)
+        self.sql_duration = Histogram("http_request_sql_duration_seconds", "Time spent running SQL statements in a request.", label_names, DURATION_BUCKETS)
+        self.serialization_duration = Histogram("http_request_serialization_duration_seconds", "Time spent serializing a response.", label_names, DURATION_BUCKETS)
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        if not app.config.get("METRICS_ENABLED", True):
+            return
+
+        if type(app.json) is DefaultJSONProvider:
+            app.json = TimedJSONProvider(app)
+
+        if not event.contains(Engine, "before_cursor_execute", _before_cursor_execute):
+            event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+            event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
+
+        app.before_request(self._start)
+        app.after_request(self._finish)
+        app.teardown_request(self._teardown)
+
+    def _start(self):
+        _current.timings = RequestTimings()
+
+    def _finish(self, response):
+        timings = getattr(_current, "timings", None)
+        if timings is None:
+            return response
+
+        duration = time.perf_counter() - timings.start
+        response.headers["Server-Timing"] = (
+            f'db;dur={timings.sql_time * 1000:.2f};desc="SQL statements: {timings.sql_count}", '
+            f"serialize;dur={timings.serialization_time * 1000:.2f}, "
+            f"total;dur={duration * 1000:.2f}"
+        )
+
+        # Requests that did not match a route are counted together, rather than by path
+        labels = (request.blueprint or "", request.endpoint or "unmatched")
+        self.requests.inc(labels + (request.method, str(response.status_code)))
+        self.duration.observe(labels, duration)
+        self.sql_statements.observe(labels, timings.sql_count)
+        self.sql_duration.observe(labels, timings.sql_time)
+        self.serialization_duration.observe(labels, timings.serialization_time)
+        return response
+
+    def _teardown(self, error=None):
+        _current.timings = None
+
+    # Return every metric in the Prometheus text format, followed by any extra lines given
+    def render(self, extra_lines=()):
+        lines = []
+        for metric in (self.requests, self.duration, self.sql_statements, self.sql_duration, self.serialization_duration):
+            lines.extend(metric.render())
+        lines.extend(extra_lines)
+        return "\n".join(lines) + "\n"
+
+
+# Add the time spent in the block to the serialization time of the current request
+# Blocks nested inside another, e.g. jsonify called by a serializer, are only counted once
+@contextmanager
+def serialization_timer():
+    timings = getattr(_current, "timings", None)
+    if timings is None or timings.serializing:
+        yield
+        return
+
+    timings.serializing = True
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.serialization_time += time.perf_counter() - start
+        timings.serializing = False
+
+
+# Return the connection pool status given by pool_monitor.pool_status as Prometheus gauges and counters
+def pool_metric_lines(status):
+    metrics = [
+        ("db_pool_size", "gauge", "Connections kept open by the pool.", "size"),
+        ("db_pool_checked_out", "gauge", "Connections in use.", "checked_out"),
+        ("db_pool_checked_in", "gauge", "Connections open and waiting to be used.", "checked_in"),
+        ("db_pool_overflow", "gauge", "Connections open beyond the pool size.", "overflow"),
+        ("db_pool_checkouts_total", "counter", "Connections taken from the pool.", "checkouts"),
+        ("db_pool_timeouts_total", "counter", "Requests that timed out waiting for a connection.", "timeouts"),
+        ("db_pool_wait_seconds_total", "counter", "Time spent waiting for a connection.", "wait_seconds_total")
+    ]
+    lines = []
+    for name, kind, description, key in metrics:
+        if key in status:
+            lines.extend([f"# HELP {name} {description}", f"# TYPE {name} {kind}", f"{name} {status[key]}"])
+    return lines
+
+
+# Return the state of the admission control bulkheads given by AdmissionControl.status as Prometheus gauges and counters
+def admission_metric_lines(status):
+    metrics = [
+        ("admission_limit", "gauge", "Requests of a class that can be served at once.", "limit"),
+        ("admission_queue_limit", "gauge", "Requests of a class that can wait to be served.", "queue"),
+        ("admission_active", "gauge", "Requests of a class being served.", "active"),
+        ("admission_waiting", "gauge", "Requests of a class waiting to be served.", "waiting"),
+        ("admission_admitted_total", "counter", "Requests of a class admitted.", "admitted"),
+        ("admission_rejected_total", "counter", "Requests of a class rejected as the queue was full.", "rejected"),
+        ("admission_timed_out_total", "counter", "Requests of a class rejected after waiting too long.", "timed_out")
+    ]
+    lines = []
+    for name, kind, description, key in metrics:
+        if status:
+            lines.extend([f"# HELP {name} {description}", f"# TYPE {name} {kind}"])
+        for bulkhead, values in sorted(status.items()):
+            lines.append(f"{name}{{{_labels(('class',), (bulkhead,))}}} {values[key]}")
+    return lines
+
+
+def _labels(names, values):
+    return ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values))
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    timings = getattr(_current, "timings", None)
+    if timings is not None:
+        timings.sql_start = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    timings = getattr(_current, "timings", None)
+    if timings is not None and timings.sql_start is not None:
+        timings.sql_count += 1
+        timings.sql_time += time.perf_counter() - timings.sql_start
+        timings.sql_start = None
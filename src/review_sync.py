@@ -0,0 +1,129 @@
+from flask import abort, current_app
+from sqlalchemy import select, update, insert
+from sqlalchemy.dialects import postgresql, sqlite
+from app import db
+from autocomplete import autocomplete
+from bulk import read_rows
+from models.books import Book
+from models.movies import Movie
+from models.ratings import BookRating, MovieRating
+from models.read import Read
+from models.watched import Watched
+from rating_aggregates import SOURCES, add_ratings, refresh_ratings
+
+
+# Rating aggregate, reviewed model and autocomplete entity of each review table
+REVIEWS = {
+    Read: (BookRating, Book, "book"),
+    Watched: (MovieRating, Movie, "movie")
+}
+
+# Ratings a review can have
+MIN_RATING = 1
+MAX_RATING = 10
+
+
+# Set a user's rating of many books or movies at once, adding a review for each item they have not reviewed yet
+# The request body is a JSON array (or NDJSON) of {"<item key>": id, "rating": rating}, the last rating given
+# for an item is used. The reviews are written with INSERT ... ON CONFLICT (user_id, <item key>), and whether each
+# was created or updated is taken from the rows the statements return, so a review added by a concurrent sync is
+# never counted twice. The rating aggregates of the items changed are updated in the same transaction.
+# Returns the ids of the items created, updated and unchanged, and an error for each row that could not be used
+def sync_reviews(model, user_id):
+    aggregate, item, entity = REVIEWS[model]
+    key = SOURCES[aggregate]
+    ratings, errors = _validate(key.key)
+
+    # Items that do not exist are reported rather than failing the whole statement
+    found = set(db.session.execute(select(item.id).where(item.id.in_(ratings))).scalars()) if ratings else set()
+    for item_id in [item_id for item_id in ratings if item_id not in found]:
+        errors.append({"row": ratings.pop(item_id)[0], "error": f"No {entity} with {key.key} {item_id}."})
+
+    rows = [{"user_id": user_id, key.key: item_id, "rating": rating} for item_id, (row, rating) in ratings.items()]
+    inserted, changed = _upsert(model, key, rows) if rows else (set(), set())
+    created = [item_id for item_id in ratings if item_id in inserted]
+    updated = [item_id for item_id in ratings if item_id in changed]
+    unchanged = [item_id for item_id in ratings if item_id not in inserted and item_id not in changed]
+
+    add_ratings(aggregate, {item_id: [ratings[item_id][1]] for item_id in created})
+    refresh_ratings(aggregate, updated)
+    db.session.commit()
+
+    for item_id in created:
+        autocomplete.add_reviews(entity, item_id, 1)
+
+    errors.sort(key=lambda error: error["row"])
+    return {"created": created, "updated": updated, "unchanged": unchanged, "errors": errors}
+
+
+# Read the ratings from the request body as {item id: (row, rating)}, and an error for each invalid row
+def _validate(key):
+    max_items = current_app.config.get("SYNC_MAX_ITEMS", 1000)
+    ratings = {}
+    errors = []
+
+    for row, data in read_rows():
+        if row >= max_items:
+            return abort(400, description=f"No more than {max_items} ratings can be synced at once.")
+        if isinstance(data, Exception) or not isinstance(data, dict):
+            errors.append({"row": row, "error": "Invalid JSON."})
+            continue
+
+        item_id = data.get(key)
+        rating = data.get("rating")
+        if not _is_integer(item_id):
+            errors.append({"row": row, "error": f"{key} must be a whole number."})
+        elif not _is_integer(rating) or not MIN_RATING <= rating <= MAX_RATING:
+            errors.append({"row": row, "error": f"rating must be a whole number from {MIN_RATING} to {MAX_RATING}."})
+        else:
+            ratings.pop(item_id, None)
+            ratings[item_id] = (row, rating)
+
+    return ratings, errors
+
+
+def _is_integer(value):
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+# Insert the reviews, or replace the rating of those the user already has where it differs
+# Returns the ids of the items whose review was inserted, and of those whose rating was changed
+def _upsert(model, key, rows):
+    table = model.__table__
+    dialect = db.session.get_bind().dialect.name
+    if dialect in ("postgresql", "sqlite"):
+        insert_rows = postgresql.insert if dialect == "postgresql" else sqlite.insert
+
+        # Only the reviews this statement inserts are returned, one added by a concurrent sync is a conflict
+        statement = insert_rows(table).values(rows).on_conflict_do_nothing(index_elements=[table.c.user_id, table.c[key.key]])
+        inserted = set(db.session.execute(statement.returning(table.c[key.key])).scalars())
+
+        # Only the reviews whose rating is changed are returned. Their aggregates are recalculated, so they are
+        # still right if a review was deleted in the meantime and is inserted again here
+        rows = [row for row in rows if row[key.key] not in inserted]
+        if not rows:
+            return inserted, set()
+        statement = insert_rows(table).values(rows)
+        statement = statement.on_conflict_do_update(
+            index_elements=[table.c.user_id, table.c[key.key]],
+            set_={"rating": statement.excluded.rating},
+            where=table.c.rating != statement.excluded.rating
+        )
+        return inserted, set(db.session.execute(statement.returning(table.c[key.key])).scalars())
+
+    # Other databases do not support ON CONFLICT, so update each review and insert it if it does not exist yet
+    inserted = set()
+    changed = set()
+    for row in rows:
+        result = db.session.execute(
+            update(table).where(table.c.user_id == row["user_id"], table.c[key.key] == row[key.key], table.c.rating != row["rating"])
+            .values(rating=row["rating"])
+        )
+        if result.rowcount:
+            changed.add(row[key.key])
+        elif db.session.execute(
+            select(table.c.id).where(table.c.user_id == row["user_id"], table.c[key.key] == row[key.key])
+        ).first() is None:
+            db.session.execute(insert(table).values(row))
+            inserted.add(row[key.key])
+    return inserted, changed
@@ -16,6 +16,9 @@ class BookSchema(ma.Schema):
     publisher = ma.Nested("PublisherSchema", only=["publisher_name"])
     # Format date
     first_publication_date = fields.DateTime(format='%d-%m-%Y')
+    # Number of pages and copies, given as a number or a string of digits
+    length = fields.Integer()
+    copies_published = fields.Integer()
 
 
 book_schema = BookSchema()
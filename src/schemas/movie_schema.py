@@ -17,6 +17,8 @@ class MovieSchema(ma.Schema):
     book = ma.Nested("BookSchema", only=("title", ))
     # Format date
     release_date = fields.DateTime(format='%d-%m-%Y')
+    # Length in minutes, given as a number or a string of digits
+    length = fields.Integer()
 
 
 movie_schema = MovieSchema()
@@ -0,0 +1,73 @@
+from datetime import datetime
+from flask import request, abort
+from pagination import paginate
+
+
+# Query string parameters used for sorting, pagination and choosing fields rather than filtering
+RESERVED_PARAMETERS = ("sort", "limit", "after", "fields")
+
+
+# Parse a date in the same format the API returns dates in, e.g. 05-04-1974
+def parse_date(value):
+    return datetime.strptime(value, "%d-%m-%Y")
+
+
+# Filter on a column matching the value given, or any of the values if the parameter is repeated
+def equals(column, parse=str):
+    def apply(query, values):
+        values = [parse(value) for value in values]
+        if len(values) == 1:
+            return query.filter(column == values[0])
+        return query.filter(column.in_(values))
+    return apply
+
+
+# Filter on a column being greater than or equal to the value given
+def at_least(column, parse=int):
+    def apply(query, values):
+        return query.filter(column >= parse(values[-1]))
+    return apply
+
+
+# Filter on a column being less than or equal to the value given
+def at_most(column, parse=int):
+    def apply(query, values):
+        return query.filter(column <= parse(values[-1]))
+    return apply
+
+
+# Read the ?sort= parameter, e.g. ?sort=title or ?sort=-length for descending order
+# Returns the column to sort by and whether it is descending, or (None, False) to keep the default order
+def get_sort(sorts):
+    sort = request.args.get("sort")
+    if not sort:
+        return None, False
+
+    descending = sort.startswith("-")
+    column = sorts.get(sort.lstrip("-"))
+    if column is None:
+        return abort(400, description=f"Invalid sort. Sort by one of: {', '.join(sorts)}.")
+    return column, descending
+
+
+# Apply every filter given in the query string to the query, then sort and paginate it
+# filters maps each query string parameter to a filter built with equals, at_least or at_most, and sorts
+# maps the names that can be given to ?sort= to their columns. All the filters are combined into one query,
+# and a parameter that is not a filter, sort or pagination parameter is rejected rather than ignored.
+# Returns the rows for the page and a cursor for the next page, as paginate does
+def search(query, column, filters, sorts):
+    unknown = sorted(set(name for name in request.args if name not in filters and name not in RESERVED_PARAMETERS))
+    if unknown:
+        return abort(400, description=f"Unknown query parameter(s): {', '.join(unknown)}.")
+
+    for name, apply in filters.items():
+        values = [value for value in request.args.getlist(name) if value != ""]
+        if not values:
+            continue
+        try:
+            query = apply(query, values)
+        except ValueError:
+            return abort(400, description=f"Invalid value for {name} in query string.")
+
+    sort, descending = get_sort(sorts)
+    return paginate(query, column, sort, descending)
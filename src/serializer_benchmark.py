@@ -0,0 +1,95 @@
+# Benchmark the compiled serializers against marshmallow.
+#
+# Loads rows from a local database and times turning them into a JSON response body, once with
+# schema.dump followed by jsonify, as the list endpoints used to, and once with the compiled serializers
+# in serializers.py. Checks the two bodies are byte for byte the same before timing them.
+#
+# Run from the src directory, e.g.
+#
+#     python serializer_benchmark.py --scale 1 --rows 1000
+#     python serializer_benchmark.py --no-seed --database-url sqlite:///benchmark.db
+#
+# The database given with --database-url is dropped and re-created unless --no-seed is used, so never
+# point it at a database holding real data.
+import argparse
+import os
+import sys
+import time
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark the compiled serializers against marshmallow.")
+    parser.add_argument("--database-url", default="sqlite:///benchmark.db", help="Local database to benchmark against.")
+    parser.add_argument("--scale", type=int, default=1, help="Scale of the synthetic data set, see flask db seed --scale.")
+    parser.add_argument("--no-seed", action="store_true", help="Use the data already in the database.")
+    parser.add_argument("--rows", type=int, default=1000, help="Rows in each response.")
+    parser.add_argument("--repeat", type=int, default=20, help="Number of times each response is serialized.")
+    parser.add_argument("--seed", type=int, default=1, help="Random seed for the data set.")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+
+    # The app reads its configuration from the environment when it is imported
+    os.environ["DATABASE_URL"] = args.database_url
+    os.environ.setdefault("FLASK_ENV", "testing")
+    os.environ.setdefault("SECRET_KEY", "benchmark")
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+    from flask import jsonify
+    from app import create_app, db
+    from eager_loading import schema_query
+    from models.books import Book, Author
+    from models.movies import Movie
+    from models.read import Read
+    from models.watched import Watched
+    from schemas.book_schema import books_schema
+    from schemas.movie_schema import movies_schema
+    from schemas.read_schema import reads_schema
+    from schemas.watched_schema import watched_schema
+    from schemas.author_schema import authors_schema
+    from serializers import schema_response, orjson
+    from synthetic_data import generate
+
+    app = create_app()
+    cases = [
+        ("books", books_schema, Book),
+        ("movies", movies_schema, Movie),
+        ("read", reads_schema, Read),
+        ("watched", watched_schema, Watched),
+        ("authors", authors_schema, Author)
+    ]
+
+    with app.app_context():
+        if not args.no_seed:
+            db.drop_all()
+            db.create_all()
+            print(f"Seeding the database at scale {args.scale}...")
+            for table, rows, seconds in generate(args.scale, args.seed):
+                print(f"  {table}: {rows:,} rows in {seconds:.2f}s")
+
+        print(f"\nJSON encoder: {'orjson' if orjson else 'json (install orjson for faster encoding)'}\n")
+        print(f"{'schema':<10}{'rows':>7}{'marshmallow ms':>16}{'compiled ms':>13}{'speedup':>9}")
+
+        for name, schema, model in cases:
+            rows = schema_query(schema, model).limit(args.rows).all()
+
+            with app.test_request_context():
+                if jsonify(schema.dump(rows)).get_data() != schema_response(schema, rows).get_data():
+                    raise SystemExit(f"The compiled {name} response differs from marshmallow's")
+
+                timings = []
+                for serialize in (lambda: jsonify(schema.dump(rows)), lambda: schema_response(schema, rows)):
+                    start = time.perf_counter()
+                    for _ in range(args.repeat):
+                        serialize().get_data()
+                    timings.append((time.perf_counter() - start) / args.repeat * 1000)
+
+            marshmallow_ms, compiled_ms = timings
+            print(f"{name:<10}{len(rows):>7}{marshmallow_ms:>16.2f}{compiled_ms:>13.2f}{marshmallow_ms / compiled_ms:>8.1f}x")
+    print()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,231 @@
+import json
+import keyword
+import re
+from flask import current_app, jsonify
+from flask.json.provider import DefaultJSONProvider
+from marshmallow import Schema, fields
+from sqlalchemy import inspect
+from sqlalchemy.orm import ColumnProperty, RelationshipProperty
+from request_metrics import serialization_timer
+
+# orjson is optional, responses are encoded with the standard json module when it is not installed
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+# Schemas already compiled, keyed like the loader options in eager_loading.py so each is only walked once
+_compiled = {}
+
+# Values an inferred field dumps unchanged
+_PLAIN = (str, int, bool, type(None))
+
+# Largest number of formatted dates remembered for each DateTime field
+_MAX_CACHED_DATES = 10000
+
+# Characters the standard json module escapes as \uXXXX when ensure_ascii is on, but orjson writes unescaped
+_NON_ASCII = re.compile(rb"[\x7f-\xff]+")
+
+
+# Dump objects the same way a marshmallow schema does, with a function compiled for the schema
+# Each schema is turned into one function per model that builds the dict for a row in a single expression,
+# instead of marshmallow walking the field objects and nested schemas for every row. The dicts have the same
+# keys, order and values as schema.dump, e.g. dates in the format given to the DateTime field.
+class CompiledSchema(object):
+    def __init__(self, schema):
+        self.schema = schema
+        # Row function and whether it can return floats, for each model class dumped
+        self._rows = {}
+
+    def __call__(self, obj):
+        try:
+            row = self._rows[obj.__class__][0]
+        except KeyError:
+            row = self.compile(obj.__class__)[0]
+        return row(obj)
+
+    def dump(self, data):
+        if self.schema.many:
+            return [self(obj) for obj in data]
+        return self(data)
+
+    # Whether any row dumped so far may hold a float, which orjson writes differently to the json module
+    @property
+    def may_float(self):
+        return any(may_float for row, may_float in self._rows.values())
+
+    # Build the row function for a class, returns (function, may_float)
+    def compile(self, cls):
+        if cls not in self._rows:
+            self._rows[cls] = _compile_rows(self.schema, cls)
+        return self._rows[cls]
+
+
+# Return the compiled version of a schema
+def compiled(schema):
+    key = (type(schema), tuple(schema.dump_fields), schema.many)
+
+    if key not in _compiled:
+        _compiled[key] = CompiledSchema(schema)
+
+    return _compiled[key]
+
+
+# Dump data with the compiled version of a schema, returns the same value as schema.dump(data)
+def dump(schema, data):
+    return compiled(schema).dump(data)
+
+
+# Return data dumped with a schema as a JSON response, byte for byte the same as jsonify(schema.dump(data))
+# The body is encoded with orjson when it is installed and the app uses Flask's compact JSON output,
+# otherwise jsonify is used
+def schema_response(schema, data):
+    with serialization_timer():
+        compiled_schema = compiled(schema)
+        result = compiled_schema.dump(data)
+
+        app = current_app
+        if orjson is None or compiled_schema.may_float or not _compact_output(app):
+            return jsonify(result)
+
+        body = _orjson_dumps(result, app)
+        if body is None:
+            return jsonify(result)
+
+        return app.response_class(body + b"\n", mimetype=app.config["JSONIFY_MIMETYPE"] or app.json.mimetype)
+
+
+# Encode a value as compact JSON bytes, as jsonify does without debug mode
+# Uses orjson when it is installed, which writes some floats differently e.g. 1e16 rather than 1e+16
+def encode(value):
+    app = current_app
+    if orjson is not None:
+        body = _orjson_dumps(value, app)
+        if body is not None:
+            return body
+    return app.json.dumps(value, separators=(",", ":")).encode("utf-8")
+
+
+# Encode a value with orjson, escaping characters as the app's JSON provider does
+# Returns None if orjson cannot encode the value, e.g. an integer too large for it
+def _orjson_dumps(value, app):
+    try:
+        body = orjson.dumps(value, default=app.json.default, option=orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS)
+    except orjson.JSONEncodeError:
+        return None
+
+    if _ensure_ascii(app):
+        body = _NON_ASCII.sub(lambda match: json.dumps(match.group().decode("utf-8"))[1:-1].encode("ascii"), body)
+    return body
+
+
+# Whether jsonify writes compact, unsorted JSON, the only output written with orjson
+def _compact_output(app):
+    # Providers that only time responses, such as request_metrics.TimedJSONProvider, write the same JSON
+    if (not isinstance(app.json, DefaultJSONProvider) or type(app.json).dumps is not DefaultJSONProvider.dumps
+            or getattr(app, "_json_encoder", None) is not None):
+        return False
+
+    sort_keys = app.config["JSON_SORT_KEYS"]
+    if sort_keys is None:
+        sort_keys = app.json.sort_keys
+
+    pretty = app.config["JSONIFY_PRETTYPRINT_REGULAR"]
+    compact = app.json.compact if pretty is None else not pretty
+
+    return not sort_keys and not ((compact is None and app.debug) or compact is False)
+
+
+def _ensure_ascii(app):
+    ensure_ascii = app.config["JSON_AS_ASCII"]
+    return app.json.ensure_ascii if ensure_ascii is None else ensure_ascii
+
+
+def _compile_rows(schema, cls):
+    # Schemas that change how rows are dumped, and objects that are not plain models, are left to marshmallow
+    if (schema._has_processors("pre_dump") or schema._has_processors("post_dump")
+            or type(schema).get_attribute is not Schema.get_attribute or hasattr(cls, "__getitem__")):
+        return _marshmallow_rows(schema)
+
+    mapper = inspect(cls, raiseerr=False)
+
+    names = {}
+    entries = []
+    may_float = False
+
+    for index, (name, field) in enumerate(schema.dump_fields.items()):
+        attribute = field.attribute or name
+        key = field.data_key if field.data_key is not None else name
+        if not attribute.isidentifier() or keyword.iskeyword(attribute) or not hasattr(cls, attribute):
+            return _marshmallow_rows(schema)
+
+        field_name = f"_field{index}"
+        names[field_name] = field
+        value = f"(_value := obj.{attribute})"
+        kind = type(field)
+
+        if kind is fields.Nested:
+            nested = compiled(field.schema)
+            names[f"_nested{index}"] = nested
+            target = _relationship_class(mapper, attribute)
+            may_float = may_float or target is None or nested.compile(target)[1]
+            if field.schema.many or field.many:
+                expression = f"None if {value} is None else [_nested{index}(item) for item in _value]"
+            else:
+                expression = f"None if {value} is None else _nested{index}(_value)"
+        elif kind is fields.Inferred:
+            may_float = may_float or _column_type(mapper, attribute) in (None, float)
+            expression = f"_value if {value}.__class__ in _PLAIN else {field_name}._serialize(_value, {name!r}, obj)"
+        elif kind is fields.Integer and not field.as_string:
+            expression = f"None if {value} is None else int(_value)"
+        elif kind is fields.String:
+            expression = f"_value if {value}.__class__ is str or _value is None else {field_name}._serialize(_value, {name!r}, obj)"
+        elif kind is fields.DateTime and (field.format or field.DEFAULT_FORMAT) not in field.SERIALIZATION_FUNCS:
+            names[f"_format{index}"] = field.format or field.DEFAULT_FORMAT
+            names[f"_dates{index}"] = {}
+            expression = f"None if {value} is None else (_dates{index}.get(_value) or _strftime(_dates{index}, _value, _format{index}))"
+        else:
+            may_float = True
+            expression = f"{field_name}.serialize({name!r}, obj, _get_attribute)"
+
+        entries.append(f"{key!r}: ({expression})")
+
+    source = "def row(obj):\n    return {" + ", ".join(entries) + "}\n"
+    namespace = dict(names, _PLAIN=_PLAIN, _strftime=_strftime, _get_attribute=schema.get_attribute)
+    exec(compile(source, f"<compiled {type(schema).__name__}>", "exec"), namespace)
+    return namespace["row"], may_float
+
+
+# Format a date with strftime, remembering the text as the same dates come up in many rows and strftime is slow
+# Dates with a timezone are not remembered, as dates in different timezones can be equal but format differently
+def _strftime(dates, value, format):
+    text = value.strftime(format)
+    if getattr(value, "tzinfo", None) is None:
+        if len(dates) >= _MAX_CACHED_DATES:
+            dates.clear()
+        dates[value] = text
+    return text
+
+
+def _marshmallow_rows(schema):
+    return (lambda obj: schema.dump(obj, many=False)), True
+
+
+# Return the class a relationship of a model loads, or None if the attribute is not a relationship
+def _relationship_class(mapper, attribute):
+    prop = mapper.attrs.get(attribute) if mapper is not None else None
+    if isinstance(prop, RelationshipProperty):
+        return prop.mapper.class_
+    return None
+
+
+# Return the Python type of a model's column, or None if it is not a column or the type is not known
+def _column_type(mapper, attribute):
+    prop = mapper.attrs.get(attribute) if mapper is not None else None
+    if not isinstance(prop, ColumnProperty) or len(prop.columns) != 1:
+        return None
+    try:
+        return prop.columns[0].type.python_type
+    except NotImplementedError:
+        return None
@@ -0,0 +1,229 @@
+import json
+import logging
+import queue
+import re
+import threading
+import time
+from datetime import datetime, timezone
+from logging.handlers import RotatingFileHandler
+from flask import has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+
+# Largest number of distinct statements kept for /admin/slow-queries, the least run are dropped after that
+MAX_STATEMENTS = 500
+
+# Statements that can be explained without running them
+EXPLAINABLE = ("select", "with", "insert", "update", "delete")
+
+# Thread running the EXPLAINs, its own statements are not timed
+_explaining = threading.local()
+
+
+# Return a statement with its values replaced by ?, so runs with different values are grouped together
+# e.g. "SELECT * FROM book WHERE id IN (%(id_1_1)s, %(id_1_2)s)" becomes "SELECT * FROM book WHERE id IN (?)"
+def normalize_statement(statement):
+    statement = re.sub(r"'(?:[^']|'')*'", "?", statement)
+    statement = re.sub(r"%\(\w+\)s|%s|\$\d+|(?<![:\w]):\w+|\b\d+(?:\.\d+)?\b", "?", statement)
+    statement = re.sub(r"\(\s*\?(?:\s*,\s*\?)+\s*\)", "(?)", statement)
+    return " ".join(statement.split())
+
+
+# Statistics for one normalized statement
+class SlowStatement(object):
+    def __init__(self, statement):
+        self.statement = statement
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.endpoints = {}
+        self.parameters = None
+        self.last_seen = None
+        self.plan = None
+        self.explained_at = None
+
+    def to_dict(self):
+        return {
+            "statement": self.statement,
+            "count": self.count,
+            "total_ms": round(self.total * 1000, 2),
+            "mean_ms": round(self.total / self.count * 1000, 2),
+            "max_ms": round(self.max * 1000, 2),
+            "endpoints": self.endpoints,
+            "last_parameters": self.parameters,
+            "last_seen": self.last_seen,
+            "plan": self.plan
+        }
+
+
+# Log of SQL statements slower than SLOW_QUERY_THRESHOLD_MS
+# Each slow statement is written to a rotating log file (SLOW_QUERY_LOG_FILE, if set) as a line of JSON, with
+# the endpoint that ran it and its query plan, and added to per process statistics grouped by normalized
+# statement for /admin/slow-queries. Its parameters are only kept with SLOW_QUERY_LOG_PARAMETERS, as they can
+# hold emails, password hashes and other personal data. The plan is captured with EXPLAIN, without running the
+# statement again, on a background thread so the request is not slowed down further. Each statement is
+# explained at most once every SLOW_QUERY_EXPLAIN_INTERVAL seconds.
+class SlowQueryLog(object):
+    def __init__(self, app=None):
+        self.threshold = None
+        self.explain_interval = 300
+        self.log_parameters = False
+        self.statements = {}
+        self.logger = logging.getLogger("slow_queries")
+        self.logger.propagate = False
+        self.handler = None
+        self._lock = threading.Lock()
+        self._queue = queue.Queue(maxsize=100)
+        self._worker = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        threshold = app.config.get("SLOW_QUERY_THRESHOLD_MS", 500)
+        if threshold is None or threshold < 0:
+            self.threshold = None
+            return
+
+        self.threshold = threshold / 1000
+        self.explain_interval = app.config.get("SLOW_QUERY_EXPLAIN_INTERVAL", 300)
+        self.log_parameters = app.config.get("SLOW_QUERY_LOG_PARAMETERS", False)
+
+        # The file is only created once a slow statement is written to it, not by every CLI command
+        path = app.config.get("SLOW_QUERY_LOG_FILE")
+        if path and self.handler is None:
+            self.handler = RotatingFileHandler(
+                path, maxBytes=app.config.get("SLOW_QUERY_LOG_MAX_BYTES", 10 * 1024 * 1024),
+                backupCount=app.config.get("SLOW_QUERY_LOG_BACKUPS", 5), delay=True
+            )
+            self.handler.setFormatter(logging.Formatter("%(message)s"))
+            self.logger.addHandler(self.handler)
+            self.logger.setLevel(logging.INFO)
+
+        if not event.contains(Engine, "before_cursor_execute", self._before_cursor_execute):
+            event.listen(Engine, "before_cursor_execute", self._before_cursor_execute)
+            event.listen(Engine, "after_cursor_execute", self._after_cursor_execute)
+
+    # Return the slowest statements, by total time (or "count", "max_ms" or "mean_ms"), most costly first
+    def top(self, limit=20, sort="total_ms"):
+        with self._lock:
+            statements = [statement.to_dict() for statement in self.statements.values()]
+        statements.sort(key=lambda statement: statement[sort], reverse=True)
+        return statements[:limit]
+
+    def clear(self):
+        with self._lock:
+            self.statements = {}
+
+    def record(self, engine, statement, parameters, duration, executemany):
+        endpoint = request.endpoint if has_request_context() else None
+        normalized = normalize_statement(statement)
+        seen_at = datetime.now(timezone.utc).isoformat()
+        printable = _printable(parameters) if self.log_parameters else None
+
+        with self._lock:
+            entry = self.statements.get(normalized)
+            if entry is None:
+                if len(self.statements) >= MAX_STATEMENTS:
+                    del self.statements[min(self.statements, key=lambda key: self.statements[key].count)]
+                entry = self.statements[normalized] = SlowStatement(normalized)
+            entry.count += 1
+            entry.total += duration
+            entry.max = max(entry.max, duration)
+            entry.endpoints[endpoint or "none"] = entry.endpoints.get(endpoint or "none", 0) + 1
+            entry.parameters = printable
+            entry.last_seen = seen_at
+
+            explain = (
+                not executemany and statement.lstrip().lower().startswith(EXPLAINABLE)
+                and (entry.explained_at is None or time.monotonic() - entry.explained_at > self.explain_interval)
+            )
+            if explain:
+                entry.explained_at = time.monotonic()
+
+        line = {
+            "time": seen_at, "duration_ms": round(duration * 1000, 2), "endpoint": endpoint,
+            "statement": " ".join(statement.split())
+        }
+        if self.log_parameters:
+            line["parameters"] = printable
+        if not explain:
+            self._write(line)
+            return
+
+        self._start_worker()
+        try:
+            self._queue.put_nowait((engine, statement, parameters, normalized, line))
+        except queue.Full:
+            self._write(line)
+
+    def _write(self, line):
+        if self.handler is not None:
+            self.logger.info(json.dumps(line, default=str))
+
+    def _start_worker(self):
+        if self._worker is None or not self._worker.is_alive():
+            with self._lock:
+                if self._worker is None or not self._worker.is_alive():
+                    self._worker = threading.Thread(target=self._explain_statements, name="slow-query-explain", daemon=True)
+                    self._worker.start()
+
+    def _explain_statements(self):
+        _explaining.active = True
+        while True:
+            engine, statement, parameters, normalized, line = self._queue.get()
+            try:
+                line["plan"] = explain(engine, statement, parameters)
+            except Exception as error:
+                line["plan_error"] = str(error)
+            else:
+                with self._lock:
+                    entry = self.statements.get(normalized)
+                    if entry is not None:
+                        entry.plan = line["plan"]
+            self._write(line)
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        if self.threshold is not None:
+            conn.info["slow_query_start"] = time.perf_counter()
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        start = conn.info.pop("slow_query_start", None)
+        if start is None:
+            return
+        duration = time.perf_counter() - start
+        if duration >= self.threshold and not getattr(_explaining, "active", False):
+            self.record(conn.engine, statement, parameters, duration, executemany)
+
+
+# Return the query plan of a statement, without running it
+def explain(engine, statement, parameters):
+    with engine.connect() as connection:
+        if connection.dialect.name == "postgresql":
+            rows = connection.exec_driver_sql("EXPLAIN (ANALYZE off) " + statement, parameters).all()
+            plan = "\n".join(row[0] for row in rows)
+        elif connection.dialect.name == "sqlite":
+            rows = connection.exec_driver_sql("EXPLAIN QUERY PLAN " + statement, parameters).all()
+            plan = "\n".join(row[-1] for row in rows)
+        else:
+            rows = connection.exec_driver_sql("EXPLAIN " + statement, parameters).all()
+            plan = "\n".join(" ".join(str(value) for value in row) for row in rows)
+        connection.rollback()
+    return plan
+
+
+# Return parameters that can be written as JSON, with long values shortened
+def _printable(parameters):
+    def shorten(value):
+        if isinstance(value, (int, float, bool)) or value is None:
+            return value
+        text = str(value)
+        return text if len(text) <= 100 else text[:100] + "..."
+
+    if isinstance(parameters, dict):
+        return {key: shorten(value) for key, value in parameters.items()}
+    if isinstance(parameters, (list, tuple)):
+        if parameters and isinstance(parameters[0], (list, tuple, dict)):
+            return f"{len(parameters)} parameter sets"
+        return [shorten(value) for value in parameters]
+    return shorten(parameters)
@@ -0,0 +1,29 @@
+from flask import request, abort
+
+
+# Schemas already built for a set of requested fields, so each combination is only built once
+_schemas = {}
+
+
+# Read the ?fields= parameter, e.g. ?fields=id,title, and return the schema to dump a list with
+# Only the fields named are dumped, in the schema's usual order. The schema is returned unchanged if no
+# fields are given. Query the rows with schema_query(schema, model, sparse=True) so only the columns and
+# relationships of the fields requested are loaded.
+def requested_fields(schema):
+    value = request.args.get("fields")
+    if value is None:
+        return schema
+
+    names = set(name.strip() for name in value.split(",") if name.strip())
+    if not names:
+        return abort(400, description="No fields given in fields query string.")
+
+    unknown = sorted(names - set(schema.dump_fields))
+    if unknown:
+        return abort(400, description=f"Unknown field(s): {', '.join(unknown)}. Choose from: {', '.join(schema.dump_fields)}.")
+
+    key = (type(schema), schema.many, frozenset(names))
+    if key not in _schemas:
+        _schemas[key] = type(schema)(many=schema.many, only=[name for name in schema.dump_fields if name in names])
+
+    return _schemas[key]
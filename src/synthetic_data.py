@@ -0,0 +1,185 @@
+import csv
+import io
+import itertools
+import random
+import time
+from datetime import datetime, timedelta
+from sqlalchemy import insert, select
+from app import db, bcrypt
+from models.users import User
+from models.books import Book, Author, Publisher
+from models.movies import Movie, Director, ProductionCompany
+from models.read import Read
+from models.watched import Watched
+from models.ratings import BookRating, MovieRating
+from rating_aggregates import rebuild_ratings
+from full_text_search import rebuild_search_index
+
+
+# Number of rows generated for each table per unit of scale
+ROWS_PER_SCALE = {
+    "author": 50,
+    "publisher": 10,
+    "book": 1000,
+    "director": 20,
+    "production_company": 10,
+    "movie": 200,
+    "user": 1000,
+    "read": 20000,
+    "watched": 10000
+}
+
+# Number of rows sent to the database at a time
+BATCH_SIZE = 10000
+
+# Password given to every generated user, it is hashed once and the hash shared by all of them
+PASSWORD = "12345678"
+
+FIRST_NAMES = ["Stephen", "Tabitha", "Owen", "Joe", "Naomi", "Peter", "Richard", "Carrie", "Jack", "Wendy",
+               "Danny", "Annie", "Paul", "Louis", "Rachel", "Ellen", "Ben", "Susan", "Johnny", "Roland"]
+SURNAMES = ["King", "Straub", "Bachman", "Torrance", "Wilkes", "Sheldon", "Creed", "White", "Mears", "Norton",
+            "Smith", "Doe", "Hill", "Deschain", "Snell", "Gardener", "Denbrough", "Hanlon", "Marsh", "Tozier"]
+TITLE_WORDS = ["Night", "Shift", "Dark", "Tower", "Dead", "Zone", "Long", "Walk", "Green", "Mile", "Bag",
+               "Bones", "Black", "House", "Dream", "Catcher", "Lisey", "Story", "Under", "Dome", "Doctor",
+               "Sleep", "Fire", "Starter", "Mist", "Cujo", "Christine", "Misery", "Needful", "Things"]
+COMPANY_WORDS = ["Castle", "Rock", "Derry", "Pictures", "Films", "Studios", "Entertainment", "Productions"]
+
+
+# Return cumulative weights for n items following Zipf's law, so a few items are picked far more often than the rest
+def zipf_weights(n, exponent=1.1):
+    return list(itertools.accumulate(1 / (rank ** exponent) for rank in range(1, n + 1)))
+
+
+# Generate a title from the title words
+def make_title(rng):
+    return " ".join(rng.sample(TITLE_WORDS, rng.randint(1, 3)))
+
+
+# Return a random date between two years
+def make_date(rng, first_year, last_year):
+    start = datetime(first_year, 1, 1)
+    return start + timedelta(days=rng.randint(0, (last_year - first_year + 1) * 365))
+
+
+# Insert rows into a table in batches and return the number of rows inserted
+# PostgreSQL loads each batch with COPY, other databases use an executemany INSERT
+def insert_rows(table, columns, rows):
+    connection = db.session.connection()
+    count = 0
+
+    while True:
+        batch = list(itertools.islice(rows, BATCH_SIZE))
+        if not batch:
+            return count
+
+        if connection.dialect.name == "postgresql":
+            buffer = io.StringIO()
+            csv.writer(buffer).writerows(batch)
+            buffer.seek(0)
+            cursor = connection.connection.cursor()
+            cursor.copy_expert(f'COPY "{table.name}" ({", ".join(columns)}) FROM STDIN WITH (FORMAT csv)', buffer)
+            cursor.close()
+        else:
+            db.session.execute(insert(table), [dict(zip(columns, row)) for row in batch])
+
+        count += len(batch)
+
+
+# Return the ids of every row in a table, in order
+def table_ids(model):
+    return db.session.execute(select(model.id).order_by(model.id)).scalars().all()
+
+
+# Yield review rows for every user, as (item_id, user_id, rating)
+# How many reviews each user writes follows a Pareto distribution, most items reviewed follow the
+# Zipf weights with the rest picked uniformly, and ratings lean towards the upper half of the scale.
+# A user reviews an item at most once.
+def make_reviews(rng, user_ids, item_ids, total):
+    item_weights = zipf_weights(len(item_ids))
+    activity = [rng.paretovariate(1.5) for user_id in user_ids]
+    activity_total = sum(activity)
+    ratings = list(range(1, 11))
+    rating_weights = [1, 1, 2, 3, 5, 8, 12, 12, 9, 6]
+
+    for user_id, weight in zip(user_ids, activity):
+        count = min(max(1, round(total * weight / activity_total)), len(item_ids) // 2)
+        reviewed = set()
+        while len(reviewed) < count:
+            if rng.random() < 0.8:
+                reviewed.add(rng.choices(item_ids, cum_weights=item_weights)[0])
+            else:
+                reviewed.add(rng.choice(item_ids))
+        for item_id in sorted(reviewed):
+            yield item_id, user_id, rng.choices(ratings, weights=rating_weights)[0]
+
+
+# Generate a synthetic data set of the size given by scale, using seed so that every run with the same
+# arguments creates the same data. The tables should be empty, as the generated emails and isbns are fixed.
+# Returns a list of (table name, rows inserted, seconds taken)
+def generate(scale, seed=1):
+    rng = random.Random(seed)
+    counts = {table: rows * scale for table, rows in ROWS_PER_SCALE.items()}
+    report = []
+
+    def load(model, columns, rows):
+        start = time.perf_counter()
+        inserted = insert_rows(model.__table__, columns, rows)
+        db.session.commit()
+        report.append((model.__tablename__, inserted, time.perf_counter() - start))
+
+    password = bcrypt.generate_password_hash(PASSWORD).decode("utf-8")
+    load(User, ["first_name", "surname", "email", "password", "admin", "token_generation"], (
+        (rng.choice(FIRST_NAMES), rng.choice(SURNAMES), f"user{number}@example.com", password, number < scale, 0)
+        for number in range(counts["user"])
+    ))
+    load(Author, ["published_name", "collaboration", "pen_name", "collaborator_name"], (
+        (f"{rng.choice(FIRST_NAMES)} {rng.choice(SURNAMES)}", False, rng.random() < 0.1, None)
+        for number in range(counts["author"])
+    ))
+    load(Publisher, ["publisher_name"], (
+        (f"{rng.choice(SURNAMES)} {rng.choice(COMPANY_WORDS)}",) for number in range(counts["publisher"])
+    ))
+    load(Director, ["director_name"], (
+        (f"{rng.choice(FIRST_NAMES)} {rng.choice(SURNAMES)}",) for number in range(counts["director"])
+    ))
+    load(ProductionCompany, ["name"], (
+        (f"{rng.choice(COMPANY_WORDS)} {rng.choice(COMPANY_WORDS)}",) for number in range(counts["production_company"])
+    ))
+
+    # A few prolific authors and large publishers account for most of the books
+    author_ids = table_ids(Author)
+    publisher_ids = table_ids(Publisher)
+    author_weights = zipf_weights(len(author_ids))
+    publisher_weights = zipf_weights(len(publisher_ids))
+    load(Book, ["title", "isbn", "length", "first_publication_date", "copies_published", "author_id", "publisher_id"], (
+        (make_title(rng), str(9780000000000 + number), rng.randint(80, 1200), make_date(rng, 1950, 2020),
+         int(rng.paretovariate(1.2) * 1000), rng.choices(author_ids, cum_weights=author_weights)[0],
+         rng.choices(publisher_ids, cum_weights=publisher_weights)[0])
+        for number in range(counts["book"])
+    ))
+
+    # The most popular books are the most likely to be adapted
+    book_ids = table_ids(Book)
+    book_weights = zipf_weights(len(book_ids))
+    director_ids = table_ids(Director)
+    production_ids = table_ids(ProductionCompany)
+    load(Movie, ["title", "release_date", "length", "box_office_ranking", "book_id", "director_id", "production_company_id"], (
+        (make_title(rng), make_date(rng, 1970, 2023), rng.randint(80, 200), rng.randint(1, 30000),
+         rng.choices(book_ids, cum_weights=book_weights)[0], rng.choice(director_ids), rng.choice(production_ids))
+        for number in range(counts["movie"])
+    ))
+
+    user_ids = table_ids(User)
+    movie_ids = table_ids(Movie)
+    load(Read, ["book_id", "user_id", "rating"], make_reviews(rng, user_ids, book_ids, counts["read"]))
+    load(Watched, ["movie_id", "user_id", "rating"], make_reviews(rng, user_ids, movie_ids, counts["watched"]))
+
+    start = time.perf_counter()
+    books = rebuild_ratings(BookRating)
+    movies = rebuild_ratings(MovieRating)
+    report.append(("book_rating and movie_rating", books + movies, time.perf_counter() - start))
+
+    start = time.perf_counter()
+    report.append(("search_document", rebuild_search_index(), time.perf_counter() - start))
+
+    return report
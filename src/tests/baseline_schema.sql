@@ -0,0 +1,80 @@
+-- Schema created by db.create_all() before the first migration, used to test upgrading an existing database
+CREATE TABLE user (
+	id INTEGER NOT NULL,
+	first_name VARCHAR NOT NULL,
+	surname VARCHAR NOT NULL,
+	email VARCHAR NOT NULL,
+	password VARCHAR NOT NULL,
+	admin BOOLEAN,
+	PRIMARY KEY (id),
+	UNIQUE (email)
+);
+CREATE TABLE author (
+	id INTEGER NOT NULL,
+	published_name VARCHAR NOT NULL,
+	collaboration BOOLEAN,
+	pen_name BOOLEAN,
+	collaborator_name VARCHAR,
+	PRIMARY KEY (id)
+);
+CREATE TABLE publisher (
+	id INTEGER NOT NULL,
+	publisher_name VARCHAR NOT NULL,
+	PRIMARY KEY (id)
+);
+CREATE TABLE director (
+	id INTEGER NOT NULL,
+	director_name VARCHAR NOT NULL,
+	PRIMARY KEY (id)
+);
+CREATE TABLE production_company (
+	id INTEGER NOT NULL,
+	name VARCHAR NOT NULL,
+	PRIMARY KEY (id)
+);
+CREATE TABLE book (
+	id INTEGER NOT NULL,
+	title VARCHAR NOT NULL,
+	isbn VARCHAR NOT NULL,
+	length VARCHAR NOT NULL,
+	first_publication_date DATETIME NOT NULL,
+	copies_published VARCHAR NOT NULL,
+	author_id INTEGER NOT NULL,
+	publisher_id INTEGER NOT NULL,
+	PRIMARY KEY (id),
+	UNIQUE (isbn),
+	FOREIGN KEY(author_id) REFERENCES author (id),
+	FOREIGN KEY(publisher_id) REFERENCES publisher (id)
+);
+CREATE TABLE movie (
+	id INTEGER NOT NULL,
+	title VARCHAR NOT NULL,
+	release_date DATETIME NOT NULL,
+	length VARCHAR NOT NULL,
+	box_office_ranking INTEGER NOT NULL,
+	book_id INTEGER NOT NULL,
+	director_id INTEGER NOT NULL,
+	production_company_id INTEGER NOT NULL,
+	PRIMARY KEY (id),
+	FOREIGN KEY(book_id) REFERENCES book (id),
+	FOREIGN KEY(director_id) REFERENCES director (id),
+	FOREIGN KEY(production_company_id) REFERENCES production_company (id)
+);
+CREATE TABLE read (
+	id INTEGER NOT NULL,
+	rating INTEGER NOT NULL,
+	book_id INTEGER NOT NULL,
+	user_id INTEGER NOT NULL,
+	PRIMARY KEY (id),
+	FOREIGN KEY(book_id) REFERENCES book (id),
+	FOREIGN KEY(user_id) REFERENCES user (id)
+);
+CREATE TABLE watched (
+	id INTEGER NOT NULL,
+	rating INTEGER NOT NULL,
+	movie_id INTEGER NOT NULL,
+	user_id INTEGER NOT NULL,
+	PRIMARY KEY (id),
+	FOREIGN KEY(movie_id) REFERENCES movie (id),
+	FOREIGN KEY(user_id) REFERENCES user (id)
+);
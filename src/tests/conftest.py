@@ -0,0 +1,87 @@
+import os
+import sys
+from datetime import datetime
+import pytest
+
+# The configuration is read when config is first imported, so the environment is set up before the app is imported
+os.environ["FLASK_ENV"] = "testing"
+os.environ.setdefault("SECRET_KEY", "test secret key")
+os.environ.setdefault("BCRYPT_LOG_ROUNDS", "4")
+os.environ.setdefault("SLOW_QUERY_THRESHOLD_MS", "-1")
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import authorization
+from app import create_app, db, bcrypt, response_cache
+from autocomplete import autocomplete
+from models.users import User
+from models.books import Book, Author, Publisher
+from models.movies import Movie, Director, ProductionCompany
+
+
+PASSWORD = "12345678"
+
+
+# Application using a new SQLite database file for each test, with no tables created
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    monkeypatch.setenv("DATABASE_URL", f"sqlite:///{tmp_path / 'test.db'}")
+    app = create_app()
+
+    # Forget the state held per process by the previous test's application
+    authorization.valid_generations.clear()
+    authorization.deleted_users.clear()
+    authorization._loaded_at = None
+    autocomplete.invalidate()
+
+    yield app
+
+    response_cache.backend = None
+    with app.app_context():
+        db.engine.dispose()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+# Database created with the current models and seeded with an admin, a user, and three books each adapted into a movie
+@pytest.fixture
+def database(app):
+    with app.app_context():
+        db.create_all()
+        password = bcrypt.generate_password_hash(PASSWORD).decode("utf-8")
+        db.session.add_all([
+            User(first_name="Admin", surname="User", email="admin@email.com", password=password, admin=True),
+            User(first_name="Normal", surname="User", email="user@email.com", password=password, admin=False),
+            Author(published_name="Stephen King"),
+            Publisher(publisher_name="Doubleday"),
+            Director(director_name="Brian De Palma"),
+            ProductionCompany(name="Red Bank Films")
+        ])
+        db.session.flush()
+        for number in range(1, 4):
+            book = Book(title=f"Book {number}", isbn=f"isbn-{number}", length=200 + number,
+                        first_publication_date=datetime(1974, 4, number), copies_published=1000 * number,
+                        author_id=1, publisher_id=1)
+            db.session.add(book)
+            db.session.flush()
+            db.session.add(Movie(title=f"Movie {number}", release_date=datetime(1976, 11, number), length=90 + number,
+                                 box_office_ranking=number, book_id=book.id, director_id=1, production_company_id=1))
+        db.session.commit()
+    return db
+
+
+# Log in and return the headers authenticating a request as that user
+def login(client, email):
+    response = client.post("/auth/login", json={"email": email, "password": PASSWORD})
+    assert response.status_code == 200, response.get_data(as_text=True)
+    return {"Authorization": f"Bearer {response.get_json()['token']}"}
+
+
+# Forget the revocations this process knows about, as if the next request was served by another process
+def forget_revocations():
+    authorization.valid_generations.clear()
+    authorization.deleted_users.clear()
+    authorization._loaded_at = None
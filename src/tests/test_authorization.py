@@ -0,0 +1,69 @@
+import time
+import authorization
+from app import db
+from models.users import User, DeletedUser
+from conftest import PASSWORD, login, forget_revocations
+
+
+def test_deleted_user_tokens_are_revoked_in_every_process(client, database):
+    headers = login(client, "user@email.com")
+    assert client.get("/read/2", headers=headers).status_code == 200
+
+    response = client.delete("/auth/user/unregister/user@email.com", headers=headers)
+    assert response.status_code == 200
+    assert client.get("/read/2", headers=headers).status_code == 401
+
+    # Another process only learns about the deletion from the database
+    forget_revocations()
+    assert client.get("/read/2", headers=headers).status_code == 401
+    with client.application.app_context():
+        assert db.session.get(DeletedUser, 2) is not None
+
+
+def test_new_user_given_a_deleted_users_id_can_use_their_tokens(client, database):
+    details = {"first_name": "Normal", "surname": "User", "email": "user@email.com", "password": "87654321"}
+    assert client.put("/auth/user/update", json=details, headers=login(client, "user@email.com")).status_code == 200
+    old = {"Authorization": f"Bearer {client.post('/auth/login', json=details).get_json()['token']}"}
+    assert client.delete("/auth/user/unregister/user@email.com", headers=old).status_code == 200
+
+    # Tokens record the second they were issued, so the new user's is issued after the deletion
+    time.sleep(1)
+    assert client.post("/auth/register", json={**details, "email": "new@email.com", "password": PASSWORD}).status_code == 200
+    new = login(client, "new@email.com")
+    with client.application.app_context():
+        assert db.session.query(User.id).filter_by(email="new@email.com").scalar() == 2
+
+    assert client.get("/read/2", headers=new).status_code == 200
+    assert client.get("/read/2", headers=old).status_code == 401
+    forget_revocations()
+    assert client.get("/read/2", headers=new).status_code == 200
+    assert client.get("/read/2", headers=old).status_code == 401
+
+
+def test_admin_change_revokes_tokens_in_the_same_transaction(client, database):
+    admin = login(client, "admin@email.com")
+    user = login(client, "user@email.com")
+
+    response = client.put("/auth/register/admin/2", json={"admin": True}, headers=admin)
+    assert response.status_code == 200
+    with client.application.app_context():
+        assert db.session.get(User, 2).token_generation == 1
+
+    assert client.get("/read/2", headers=user).status_code == 401
+    forget_revocations()
+    assert client.get("/read/2", headers=user).status_code == 401
+
+    # A new token carries the new admin status
+    assert client.get("/auth/user/all", headers=login(client, "user@email.com")).status_code == 200
+
+
+def test_revocation_is_discarded_when_the_change_is_rolled_back(client, database):
+    from authorization import revoke_user_tokens
+
+    with client.application.app_context():
+        user = db.session.get(User, 2)
+        revoke_user_tokens(user)
+        db.session.rollback()
+        db.session.commit()
+        assert 2 not in authorization.valid_generations
+        assert db.session.get(User, 2).token_generation == 0
@@ -0,0 +1,30 @@
+import autocomplete as autocomplete_module
+from autocomplete import NameIndex
+from conftest import login
+
+
+def suggestions(client, prefix):
+    return [(suggestion["type"], suggestion["id"]) for suggestion in client.get(f"/autocomplete?prefix={prefix}").get_json()]
+
+
+def test_deleting_a_movie_removes_the_book_deleted_with_it(client, database):
+    admin = login(client, "admin@email.com")
+    assert ("book", 3) in suggestions(client, "book")
+    assert ("movie", 3) in suggestions(client, "movie")
+
+    assert client.delete("/movies/delete/3", headers=admin).status_code == 200
+
+    assert ("book", 3) not in suggestions(client, "book")
+    assert ("movie", 3) not in suggestions(client, "movie")
+
+
+def test_cached_prefixes_are_bounded(monkeypatch):
+    monkeypatch.setattr(autocomplete_module, "MAX_CACHED_PREFIXES", 2)
+    index = NameIndex()
+    index.build([(1, "Carrie", 0, []), (2, "Christine", 0, [])])
+
+    index.lookup("c")
+    index.lookup("ca")
+    index.lookup("c")
+    assert index.lookup("ch") == [2]
+    assert list(index._cache) == ["c", "ch"]
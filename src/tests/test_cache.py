@@ -0,0 +1,25 @@
+from cache import MemoryBackend
+from app import response_cache
+from conftest import login
+
+
+def test_deleting_a_movie_invalidates_the_book_deleted_with_it(client, database):
+    response_cache.backend = MemoryBackend()
+    admin = login(client, "admin@email.com")
+
+    assert client.get("/books/search/?id=3").headers["X-Cache"] == "MISS"
+    cached = client.get("/books/search/?id=3")
+    assert cached.status_code == 200
+    assert cached.headers["X-Cache"] == "HIT"
+    assert client.get("/books/").headers["X-Cache"] == "MISS"
+    assert client.get("/books/").headers["X-Cache"] == "HIT"
+
+    # Movie 3 is adapted from book 3, which is deleted with it
+    assert client.delete("/movies/delete/3", headers=admin).status_code == 200
+
+    response = client.get("/books/search/?id=3")
+    assert response.headers["X-Cache"] == "MISS"
+    assert response.status_code != 200 or response.get_json() != cached.get_json()
+    books = client.get("/books/")
+    assert books.headers["X-Cache"] == "MISS"
+    assert [book["id"] for book in books.get_json()] == [1, 2]
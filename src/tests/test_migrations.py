@@ -0,0 +1,81 @@
+import os
+from sqlalchemy import create_engine, inspect
+from app import db, bcrypt
+from migrations import MIGRATIONS, run_migrations
+from conftest import PASSWORD, login
+
+
+BASELINE_SCHEMA = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline_schema.sql")
+
+
+# Create the tables of the first release and fill them the way it did, with lengths stored as strings and
+# a user who reviewed the same book twice
+def create_baseline_database():
+    password = bcrypt.generate_password_hash(PASSWORD).decode("utf-8")
+    connection = db.engine.raw_connection()
+    try:
+        with open(BASELINE_SCHEMA) as schema:
+            connection.executescript(schema.read())
+        connection.executescript(f"""
+            INSERT INTO user VALUES (1, 'Admin', 'User', 'admin@email.com', '{password}', 1);
+            INSERT INTO user VALUES (2, 'Normal', 'User', 'user@email.com', '{password}', 0);
+            INSERT INTO author VALUES (1, 'Stephen King', 0, 0, NULL);
+            INSERT INTO publisher VALUES (1, 'Doubleday');
+            INSERT INTO director VALUES (1, 'Brian De Palma');
+            INSERT INTO production_company VALUES (1, 'Red Bank Films');
+            INSERT INTO book VALUES (1, 'Carrie', 'isbn-1', '199', '1974-04-05 00:00:00.000000', '30,000', 1, 1);
+            INSERT INTO book VALUES (2, 'The Stand', 'isbn-2', ' 1,152 ', '1978-10-03 00:00:00.000000', '70000', 1, 1);
+            INSERT INTO movie VALUES (1, 'Carrie', '1976-11-03 00:00:00.000000', '98', 1, 1, 1, 1);
+            INSERT INTO read VALUES (1, 4, 1, 2);
+            INSERT INTO read VALUES (2, 8, 1, 2);
+            INSERT INTO read VALUES (3, 6, 1, 1);
+            INSERT INTO watched VALUES (1, 7, 1, 2);
+        """)
+        connection.commit()
+    finally:
+        connection.close()
+
+
+# Return the columns and index names of every table in a database
+def schema(engine):
+    inspector = inspect(engine)
+    return {
+        table: (
+            sorted(column["name"] for column in inspector.get_columns(table)),
+            sorted(index["name"] for index in inspector.get_indexes(table))
+        )
+        for table in inspector.get_table_names() if table != "schema_migration"
+    }
+
+
+def test_upgrading_a_baseline_database(app, client):
+    with app.app_context():
+        create_baseline_database()
+
+        ran = run_migrations()
+        assert [name for name, summary in ran] == [name for name, func in MIGRATIONS]
+        assert dict(ran)["0006_unique_reviews"] == "Removed 1 duplicate book review(s) and 0 duplicate movie review(s)."
+        assert run_migrations() == []
+
+        # The upgraded database has the same tables, columns and indexes as a database created with the current models
+        current = create_engine("sqlite://")
+        db.metadata.create_all(current)
+        assert schema(db.engine) == schema(current)
+
+    # Only the user's latest review of a book is kept, and the aggregates are built from the reviews left
+    assert client.get("/read/rating/1").get_json()["message"] == "The average rating of this book is: 7.00"
+    assert client.get("/watched/rating/1").get_json()["message"] == "The average rating of this movie is: 7.00"
+
+    books = client.get("/books/search?sort=length").get_json()
+    assert [(book["title"], book["length"], book["copies_published"]) for book in books] == [
+        ("Carrie", 199, 30000), ("The Stand", 1152, 70000)
+    ]
+    assert [result["name"] for result in client.get("/search?q=stand").get_json()] == ["The Stand"]
+
+    # Users from before token revocation can still log in, and their reviews can be synced
+    headers = login(client, "user@email.com")
+    response = client.post("/read/sync", json=[{"book_id": 1, "rating": 10}, {"book_id": 2, "rating": 5}], headers=headers)
+    assert response.status_code == 200
+    assert response.get_json()["created"] == [2]
+    assert response.get_json()["updated"] == [1]
+    assert client.get("/read/rating/1").get_json()["message"] == "The average rating of this book is: 8.00"
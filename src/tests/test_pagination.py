@@ -0,0 +1,14 @@
+from app import db
+from models.books import Book
+
+
+def test_sparse_and_full_lists_are_in_the_same_order(client, database):
+    # Titles sorting in the opposite order to the ids, so a list read from the title index would come back reversed
+    with client.application.app_context():
+        for book in db.session.query(Book):
+            book.title = f"Title {10 - book.id}"
+        db.session.commit()
+
+    full = [book["id"] for book in client.get("/books/").get_json()]
+    sparse = [book["id"] for book in client.get("/books/?fields=id,title").get_json()]
+    assert full == sparse == [1, 2, 3]
@@ -0,0 +1,34 @@
+from sqlalchemy import select
+from app import db
+from models.ratings import BookRating, MovieRating
+from conftest import login
+
+
+NEW_BOOK = {"title": "Christine", "isbn": "isbn-4", "length": 526, "first_publication_date": "29-04-1983",
+            "copies_published": 1000, "author_id": 1, "publisher_id": 1}
+
+
+def test_deleted_book_rating_is_not_given_to_a_new_book(client, database):
+    admin = login(client, "admin@email.com")
+    assert client.post("/read/add", json={"book_id": 3, "rating": 1}, headers=admin).status_code == 200
+    assert client.get("/read/rating/3").get_json()["message"] == "The average rating of this book is: 1.00"
+
+    assert client.delete("/books/delete/3", headers=admin).status_code == 200
+    # SQLite gives the new book the id of the book just deleted
+    assert client.post("/books/add", json=NEW_BOOK, headers=admin).status_code == 200
+    assert client.get("/books/search/?id=3").get_json()["title"] == "Christine"
+
+    assert client.get("/read/rating/3").get_json()["message"] == "No rating available for this book id."
+
+
+def test_deleting_a_movie_deletes_the_ratings_of_everything_deleted_with_it(client, database):
+    admin = login(client, "admin@email.com")
+    assert client.post("/read/add", json={"book_id": 2, "rating": 4}, headers=admin).status_code == 200
+    assert client.post("/watched/add", json={"movie_id": 2, "rating": 6}, headers=admin).status_code == 200
+    assert client.post("/watched/add", json={"movie_id": 1, "rating": 8}, headers=admin).status_code == 200
+
+    assert client.delete("/movies/delete/2", headers=admin).status_code == 200
+
+    with client.application.app_context():
+        assert db.session.scalars(select(BookRating.book_id)).all() == []
+        assert db.session.scalars(select(MovieRating.movie_id)).all() == [1]
@@ -0,0 +1,73 @@
+from sqlalchemy import func, select
+import review_sync
+from app import db
+from models.ratings import BookRating, MovieRating
+from models.read import Read
+from models.watched import Watched
+from conftest import login
+
+
+# Return {item id: (rating count, rating sum)} from the aggregates, and the same counted from the reviews
+def aggregates(app, aggregate, model, key):
+    with app.app_context():
+        stored = {getattr(row, key): (row.rating_count, row.rating_sum) for row in db.session.scalars(select(aggregate))}
+        counted = {
+            item_id: (count, total)
+            for item_id, count, total in db.session.execute(
+                select(getattr(model, key), func.count(), func.sum(model.rating)).group_by(getattr(model, key))
+            )
+        }
+    return stored, counted
+
+
+def test_sync_counts_each_review_once(app, client, database):
+    user = login(client, "user@email.com")
+    admin = login(client, "admin@email.com")
+    assert client.post("/read/add", json={"book_id": 1, "rating": 4}, headers=user).status_code == 200
+    assert client.post("/read/add", json={"book_id": 1, "rating": 6}, headers=admin).status_code == 200
+
+    response = client.post("/read/sync", json=[
+        {"book_id": 1, "rating": 4}, {"book_id": 2, "rating": 8}, {"book_id": 3, "rating": 2}, {"book_id": 9, "rating": 5}
+    ], headers=user).get_json()
+    assert (response["created"], response["updated"], response["unchanged"]) == ([2, 3], [], [1])
+    assert response["errors"] == [{"row": 3, "error": "No book with book_id 9."}]
+
+    response = client.post("/read/sync", json=[
+        {"book_id": 1, "rating": 10}, {"book_id": 2, "rating": 8}, {"book_id": 3, "rating": 5}
+    ], headers=user).get_json()
+    assert (response["created"], response["updated"], response["unchanged"]) == ([], [1, 3], [2])
+
+    stored, counted = aggregates(app, BookRating, Read, "book_id")
+    assert stored == counted == {1: (2, 16), 2: (1, 8), 3: (1, 5)}
+
+
+def test_sync_of_a_review_added_in_the_meantime_updates_it(app, client, database):
+    user = login(client, "user@email.com")
+    assert client.post("/watched/sync", json=[{"movie_id": 1, "rating": 3}], headers=user).get_json()["created"] == [1]
+
+    # The same sync sent again, e.g. retried by the app, finds the review it added
+    for rating in (3, 9):
+        response = client.post("/watched/sync", json=[{"movie_id": 1, "rating": rating}, {"movie_id": 2, "rating": 7}], headers=user)
+        assert response.get_json()["created"] == ([2] if rating == 3 else [])
+
+    stored, counted = aggregates(app, MovieRating, Watched, "movie_id")
+    assert stored == counted == {1: (1, 9), 2: (1, 7)}
+
+
+def test_review_added_by_a_concurrent_sync_is_not_counted_twice(app, client, database, monkeypatch):
+    user = login(client, "user@email.com")
+    upsert = review_sync._upsert
+
+    # Another request commits the same review after this sync has checked the book exists but before it writes
+    def concurrent_upsert(model, key, rows):
+        with db.engine.begin() as connection:
+            connection.execute(Read.__table__.insert().values(user_id=2, book_id=1, rating=6))
+            connection.execute(BookRating.__table__.insert().values(book_id=1, rating_count=1, rating_sum=6, rating_min=6, rating_max=6))
+        return upsert(model, key, rows)
+
+    monkeypatch.setattr(review_sync, "_upsert", concurrent_upsert)
+    response = client.post("/read/sync", json=[{"book_id": 1, "rating": 7}], headers=user).get_json()
+    assert (response["created"], response["updated"]) == ([], [1])
+
+    stored, counted = aggregates(app, BookRating, Read, "book_id")
+    assert stored == counted == {1: (1, 7)}
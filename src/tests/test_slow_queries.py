@@ -0,0 +1,53 @@
+import json
+import time
+import pytest
+from app import slow_query_log
+from conftest import login
+
+
+# Log every statement as slow, and turn the log back off after the test
+@pytest.fixture
+def slow_queries(app):
+    app.config["SLOW_QUERY_THRESHOLD_MS"] = 0
+
+    def enable(**config):
+        app.config.update(config)
+        slow_query_log.init_app(app)
+        return slow_query_log
+
+    yield enable
+
+    slow_query_log.threshold = None
+    slow_query_log.clear()
+    if slow_query_log.handler is not None:
+        slow_query_log.logger.removeHandler(slow_query_log.handler)
+        slow_query_log.handler.close()
+        slow_query_log.handler = None
+
+
+def login_statement(log):
+    return next(statement for statement in log.top(500) if "auth.auth_login" in statement["endpoints"])
+
+
+def test_parameters_are_not_logged_by_default(client, database, slow_queries, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    log = slow_queries()
+    login(client, "user@email.com")
+
+    assert login_statement(log)["last_parameters"] is None
+    assert [path.name for path in tmp_path.iterdir()] == ["test.db"]
+
+
+def test_parameters_are_logged_when_asked_for(client, database, slow_queries, tmp_path):
+    path = tmp_path / "slow_queries.log"
+    log = slow_queries(SLOW_QUERY_LOG_FILE=str(path), SLOW_QUERY_LOG_PARAMETERS=True)
+    assert not path.exists()
+    login(client, "user@email.com")
+
+    assert "user@email.com" in json.dumps(login_statement(log)["last_parameters"])
+    # Statements being explained are written by a background thread
+    deadline = time.monotonic() + 5
+    while not (path.exists() and "user@email.com" in path.read_text()) and time.monotonic() < deadline:
+        time.sleep(0.01)
+    lines = [json.loads(line) for line in path.read_text().splitlines()]
+    assert any("user@email.com" in json.dumps(line.get("parameters")) for line in lines)